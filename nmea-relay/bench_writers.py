@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Benchmark nmea_relay's TimescaleDB writers against a real database.
+
+Parses the given files once, then inserts the same rows through each writer
+(execute_values, COPY, and asyncpg with --in-flight batches at once) under
+a throwaway device tag and reports rows/s (including the rollup upkeep
+done in each insert transaction). The benchmark rows are deleted
+afterwards.
+
+execute_values stays the default writer until this has been run against
+a real TimescaleDB: --copy and --async are opt-in, and their help says
+they are unmeasured.
+
+Usage:
+    python3 bench_writers.py --db-url postgres://... ../nmea-test-rig/tracks/*.nmea
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import nmea_relay
+
+
+def run_sync(cls, db_url, device, rows, batch):
+    writer = cls(db_url, device=device)
+    start = time.perf_counter()
+    inserted = 0
+    for i in range(0, len(rows), batch):
+        inserted += writer.insert_rows(rows[i:i + batch])
+    elapsed = time.perf_counter() - start
+    writer.close()
+    return inserted, elapsed
+
+
+async def run_async(db_url, device, rows, batch, in_flight):
+    writer = nmea_relay.AsyncTimescaleDBWriter(db_url, device=device, pool_size=in_flight)
+    slots = asyncio.Semaphore(in_flight)
+
+    async def insert(chunk):
+        async with slots:
+            return await writer.insert_rows(chunk)
+
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(insert(rows[i:i + batch])
+                                    for i in range(0, len(rows), batch)))
+    elapsed = time.perf_counter() - start
+    await writer.close()
+    return sum(counts), elapsed
+
+
+def cleanup(db_url, device):
+    writer = nmea_relay.TimescaleDBWriter(db_url, device=device)
+    if writer.connect():
+        cur = writer.conn.cursor()
+        for table in ("nav_data",) + tuple(t for t, _ in nmea_relay.ROLLUPS):
+            cur.execute(f"DELETE FROM {table} WHERE device = %s", (device,))
+        writer.conn.commit()
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark nmea_relay DB writers")
+    parser.add_argument("files", nargs="+", help="NMEA log files to parse")
+    parser.add_argument("--db-url",
+                        default=os.environ.get("TIMESCALE_CONNECTION_STRING", ""),
+                        help="TimescaleDB connection string")
+    parser.add_argument("--batch", type=int, default=5000,
+                        help="Rows per insert_rows call")
+    parser.add_argument("--in-flight", type=int, default=4,
+                        help="Concurrent batches for the asyncpg writer")
+    args = parser.parse_args()
+
+    if nmea_relay.psycopg2 is None or not args.db_url:
+        print("Needs psycopg2 and --db-url / TIMESCALE_CONNECTION_STRING")
+        sys.exit(1)
+
+    rows = []
+    for filepath in args.files:
+        rows.extend(nmea_relay.parse_file(filepath)[0])
+    print(f"Parsed {len(rows):,} rows from {len(args.files)} files")
+
+    writers = {
+        "execute_values": lambda device: run_sync(nmea_relay.TimescaleDBWriter, args.db_url,
+                                                  device, rows, args.batch),
+        "copy": lambda device: run_sync(nmea_relay.TimescaleDBCopyWriter, args.db_url,
+                                        device, rows, args.batch),
+    }
+    if nmea_relay.asyncpg is not None:
+        writers["asyncpg"] = lambda device: asyncio.run(
+            run_async(args.db_url, device, rows, args.batch, args.in_flight))
+    else:
+        print("asyncpg not installed, skipping the async writer")
+
+    for name, run in writers.items():
+        device = f"bench-{name}"
+        inserted, elapsed = run(device)
+        cleanup(args.db_url, device)
+        print(f"  {name:15s} {inserted:>9,} rows in {elapsed:6.2f}s "
+              f"({inserted / elapsed if elapsed else 0:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
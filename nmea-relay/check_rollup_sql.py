@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Check nmea_relay's rollup SQL against a real TimescaleDB.
+
+Creates session-local temp copies of nav_data and the rollup tables (they
+shadow the real ones, which are never touched), inserts a few hand-made
+rows through TimescaleDBWriter so ROLLUP_SQL runs exactly as in ingest,
+and compares every rollup bucket with the same aggregates computed in
+Python. The bearings straddle north, so a wrong circular mean shows up.
+Exits non-zero on the first mismatch or SQL error.
+
+Without a database, --parse-only just parses SCHEMA_SQL and ROLLUP_SQL
+with pglast (PostgreSQL's own parser). That catches syntax errors only:
+a missing function signature, like mod(double precision, integer), is
+only found by running the SQL.
+
+Usage:
+    python3 check_rollup_sql.py --db-url postgres://...
+    python3 check_rollup_sql.py --parse-only
+"""
+
+import argparse
+import math
+import os
+import sys
+
+import nmea_relay
+
+try:
+    import pglast
+except ImportError:
+    pglast = None
+
+
+DEVICE = "check-rollup"
+T0 = 1_700_000_000_000  # on a minute boundary
+
+# (offset ms, sog, stw, cog, heading, awa, aws): two 10 s buckets in one minute
+# and one in the next; cog and heading wrap through 0, awa through 180.
+SAMPLES = (
+    (0, 5.0, 4.5, 350.0, 355.0, 170.0, 12.0),
+    (4_000, 6.0, 5.5, 10.0, 5.0, -170.0, 14.0),
+    (9_000, 7.0, 6.0, 20.0, 15.0, 180.0, 11.0),
+    (12_000, 5.5, 5.0, 359.0, 1.0, 30.0, 9.0),
+    (61_000, 4.0, None, 90.0, 270.0, None, 8.0),
+    (65_000, 4.5, None, 100.0, 260.0, None, 10.0),
+)
+
+
+def nav_rows():
+    rows = []
+    for offset, sog, stw, cog, heading, awa, aws in SAMPLES:
+        values = dict.fromkeys(nmea_relay.NAV_FIELDS)
+        values.update(lat=59.9, lon=10.7, sog_knots=sog, stw_knots=stw, cog_deg=cog,
+                      heading_deg=heading, awa_deg=awa, aws_knots=aws)
+        rows.append(nmea_relay.NavRow(T0 + offset, **values))
+    return rows
+
+
+def circular_mean(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    s = sum(math.sin(math.radians(v)) for v in values) / len(values)
+    c = sum(math.cos(math.radians(v)) for v in values) / len(values)
+    return math.degrees(math.atan2(s, c)) % 360
+
+
+def expected_buckets(rows, width_ms):
+    """{bucket start ms: {column: value}} for ROLLUP_COLUMNS, computed in Python."""
+    buckets = {}
+    for row in rows:
+        buckets.setdefault(row.ts_ms - row.ts_ms % width_ms, []).append(row)
+
+    def mean(values):
+        values = [v for v in values if v is not None]
+        return sum(values) / len(values) if values else None
+
+    def maximum(values):
+        values = [v for v in values if v is not None]
+        return max(values) if values else None
+
+    return {
+        start: {
+            "samples": len(group),
+            "sog_mean": mean([r.sog_knots for r in group]),
+            "sog_max": maximum([r.sog_knots for r in group]),
+            "stw_mean": mean([r.stw_knots for r in group]),
+            "stw_max": maximum([r.stw_knots for r in group]),
+            "cog_mean": circular_mean([r.cog_deg for r in group]),
+            "heading_mean": circular_mean([r.heading_deg for r in group]),
+            "awa_mean": circular_mean([r.awa_deg for r in group]),
+            "aws_max": maximum([r.aws_knots for r in group]),
+        }
+        for start, group in buckets.items()
+    }
+
+
+def same(a, b):
+    if a is None or b is None:
+        return a is b
+    # Bearings near north may come back as 359.999... or 0.0
+    diff = abs(a - b)
+    return diff < 1e-6 or abs(diff - 360) < 1e-6
+
+
+def parse_only():
+    if pglast is None:
+        print("--parse-only needs pglast (pip install pglast)")
+        return 1
+    statements = nmea_relay.SCHEMA_SQL + nmea_relay.ROLLUP_SQL + nmea_relay.ROLLUP_SQL_ASYNC
+    failed = 0
+    for statement in statements:
+        # pglast wants literals where psycopg2 takes %s
+        try:
+            pglast.parse_sql(statement.replace("%s", "NULL"))
+        except pglast.parser.ParseError as e:
+            failed += 1
+            print(f"FAIL {e}\n{statement}")
+    print(f"{len(statements) - failed}/{len(statements)} statements parsed")
+    return 1 if failed else 0
+
+
+def run(db_url):
+    if nmea_relay.psycopg2 is None:
+        print("Needs psycopg2")
+        return 1
+    conn = nmea_relay.psycopg2.connect(db_url)
+    cur = conn.cursor()
+    columns = ", ".join(f"{field} {nmea_relay.nav_column_type(field)}"
+                        for field in nmea_relay.NAV_FIELDS)
+    cur.execute(f"CREATE TEMP TABLE nav_data (time timestamptz NOT NULL, device text NOT NULL, "
+                f"{columns}, PRIMARY KEY (device, time))")
+    for statement in nmea_relay.ROLLUP_SCHEMA:
+        if statement.lstrip().startswith("CREATE TABLE"):
+            cur.execute(statement.replace("CREATE TABLE IF NOT EXISTS", "CREATE TEMP TABLE"))
+    conn.commit()
+
+    writer = nmea_relay.TimescaleDBWriter(db_url, device=DEVICE)
+    writer.conn = conn
+    rows = nav_rows()
+    # Two batches, the second landing in buckets the first already rolled up
+    inserted = writer.insert_rows(rows[:3]) + writer.insert_rows(rows[3:])
+    if inserted != len(rows):
+        print(f"FAIL inserted {inserted} of {len(rows)} rows (see the warning above)")
+        return 1
+
+    failed = 0
+    names = [name for name, _, _ in nmea_relay.ROLLUP_COLUMNS]
+    for (table, width), width_ms in zip(nmea_relay.ROLLUPS, (10_000, 60_000)):
+        cur = writer.conn.cursor()
+        cur.execute(f"SELECT (extract(epoch FROM bucket) * 1000)::bigint, {', '.join(names)} "
+                    f"FROM {table} WHERE device = %s ORDER BY bucket", (DEVICE,))
+        got = {row[0]: dict(zip(names, row[1:])) for row in cur.fetchall()}
+        expected = expected_buckets(rows, width_ms)
+        if sorted(got) != sorted(expected):
+            failed += 1
+            print(f"FAIL {table}: buckets {sorted(got)} != {sorted(expected)}")
+            continue
+        for start, want in expected.items():
+            bad = [name for name in names if not same(got[start][name], want[name])]
+            failed += bool(bad)
+            for name in bad:
+                print(f"FAIL {table} {nmea_relay.ms_isoformat(start)} {name}: "
+                      f"{got[start][name]} != {want[name]}")
+        print(f"{table}: {len(expected)} buckets checked")
+    writer.close()
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check rollup SQL against TimescaleDB")
+    parser.add_argument("--db-url",
+                        default=os.environ.get("TIMESCALE_CONNECTION_STRING", ""),
+                        help="TimescaleDB connection string")
+    parser.add_argument("--parse-only", action="store_true",
+                        help="Only parse the SQL with pglast (no database)")
+    args = parser.parse_args()
+
+    if args.parse_only:
+        sys.exit(parse_only())
+    if not args.db_url:
+        print("Needs --db-url / TIMESCALE_CONNECTION_STRING, or --parse-only")
+        sys.exit(1)
+    sys.exit(run(args.db_url))
+
+
+if __name__ == "__main__":
+    main()
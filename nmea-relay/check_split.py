@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Check that nmea_relay's split-file parser matches the serial one.
+
+For each file, parses it with iter_batches and with iter_batches_split at
+several chunk sizes and resume offsets, and compares rows, batch
+boundaries, resume offsets, line counts, sentence stats and AIS records.
+Small chunk sizes put a cut every few hundred lines, so every file is
+stitched many times over. Exits non-zero on the first mismatch.
+
+Usage:
+    python3 check_split.py ../analysis/*.log
+    python3 check_split.py --workers 4 --chunk-kb 16 --chunk-kb 256 big.log
+"""
+
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import nmea_relay
+
+
+def parse(filepath, start_offset, batch_size, pool=None, workers=1, chunk_bytes=None):
+    stats = nmea_relay.ParseStats()
+    decoder = nmea_relay.AISDecoder()
+    if pool is None:
+        batches = nmea_relay.iter_batches(filepath, start_offset, batch_size,
+                                          stats=stats, ais=decoder)
+    else:
+        batches = nmea_relay.iter_batches_split(filepath, pool, workers, start_offset,
+                                                batch_size, chunk_bytes=chunk_bytes,
+                                                stats=stats, ais=decoder)
+    batches = list(batches)
+    return batches, stats.sentences, decoder.records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check split parsing against serial parsing")
+    parser.add_argument("files", nargs="+", help="NMEA log files")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes")
+    parser.add_argument("--chunk-kb", type=int, action="append",
+                        help="Chunk size to try (repeatable; default 16, 256, 4096)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per batch")
+    args = parser.parse_args()
+    chunk_sizes = [kb << 10 for kb in args.chunk_kb or (16, 256, 4096)]
+
+    failed = False
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for filepath in args.files:
+            serial = parse(filepath, 0, args.batch_size)
+            # Also resume from a checkpoint part way through, as after a restart
+            offsets = [0] + [b[1] for b in serial[0][:1] if len(serial[0]) > 1]
+            for start_offset in offsets:
+                expected = serial if start_offset == 0 else parse(filepath, start_offset,
+                                                                  args.batch_size)
+                for chunk_bytes in chunk_sizes:
+                    got = parse(filepath, start_offset, args.batch_size, pool,
+                                args.workers, chunk_bytes)
+                    ok = got == expected
+                    failed |= not ok
+                    rows = sum(len(b[0]) for b in got[0])
+                    print(f"{'ok  ' if ok else 'FAIL'} {filepath} from {start_offset} "
+                          f"in {chunk_bytes >> 10} KiB chunks: {rows} rows, "
+                          f"{len(got[0])} batches, {len(got[2])} AIS")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,9 @@
 Designed to run on the receiving end of a Syncthing sync. Watches a directory
 for new or updated .nmea/.log files, parses nav data, and inserts to TimescaleDB.
 Tracks which files (and how far into each) have been processed via a local
-SQLite state database, so it can resume after restarts.
+SQLite state database, so it can resume after restarts. Watch mode is
+event-driven via inotify when `inotify_simple` is installed, and falls back to
+polling a cached directory tree otherwise.
 
 Usage:
     # Watch a syncthing folder for new files
@@ -15,16 +17,56 @@ Usage:
 
     # Import all files in a directory
     python3 nmea_relay.py --import-dir /path/to/tracks
+
+    # Parse with 4 processes; a single large log is split between them
+    python3 nmea_relay.py --file race.nmea --workers 4
+
+    # Compress rotated logs for syncing; .gz/.zst logs are read transparently
+    python3 nmea_relay.py --compress track1.nmea track2.nmea
+
+    # Shore box: one watch directory per boat, sharing a connection pool
+    #   devices.json: {"/srv/sync/blacksheep": "blacksheep", "/srv/sync/tern": "tern"}
+    python3 nmea_relay.py --devices devices.json --pool-size 4
+
+    # Once, as the owner of nav_data: add the columns and tables newer
+    # versions write to (ais_positions, rollups). Ingest runs no DDL.
+    python3 nmea_relay.py --init-schema
+
+    # Live ingest from SignalK's NMEA 0183 TCP output
+    python3 nmea_relay.py --tcp signalk:10110
+
+    # Backfill with Prometheus metrics and a per-stage stats log every 30s
+    python3 nmea_relay.py --import-dir /path/to/tracks --metrics-port 9108 --stats-interval 30
+
+    # Backfill a season at no more than 20k rows/s, alongside live ingest,
+    # sizing inserts by commit latency (--throttle, implied by the cap)
+    python3 nmea_relay.py --import-dir /path/to/season --max-rows-per-sec 20000
 """
 
 import argparse
+import asyncio
+import bisect
+import collections
+import functools
 import glob
+import hashlib
+import io
+import itertools
+import json
 import logging
+import multiprocessing
 import os
+import socket
 import sqlite3
+import struct
 import sys
+import threading
 import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty
 
 try:
     import psycopg2
@@ -33,6 +75,27 @@ except ImportError:
     psycopg2 = None
     execute_values = None
 
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+    inotify_flags = None
+
 log = logging.getLogger("nmea_relay")
 
 
@@ -54,33 +117,164 @@ def parse_lat_lon(lat_str, ns, lon_str, ew):
     return lat, lon
 
 
-def parse_line(line):
-    """Parse a single NMEA log line. Returns (timestamp_ms, field_dict) or None."""
-    parts = line.strip().split(";")
-    if len(parts) != 3 or parts[1] != "N" or not parts[2].startswith("$"):
+# Sentence decoders, keyed on the 5-character address (talker + type) that
+# follows the '$'. Each takes the comma-split sentence body (checksum removed)
+# and returns a dict of NAV_FIELDS values, or None to ignore the sentence.
+DECODERS = {}
+
+
+def decoder(*addresses):
+    """Register a sentence decoder for one or more addresses, e.g. "GNRMC"."""
+    def register(fn):
+        for address in addresses:
+            DECODERS[address] = fn
+        return fn
+    return register
+
+
+@decoder("GNRMC", "GPRMC")
+def decode_rmc(fields):
+    if len(fields) < 9 or fields[2] != "A":
         return None
+    lat, lon = parse_lat_lon(fields[3], fields[4], fields[5], fields[6])
+    return {"lat": lat, "lon": lon,
+            "sog_knots": float(fields[7]), "cog_deg": float(fields[8])}
+
+
+@decoder("GNVTG", "GPVTG")
+def decode_vtg(fields):
+    if len(fields) < 6 or not fields[1] or not fields[5]:
+        return None
+    return {"cog_deg": float(fields[1]), "sog_knots": float(fields[5])}
+
+
+@decoder("GNGGA", "GPGGA")
+def decode_gga(fields):
+    if len(fields) < 9 or fields[6] in ("", "0"):
+        return None
+    return {"gps_sats": int(fields[7]), "gps_hdop": float(fields[8])}
+
+
+@decoder("IIVHW")
+def decode_vhw(fields):
+    if len(fields) < 6:
+        return None
+    return {"stw_knots": float(fields[5])}
+
+
+@decoder("IIMWV")
+def decode_mwv(fields):
+    if len(fields) < 6 or not fields[5].startswith("A"):
+        return None
+    if fields[2] == "R":
+        return {"awa_deg": float(fields[1]), "aws_knots": float(fields[3])}
+    if fields[2] == "T":
+        return {"twa_deg": float(fields[1]), "tws_knots": float(fields[3])}
+    return None
+
+
+@decoder("IIHDG")
+def decode_hdg(fields):
+    if len(fields) < 2:
+        return None
+    return {"heading_deg": float(fields[1])}
+
+
+@decoder("IIDPT", "SDDPT")
+def decode_dpt(fields):
+    if len(fields) < 2 or not fields[1]:
+        return None
+    return {"depth_m": float(fields[1])}
+
+
+@decoder("IIMTW", "YXMTW")
+def decode_mtw(fields):
+    if len(fields) < 2 or not fields[1]:
+        return None
+    return {"water_temp_c": float(fields[1])}
+
+
+@decoder("IIRSA", "AGRSA")
+def decode_rsa(fields):
+    if len(fields) < 3 or fields[2] != "A":
+        return None
+    return {"rudder_deg": float(fields[1])}
+
+
+# XDR transducer (type, name) -> field; names vary by manufacturer.
+XDR_FIELDS = {
+    ("A", "ROLL"): "heel_deg", ("A", "HEEL"): "heel_deg",
+    ("A", "PTCH"): "pitch_deg", ("A", "PITCH"): "pitch_deg",
+    ("C", "AIRTEMP"): "air_temp_c", ("C", "ENV_OUTSIDE_T"): "air_temp_c",
+    ("P", "BARO"): "pressure_mbar", ("P", "ENV_ATMOS_P"): "pressure_mbar",
+}
+
+
+@decoder("IIXDR", "YXXDR", "WIXDR")
+def decode_xdr(fields):
+    out = {}
+    # Repeating groups of (type, value, unit, name)
+    for i in range(1, len(fields) - 3, 4):
+        field = XDR_FIELDS.get((fields[i], fields[i + 3].upper()))
+        if field is None or not fields[i + 1]:
+            continue
+        value = float(fields[i + 1])
+        if field == "pressure_mbar":
+            unit = fields[i + 2]
+            if unit == "B":
+                value *= 1000.0
+            elif unit == "P":
+                value /= 100.0
+        out[field] = value
+    return out or None
+
+
+def checksum_ok(sentence):
+    """Validate the '*HH' XOR checksum of a sentence starting with '$' or '!'."""
+    body, sep, given = sentence[1:].partition("*")
+    if not sep:
+        return False
+    calc = 0
+    for ch in body.encode("ascii", errors="replace"):
+        calc ^= ch
     try:
-        ts_ms = int(parts[0])
+        return calc == int(given[:2], 16)
     except ValueError:
-        return None
+        return False
+
 
-    sentence = parts[2]
-    fields = sentence.split(",")
+def parse_sentence(sentence, validate=False):
+    """Decode one bare NMEA sentence. Returns a field dict or None.
 
+    Sentences are dispatched on their address via DECODERS, so a sentence of
+    an unsupported type is rejected after a single dict lookup. With
+    validate=True, sentences with a bad checksum are dropped.
+    """
+    if sentence[:1] != "$":
+        return None
+    decode = DECODERS.get(sentence[1:6])
+    if decode is None:
+        return None
+    if validate and not checksum_ok(sentence):
+        return None
     try:
-        if sentence.startswith("$GNRMC") and len(fields) > 9 and fields[2] == "A":
-            lat, lon = parse_lat_lon(fields[3], fields[4], fields[5], fields[6])
-            return (ts_ms, {"lat": lat, "lon": lon,
-                            "sog_knots": float(fields[7]), "cog_deg": float(fields[8])})
-        elif sentence.startswith("$IIVHW") and len(fields) >= 6:
-            return (ts_ms, {"stw_knots": float(fields[5])})
-        elif sentence.startswith("$IIMWV") and len(fields) >= 6 and fields[5].startswith("A"):
-            return (ts_ms, {"awa_deg": float(fields[1]), "aws_knots": float(fields[3])})
-        elif sentence.startswith("$IIHDG") and len(fields) >= 2:
-            return (ts_ms, {"heading_deg": float(fields[1])})
+        return decode(sentence.partition("*")[0].split(","))
     except (ValueError, IndexError):
         return None
-    return None
+
+
+def parse_line(line, validate=False):
+    """Parse a single NMEA log line. Returns (timestamp_ms, field_dict) or None."""
+    parts = line.split(";", 2)
+    if len(parts) != 3 or parts[1] != "N":
+        return None
+    fields = parse_sentence(parts[2].rstrip(), validate)
+    if fields is None:
+        return None
+    try:
+        return int(parts[0]), fields
+    except ValueError:
+        return None
 
 
 # ---------------------------------------------------------------------------
@@ -88,11 +282,35 @@ def parse_line(line):
 # ---------------------------------------------------------------------------
 
 NAV_FIELDS = ("lat", "lon", "sog_knots", "cog_deg", "stw_knots",
-              "awa_deg", "aws_knots", "heading_deg")
+              "awa_deg", "aws_knots", "heading_deg",
+              "twa_deg", "tws_knots", "depth_m", "water_temp_c", "rudder_deg",
+              "heel_deg", "pitch_deg", "air_temp_c", "pressure_mbar",
+              "gps_sats", "gps_hdop")
+
+# Columns added to nav_data after the original schema; created by --init-schema.
+EXTRA_NAV_COLUMNS = NAV_FIELDS[8:]
+
+# One aggregated row: window start as epoch ms, then NAV_FIELDS (None if not
+# seen). A plain tuple underneath, so it goes to the writers as a record
+# as-is; the database turns ts_ms into a timestamptz (see ms_to_timestamptz).
+NavRow = collections.namedtuple("NavRow", ("ts_ms",) + NAV_FIELDS)
+
+
+def nav_column_type(field):
+    return "integer" if field == "gps_sats" else "double precision"
+
+
+def ms_to_timestamptz(expr):
+    """SQL for the timestamptz of an epoch-ms expression."""
+    return f"to_timestamp({expr}::bigint / 1000.0)"
+
+
+def ms_isoformat(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000.0, tz=timezone.utc).isoformat()
 
 
 class RowAggregator:
-    """Groups NMEA fields arriving within a time window into single rows."""
+    """Groups NMEA fields arriving within a time window into single NavRows."""
 
     def __init__(self, window_ms=1500):
         self.window_ms = window_ms
@@ -114,44 +332,1604 @@ class RowAggregator:
         return None
 
     def _emit(self):
-        ts = datetime.fromtimestamp(self.current_ts / 1000.0, tz=timezone.utc)
-        row = {"time": ts}
-        for f in NAV_FIELDS:
-            row[f] = self.current_fields.get(f)
+        fields = self.current_fields
+        row = None
+        if fields.get("lat") is not None:
+            row = NavRow._make((self.current_ts, *map(fields.get, NAV_FIELDS)))
         self.current_ts = None
         self.current_fields = {}
-        if row.get("lat") is not None:
-            return row
+        return row
+
+
+# ---------------------------------------------------------------------------
+# AIS decoding
+# ---------------------------------------------------------------------------
+
+AIS_ADDRESSES = ("AIVDM", "AIVDO")
+
+# Columns of ais_positions after (time, device). Position reports (types
+# 1/2/3/18/19) and static data (5/24) share the table; columns a message
+# does not carry are NULL.
+AIS_COLUMNS = (
+    ("mmsi", "integer NOT NULL"),
+    ("msg_type", "smallint NOT NULL"),
+    ("own_ship", "boolean"),
+    ("lat", "double precision"),
+    ("lon", "double precision"),
+    ("sog_knots", "double precision"),
+    ("cog_deg", "double precision"),
+    ("heading_deg", "double precision"),
+    ("nav_status", "smallint"),
+    ("ship_name", "text"),
+    ("callsign", "text"),
+    ("ship_type", "smallint"),
+    ("imo", "integer"),
+    ("destination", "text"),
+    ("length_m", "double precision"),
+    ("beam_m", "double precision"),
+    ("draught_m", "double precision"),
+)
+AIS_FIELDS = tuple(name for name, _ in AIS_COLUMNS)
+
+AIS_SCHEMA = (
+    f"""CREATE TABLE IF NOT EXISTS ais_positions (
+        time timestamptz NOT NULL,
+        device text NOT NULL,
+        {", ".join(name + " " + decl for name, decl in AIS_COLUMNS)}
+    )""",
+    "SELECT create_hypertable('ais_positions', 'time', "
+    "chunk_time_interval => INTERVAL '7d', if_not_exists => TRUE)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ais_positions_key "
+    "ON ais_positions (mmsi, msg_type, device, time)",
+)
+
+# Payload armouring: every character carries six bits. str.translate
+# expands a whole payload into a '0'/'1' string in one call, and fields are
+# read from that with int(..., 2). Characters outside the alphabet survive
+# the translation and make int() fail, which rejects the message.
+_AIS_BITS = str.maketrans({chr(c): format(c - 48 if c < 88 else c - 56, "06b")
+                           for c in list(range(48, 88)) + list(range(96, 120))})
+_AIS_TEXT = "@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_ !\"#$%&'()*+,-./0123456789:;<=>?"
+
+# Message type -> (decoder, minimum payload bits)
+AIS_DECODERS = {}
+
+
+def ais_decoder(*msg_types, min_bits):
+    """Register an AIS message decoder for one or more message types."""
+    def register(fn):
+        for msg_type in msg_types:
+            AIS_DECODERS[msg_type] = (fn, min_bits)
+        return fn
+    return register
+
+
+def _uint(bits, start, length):
+    return int(bits[start:start + length], 2)
+
+
+def _int(bits, start, length):
+    value = int(bits[start:start + length], 2)
+    return value - (1 << length) if value >> (length - 1) else value
+
+
+def _text(bits, start, length):
+    end = min(start + length, len(bits))
+    text = "".join(_AIS_TEXT[int(bits[i:i + 6], 2)] for i in range(start, end - 5, 6))
+    return text.partition("@")[0].strip() or None
+
+
+def _motion(fields, bits, at):
+    """SOG, position, COG and heading: same layout in types 1-3 and 18/19."""
+    sog = _uint(bits, at, 10)
+    lon = _int(bits, at + 11, 28)
+    lat = _int(bits, at + 39, 27)
+    cog = _uint(bits, at + 66, 12)
+    heading = _uint(bits, at + 78, 9)
+    fields["sog_knots"] = sog / 10.0 if sog != 1023 else None
+    fields["lon"] = lon / 600000.0 if abs(lon) <= 180 * 600000 else None
+    fields["lat"] = lat / 600000.0 if abs(lat) <= 90 * 600000 else None
+    fields["cog_deg"] = cog / 10.0 if cog < 3600 else None
+    fields["heading_deg"] = float(heading) if heading < 360 else None
+
+
+def _dimensions(fields, bits, at):
+    """Length and beam from the to-bow/stern/port/starboard distances."""
+    length = _uint(bits, at, 9) + _uint(bits, at + 9, 9)
+    beam = _uint(bits, at + 18, 6) + _uint(bits, at + 24, 6)
+    fields["length_m"] = float(length) if length else None
+    fields["beam_m"] = float(beam) if beam else None
+
+
+@ais_decoder(1, 2, 3, min_bits=137)
+def decode_ais_class_a(fields, bits):
+    fields["nav_status"] = _uint(bits, 38, 4)
+    _motion(fields, bits, 50)
+
+
+@ais_decoder(18, min_bits=133)
+def decode_ais_class_b(fields, bits):
+    _motion(fields, bits, 46)
+
+
+@ais_decoder(19, min_bits=301)
+def decode_ais_class_b_extended(fields, bits):
+    _motion(fields, bits, 46)
+    fields["ship_name"] = _text(bits, 143, 120)
+    fields["ship_type"] = _uint(bits, 263, 8)
+    _dimensions(fields, bits, 271)
+
+
+@ais_decoder(5, min_bits=420)
+def decode_ais_static(fields, bits):
+    imo = _uint(bits, 40, 30)
+    fields["imo"] = imo or None
+    fields["callsign"] = _text(bits, 70, 42)
+    fields["ship_name"] = _text(bits, 112, 120)
+    fields["ship_type"] = _uint(bits, 232, 8)
+    _dimensions(fields, bits, 240)
+    draught = _uint(bits, 294, 8)
+    fields["draught_m"] = draught / 10.0 if draught else None
+    fields["destination"] = _text(bits, 302, 120)
+
+
+@ais_decoder(24, min_bits=160)
+def decode_ais_static_b(fields, bits):
+    if _uint(bits, 38, 2) == 0:
+        fields["ship_name"] = _text(bits, 40, 120)
+    elif len(bits) >= 162:
+        fields["ship_type"] = _uint(bits, 40, 8)
+        fields["callsign"] = _text(bits, 90, 42)
+        _dimensions(fields, bits, 132)
+
+
+class AISDecoder:
+    """Reassembles !AIVDM/!AIVDO sentences and collects decoded messages.
+
+    Decoded records (dicts with ts_ms and AIS_FIELDS) accumulate in `records`
+    until take(). Fragments of a multi-sentence message are keyed on talker,
+    sequence id and channel, and the message is stamped with the time of its
+    first fragment. With validate=True, sentences with a bad checksum are
+    dropped.
+    """
+
+    def __init__(self, validate=False):
+        self.validate = validate
+        self.partial = {}       # (address, seq id, channel) -> (ts_ms, [payload, ...])
+        self.records = []
+
+    def take(self):
+        records, self.records = self.records, []
+        return records
+
+    def add_line(self, line):
+        """Feed one log line. Returns True if it was an AIS sentence that was accepted."""
+        parts = line.split(";", 2)
+        if len(parts) != 3 or parts[1] != "N" or parts[2][1:6] not in AIS_ADDRESSES:
+            return False
+        try:
+            ts_ms = int(parts[0])
+        except ValueError:
+            return False
+        return self.add(ts_ms, parts[2].rstrip())
+
+    def add(self, ts_ms, sentence):
+        """Feed one bare AIS sentence. Returns True if it was accepted."""
+        if sentence[:1] != "!" or (self.validate and not checksum_ok(sentence)):
+            return False
+        f = sentence.partition("*")[0].split(",")
+        if len(f) != 7:
+            return False
+        try:
+            count, number, fill = int(f[1]), int(f[2]), int(f[6] or 0)
+        except ValueError:
+            return False
+        payload = f[5]
+        if count > 1:
+            key = (f[0], f[3], f[4])
+            if number == 1:
+                self.partial[key] = (ts_ms, [payload])
+                return True
+            pending = self.partial.get(key)
+            if pending is None or len(pending[1]) != number - 1:
+                self.partial.pop(key, None)
+                return False
+            pending[1].append(payload)
+            if number < count:
+                return True
+            del self.partial[key]
+            ts_ms, payload = pending[0], "".join(pending[1])
+
+        bits = payload.translate(_AIS_BITS)
+        if fill:
+            bits = bits[:-fill]
+        try:
+            msg_type = _uint(bits, 0, 6)
+            if msg_type not in AIS_DECODERS:
+                # Well-formed, but not a type ais_positions stores
+                return True
+            decode, min_bits = AIS_DECODERS[msg_type]
+            if len(bits) < min_bits:
+                return False
+            fields = dict.fromkeys(AIS_FIELDS)
+            fields["msg_type"] = msg_type
+            fields["mmsi"] = _uint(bits, 8, 30)
+            decode(fields, bits)
+        except ValueError:
+            return False
+        fields["own_ship"] = f[0].endswith("VDO")
+        fields["ts_ms"] = ts_ms
+        self.records.append(fields)
+        return True
+
+
+def write_ais(writer, records):
+    """Insert decoded AIS records. Returns False if the writer refused them."""
+    if not records:
+        return True
+    n = writer.insert_ais(records)
+    METRICS.inc("ais_inserted_total", n - getattr(writer, "spooled", 0))
+    return n > 0
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+# name -> (type, help). Names are exported with a "nmea_relay_" prefix.
+METRIC_HELP = {
+    "lines_read_total": ("counter", "Log lines read"),
+    "sentences_total": ("counter", "Sentences seen, by type and result (ok/error/ignored)"),
+    "parse_seconds_total": ("counter", "Time spent parsing and aggregating"),
+    "rows_aggregated_total": ("counter", "Rows produced by the aggregator"),
+    "rows_inserted_total": ("counter", "Rows accepted by the writer"),
+    "rows_spooled_total": ("counter", "Rows kept in the spool (outage or quarantine) instead of the database"),
+    "rows_quarantined_total": ("counter", "Rows the database rejected, kept in the spool's quarantine"),
+    "ais_inserted_total": ("counter", "AIS messages accepted by the writer"),
+    "insert_failures_total": ("counter", "Batches the writer refused"),
+    "rows_dropped_total": ("counter", "Rows dropped after repeated insert failures (--tcp)"),
+    "insert_seconds": ("histogram", "Insert latency per batch"),
+    "batch_rows": ("histogram", "Rows per insert batch"),
+    "state_seconds": ("histogram", "SQLite checkpoint latency per batch"),
+    "spool_rows": ("gauge", "Rows waiting in the outage spool"),
+    "queue_batches": ("gauge", "Parsed batches waiting for an insert (--async)"),
+    "file_lag_bytes": ("gauge", "Bytes of a file not yet ingested, as of its last checkpoint "
+                                "(only files still being ingested)"),
+    "throttle_batch_rows": ("gauge", "Rows per insert chosen by the backfill throttle"),
+    "throttle_concurrency": ("gauge", "Inserts in flight allowed by the backfill throttle"),
+    "device_rows_inserted_total": ("counter", "Rows accepted by the writer, by device (--devices)"),
+    "device_ais_inserted_total": ("counter", "AIS messages accepted, by device (--devices)"),
+    "device_insert_failures_total": ("counter", "Inserts the writer refused, by device (--devices)"),
+    "device_insert_seconds": ("histogram", "Insert latency, by device (--devices)"),
+    "device_pool_wait_seconds": ("histogram", "Wait for a pooled connection, by device (--devices)"),
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BATCH_BUCKETS = (1, 10, 100, 500, 1000, 2500, 5000, 10000, 50000)
+
+
+class ParseStats:
+    """Per-type sentence counts and parse time collected by one parser.
+
+    Parsers fill one of these when metrics are enabled; it is merged into
+    METRICS by whoever consumes the batches, so it also works across the
+    process pool.
+    """
+
+    def __init__(self):
+        self.sentences = {}     # (type, result) -> count
+        self.seconds = 0.0
+
+    def record(self, sentence, ok):
+        address = sentence[1:6]
+        if sentence[:1] not in ("$", "!") or len(address) != 5 or not address.isalnum():
+            key = ("other", "ignored")
+        elif ok:
+            key = (address, "ok")
+        else:
+            handled = address in DECODERS or address in AIS_ADDRESSES
+            key = (address, "error" if handled else "ignored")
+        self.sentences[key] = self.sentences.get(key, 0) + 1
+
+    def record_line(self, line, ok):
+        parts = line.split(";", 2)
+        self.record(parts[2] if len(parts) == 3 and parts[1] == "N" else "", ok)
+
+
+class Metrics:
+    """Counters, gauges and histograms for the /metrics endpoint and stats log.
+
+    Updated per batch rather than per line, under a lock so the HTTP and
+    stats threads can read it. `enabled` turns on per-sentence accounting.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.counters = {}      # (name, labels) -> value
+        self.gauges = {}
+        self.histograms = {}    # (name, labels) -> (buckets, counts, [sum, count])
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def unset(self, name, **labels):
+        """Drop one series of a gauge."""
+        with self.lock:
+            self.gauges.pop((name, tuple(sorted(labels.items()))), None)
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = (buckets, [0] * len(buckets), [0.0, 0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist[1][i] += 1
+            hist[2][0] += value
+            hist[2][1] += 1
+
+    def record_insert(self, n_rows, inserted, seconds, spooled=0):
+        """spooled: how many of the inserted rows went to the outage spool."""
+        self.observe("insert_seconds", seconds)
+        self.observe("batch_rows", n_rows, BATCH_BUCKETS)
+        if inserted:
+            self.inc("rows_inserted_total", inserted - spooled)
+            if spooled:
+                self.inc("rows_spooled_total", spooled)
+        else:
+            self.inc("insert_failures_total")
+
+    def record_checkpoint(self, filepath, st, resume_offset, seconds):
+        self.observe("state_seconds", seconds)
+        size = log_size(filepath, st)
+        if size is None:
+            return
+        # A file's series goes once it is caught up, so the series (and the
+        # stats log's total) cover only the files still being ingested
+        lag = size - resume_offset
+        if lag > 0:
+            self.set("file_lag_bytes", lag, file=os.path.basename(filepath))
+        else:
+            self.unset("file_lag_bytes", file=os.path.basename(filepath))
+
+    def add_parse(self, stats):
+        """Merge and reset a ParseStats."""
+        with self.lock:
+            for (stype, result), n in stats.sentences.items():
+                key = ("sentences_total", (("result", result), ("type", stype)))
+                self.counters[key] = self.counters.get(key, 0) + n
+            key = ("parse_seconds_total", ())
+            self.counters[key] = self.counters.get(key, 0) + stats.seconds
+        stats.sentences.clear()
+        stats.seconds = 0.0
+
+    def snapshot(self):
+        """Totals per metric name (labels summed), for the stats log."""
+        with self.lock:
+            totals = {}
+            for (name, labels), value in self.counters.items():
+                totals[name] = totals.get(name, 0) + value
+                if name == "sentences_total" and ("result", "error") in labels:
+                    totals["sentence_errors"] = totals.get("sentence_errors", 0) + value
+            for (name, _), (_, _, (total, count)) in self.histograms.items():
+                totals[name + "_sum"] = totals.get(name + "_sum", 0) + total
+                totals[name + "_count"] = totals.get(name + "_count", 0) + count
+            for (name, _), value in self.gauges.items():
+                totals[name] = totals.get(name, 0) + value
+            return totals
+
+    def render(self):
+        """All metrics in Prometheus text exposition format."""
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\")
+                                                  .replace('"', '\\"')) for k, v in pairs) + "}"
+
+        series = {}     # name -> [(labels, lines)]
+        with self.lock:
+            for (name, labels), value in list(self.counters.items()) + list(self.gauges.items()):
+                series.setdefault(name, []).append(
+                    (labels, ["nmea_relay_%s%s %s" % (name, fmt(labels), value)]))
+            for (name, labels), (buckets, counts, (total, count)) in self.histograms.items():
+                lines = ["nmea_relay_%s_bucket%s %d" % (name, fmt(labels, [("le", bound)]), n)
+                         for bound, n in zip(buckets, counts)]
+                lines.append("nmea_relay_%s_bucket%s %d" % (name, fmt(labels, [("le", "+Inf")]), count))
+                lines.append("nmea_relay_%s_sum%s %s" % (name, fmt(labels), total))
+                lines.append("nmea_relay_%s_count%s %d" % (name, fmt(labels), count))
+                series.setdefault(name, []).append((labels, lines))
+
+        out = []
+        for name in sorted(series):
+            kind, text = METRIC_HELP.get(name, ("untyped", name))
+            out.append("# HELP nmea_relay_%s %s" % (name, text))
+            out.append("# TYPE nmea_relay_%s %s" % (name, kind))
+            for _, lines in sorted(series[name]):
+                out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+METRICS = Metrics()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host=""):
+    """Serve METRICS on http://host:port/metrics from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info("Metrics on http://%s:%d/metrics", host or "0.0.0.0", port)
+    return server
+
+
+def log_stats(interval):
+    """Log per-stage throughput and time every `interval` s from a daemon thread.
+
+    Parse, insert and state times are the seconds each stage was busy during
+    the interval, which shows where a backfill is bound.
+    """
+    def run():
+        previous = METRICS.snapshot()
+        while True:
+            time.sleep(interval)
+            current = METRICS.snapshot()
+
+            def delta(name):
+                return current.get(name, 0) - previous.get(name, 0)
+
+            inserts = delta("insert_seconds_count")
+            log.info("stats: %.0f lines/s, %.0f rows/s parsed, %.0f rows/s inserted | "
+                     "busy: parse %.1fs, insert %.1fs (%d batches, %.0f ms avg), state %.1fs | "
+                     "%d sentence errors, %d insert failures | spool %d rows, lag %d bytes",
+                     delta("lines_read_total") / interval,
+                     delta("rows_aggregated_total") / interval,
+                     delta("rows_inserted_total") / interval,
+                     delta("parse_seconds_total"), delta("insert_seconds_sum"), inserts,
+                     delta("insert_seconds_sum") * 1000 / inserts if inserts else 0,
+                     delta("state_seconds_sum"),
+                     delta("sentence_errors"),
+                     delta("insert_failures_total"),
+                     current.get("spool_rows", 0), current.get("file_lag_bytes", 0))
+            previous = current
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+# ---------------------------------------------------------------------------
+# Compressed logs
+# ---------------------------------------------------------------------------
+
+# Logs can be stored compressed (.nmea.gz, .log.zst, ...). compress_log()
+# writes them as a run of independently compressed blocks, each a complete
+# gzip member or zstd frame starting on a line boundary, plus a sidecar
+# "<file>.idx" mapping each block's uncompressed offset and first timestamp
+# to its compressed offset. Standard tools read the result as one stream.
+# Byte offsets in the state database are always uncompressed offsets.
+COMPRESSED_EXTENSIONS = (".gz", ".zst")
+INDEX_SUFFIX = ".idx"
+COMPRESS_BLOCK_BYTES = 256 << 10
+
+
+def compressed_format(filepath):
+    """".gz" or ".zst" for a compressed log, None for a plain one."""
+    for ext in COMPRESSED_EXTENSIONS:
+        if filepath.endswith(ext):
+            return ext
+    return None
+
+
+def _decompressor(fmt):
+    if fmt == ".gz":
+        return zlib.decompressobj(31)
+    if zstandard is None:
+        raise RuntimeError("zstandard not installed: pip install zstandard")
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def _compress_block(block, fmt, level=None):
+    if fmt == ".gz":
+        c = zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 31)
+        return c.compress(block) + c.flush()
+    if zstandard is None:
+        raise RuntimeError("zstandard not installed: pip install zstandard")
+    return zstandard.ZstdCompressor(level=3 if level is None else level).compress(block)
+
+
+class _BlockReader(io.RawIOBase):
+    """Decompressed contents of a gzip/zstd file from a compressed offset.
+
+    Carries on across members/frames, and treats a truncated last block as
+    end of file, so a compressed log still being written reads like a plain
+    one that ends in a partial line.
+    """
+
+    def __init__(self, filepath, fmt, start=0):
+        self.raw = open(filepath, "rb")
+        self.raw.seek(start)
+        self.fmt = fmt
+        self.dec = _decompressor(fmt)
+        self.buf = b""
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self.pos >= len(self.buf):
+            pending = b""
+            if self.dec.eof:
+                pending = self.dec.unused_data
+                self.dec = _decompressor(self.fmt)
+            data = pending or self.raw.read(1 << 16)
+            if not data:
+                return 0
+            self.buf, self.pos = self.dec.decompress(data), 0
+        n = min(len(b), len(self.buf) - self.pos)
+        b[:n] = self.buf[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+@functools.lru_cache(maxsize=256)
+def _load_index(index_path, size, mtime_ns):
+    try:
+        with open(index_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_index(filepath):
+    """The sidecar block index of a compressed log, or None if it has none.
+
+    An index is only used while its recorded size matches the file's.
+    """
+    try:
+        st = os.stat(filepath)
+        ist = os.stat(filepath + INDEX_SUFFIX)
+    except OSError:
         return None
+    index = _load_index(filepath + INDEX_SUFFIX, ist.st_size, ist.st_mtime_ns)
+    if index is None or index.get("size") != st.st_size:
+        return None
+    return index
+
+
+def log_size(filepath, st=None):
+    """Uncompressed size of a log, or None if that would need a full decompress."""
+    if compressed_format(filepath) is None:
+        return (st or os.stat(filepath)).st_size
+    index = read_index(filepath)
+    return index["raw_size"] if index is not None else None
+
+
+def open_log(filepath, offset=0):
+    """Open a plain or compressed log for binary reading at uncompressed `offset`.
+
+    Plain files are seeked. Compressed files start decompressing at the last
+    indexed block at or before offset (or at the beginning, without an
+    index) and skip forward to it.
+    """
+    fmt = compressed_format(filepath)
+    if fmt is None:
+        f = open(filepath, "rb")
+        f.seek(offset)
+        return f
+    raw_start = comp_start = 0
+    index = read_index(filepath)
+    if index is not None and index["blocks"]:
+        blocks = index["blocks"]
+        i = max(bisect.bisect_right([b[0] for b in blocks], offset) - 1, 0)
+        raw_start, comp_start = blocks[i][0], blocks[i][1]
+    f = io.BufferedReader(_BlockReader(filepath, fmt, comp_start), 1 << 16)
+    skip = offset - raw_start
+    while skip > 0:
+        data = f.read(min(skip, 1 << 20))
+        if not data:
+            break
+        skip -= len(data)
+    return f
+
+
+def compress_log(src, fmt=".gz", block_bytes=COMPRESS_BLOCK_BYTES, level=None):
+    """Write src as a block-compressed src+fmt with its sidecar index.
+
+    Blocks are about block_bytes of uncompressed log, extended to the end of
+    a line. The index is written first and the log renamed into place last,
+    so a watcher never sees a compressed log without its index. Returns the
+    output path.
+    """
+    dst = src + fmt
+    blocks = []
+    raw_offset = comp_offset = 0
+    ts = None
+    with open(src, "rb") as fin, open(dst + ".tmp", "wb") as fout:
+        while True:
+            block = fin.read(block_bytes)
+            if not block:
+                break
+            if not block.endswith(b"\n"):
+                block += fin.readline()
+            try:
+                ts = int(block[:block.find(b";")])
+            except ValueError:
+                pass
+            data = _compress_block(block, fmt, level)
+            fout.write(data)
+            blocks.append([raw_offset, comp_offset, ts])
+            raw_offset += len(block)
+            comp_offset += len(data)
+
+    index = {"format": fmt, "size": comp_offset, "raw_size": raw_offset,
+             "block_bytes": block_bytes, "blocks": blocks}
+    with open(dst + INDEX_SUFFIX + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(dst + INDEX_SUFFIX + ".tmp", dst + INDEX_SUFFIX)
+    os.replace(dst + ".tmp", dst)
+    return dst
 
 
 # ---------------------------------------------------------------------------
 # File parser
 # ---------------------------------------------------------------------------
 
-def parse_file(filepath, start_line=0):
-    """Parse an NMEA file from a given line offset. Returns (rows, lines_read)."""
+BATCH_ROWS = 5000
+
+
+def iter_batches(filepath, start_offset=0, batch_size=BATCH_ROWS, validate=False, stats=None,
+                 ais=None):
+    """Parse an NMEA file from a given byte offset, yielding batches of rows.
+
+    Yields (rows, resume_offset, lines_read) with at most batch_size rows per
+    batch. resume_offset is where parsing can restart without losing or
+    duplicating any row already yielded: the start of the aggregation window
+    that is still open when the batch is cut. lines_read counts lines up to
+    resume_offset. The final batch flushes the open window and ends at the
+    last complete line.
+
+    Only complete (newline-terminated) lines are consumed, so a line that is
+    still being written is left for the next pass. `validate` enables NMEA
+    checksum validation (see parse_line). Sentences are counted by type into
+    `stats` (a ParseStats) if given, and AIS sentences are fed to `ais` (an
+    AISDecoder) if given.
+    """
     aggregator = RowAggregator()
+    window_ms = aggregator.window_ms
     rows = []
     lines_read = 0
-
-    with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-        for i, line in enumerate(f):
-            if i < start_line:
-                continue
+    offset = start_offset
+    window_offset, window_lines = start_offset, 0
+
+    with open_log(filepath, start_offset) as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            line_offset = offset
+            offset += len(raw)
             lines_read += 1
-            result = parse_line(line)
-            if result is not None:
-                ts_ms, fields = result
-                row = aggregator.add(ts_ms, fields)
-                if row is not None:
-                    rows.append(row)
+            line = raw.decode("utf-8", errors="ignore")
+            result = parse_line(line, validate)
+            if result is None:
+                accepted = ais is not None and "!" in line and ais.add_line(line)
+                if stats is not None:
+                    stats.record_line(line, accepted)
+                continue
+            if stats is not None:
+                stats.record_line(line, True)
+            ts_ms, fields = result
+            current_ts = aggregator.current_ts
+            if current_ts is None or ts_ms - current_ts > window_ms:
+                window_offset, window_lines = line_offset, lines_read - 1
+            row = aggregator.add(ts_ms, fields)
+            if row is not None:
+                rows.append(row)
+                if len(rows) >= batch_size:
+                    yield rows, window_offset, window_lines
+                    rows = []
 
     row = aggregator.flush()
     if row is not None:
         rows.append(row)
+    yield rows, offset, lines_read
+
+
+def parse_file(filepath, start_offset=0):
+    """Parse an NMEA file from a given byte offset in one go.
+
+    Returns (rows, end_offset, lines_read); see iter_batches.
+    """
+    rows = []
+    end_offset, lines_read = start_offset, 0
+    for batch, end_offset, lines_read in iter_batches(filepath, start_offset):
+        rows.extend(batch)
+    return rows, end_offset, lines_read
+
+
+# Parsed batches a pool worker may have queued for the parent (stream_batches)
+STREAM_QUEUE_BATCHES = 2
+
+
+def stream_batches(queue, filepath, start_offset=0, batch_size=BATCH_ROWS, validate=False,
+                   bulk=False, collect_stats=False, ais=False):
+    """iter_batches (or iter_batches_bulk) run in a process pool, streamed through `queue`.
+
+    Each batch is put on the queue (a bounded multiprocessing.Manager queue,
+    so a worker never runs more than its size ahead of the parent) as
+    (batch, stats, ais_records): the ParseStats of the lines parsed for it
+    if collect_stats, and the AIS records decoded since the previous batch
+    if ais. None follows the last batch, even if parsing fails.
+    """
+    parse = iter_batches_bulk if bulk else iter_batches
+    decoder = AISDecoder(validate) if ais else None
+    stats = ParseStats() if collect_stats else None
+    try:
+        start = time.perf_counter()
+        for batch in parse(filepath, start_offset, batch_size, validate, stats=stats,
+                           ais=decoder):
+            if stats is not None:
+                stats.seconds = time.perf_counter() - start
+            queue.put((batch, stats, decoder.take() if decoder is not None else None))
+            if stats is not None:
+                # Sent (pickled) by put, so the next batch counts from zero
+                stats.sentences.clear()
+            start = time.perf_counter()
+    finally:
+        queue.put(None)
+
+
+def queued_batches(queue, future, stats=None, ais=None):
+    """The batches a stream_batches worker puts on queue, with its stats and
+    AIS records merged into stats and ais as each batch arrives.
+
+    Closing the generator early (an insert failed) drains the queue, so the
+    worker can finish. A parse error is raised once the queue is done, as
+    is the pool breaking (a worker killed before it could end the queue).
+    """
+    def get():
+        while True:
+            try:
+                return queue.get(timeout=1)
+            except Empty:
+                if future.done():
+                    return None
+
+    try:
+        while True:
+            item = get()
+            if item is None:
+                break
+            batch, batch_stats, records = item
+            if batch_stats is not None:
+                for key, n in batch_stats.sentences.items():
+                    stats.sentences[key] = stats.sentences.get(key, 0) + n
+                stats.seconds += batch_stats.seconds
+            if records:
+                ais.records.extend(records)
+            yield batch
+    except GeneratorExit:
+        while get() is not None:
+            pass
+        raise
+    future.result()
+
+
+def timed_batches(batches, stats):
+    """Pass batches through, adding the time spent producing each to stats.seconds."""
+    batches = iter(batches)
+    while True:
+        start = time.perf_counter()
+        batch = next(batches, None)
+        stats.seconds += time.perf_counter() - start
+        if batch is None:
+            return
+        yield batch
+
+
+# ---------------------------------------------------------------------------
+# Bulk (vectorized) parser
+# ---------------------------------------------------------------------------
+
+# Bytes read per bulk chunk. A chunk ends on a line boundary, and the last
+# aggregation window of a chunk is re-read at the start of the next one.
+BULK_CHUNK_BYTES = 8 << 20
+
+# Longest numeric field the bulk parser converts itself: sign, dot and up to
+# 15 digits, so the integer mantissa is exact in a float64.
+_BULK_MAX_NUMBER = 17
+_BULK_POW10 = None
+
+
+def _bulk_numbers(buf, starts, ends):
+    """Vectorized float() for byte spans of the form [+-]digits[.digits].
+
+    Returns (values, ok). Spans in any other form (empty, exponent, spaces,
+    too many digits) get ok=False so the caller can defer them to float().
+    For the accepted form, the exact integer mantissa divided by an exact
+    power of ten is correctly rounded, i.e. identical to float().
+    """
+    global _BULK_POW10
+    if _BULK_POW10 is None:
+        _BULK_POW10 = np.array([float(10 ** k) for k in range(16)])
+
+    n = len(starts)
+    lengths = ends - starts
+    if n == 0:
+        return np.zeros(0), np.zeros(0, bool)
+    width = min(int(lengths.max()), _BULK_MAX_NUMBER)
+    if width <= 0:
+        return np.zeros(n), np.zeros(n, bool)
+
+    cols = np.arange(width)
+    in_span = cols < lengths[:, None]
+    chars = buf[np.minimum(starts[:, None] + cols, len(buf) - 1)]
+    chars[~in_span] = 0
+
+    signed = (chars[:, 0] == 43) | (chars[:, 0] == 45)
+    negative = chars[:, 0] == 45
+    body = in_span.copy()
+    body[:, 0] &= ~signed
+    is_digit = body & (chars >= 48) & (chars <= 57)
+    is_dot = body & (chars == 46)
+    n_digits = is_digit.sum(1)
+    n_dots = is_dot.sum(1)
+    ok = ((lengths <= width) & ((is_digit | is_dot) == body).all(1) &
+          (n_dots <= 1) & (n_digits >= 1) & (n_digits <= 15))
+
+    dot_at = np.where(n_dots > 0, is_dot.argmax(1), width)
+    frac_digits = n_digits - (is_digit & (cols < dot_at[:, None])).sum(1)
+    mantissa = np.zeros(n, np.int64)
+    for j in range(width):
+        mantissa = np.where(is_digit[:, j], mantissa * 10 + (chars[:, j].astype(np.int64) - 48),
+                            mantissa)
+
+    values = mantissa / _BULK_POW10[np.minimum(frac_digits, 15)]
+    values = np.where(negative, -values, values)
+    return values, ok
+
+
+class _BulkFields:
+    """Field spans for a set of sentences sharing one decoder."""
+
+    def __init__(self, buf, commas, dollar, star):
+        self.buf = buf
+        self.commas = commas
+        self.dollar = dollar
+        self.star = star
+        self.first = np.searchsorted(commas, dollar)
+        self.count = np.searchsorted(commas, star) - self.first + 1
+
+    def span(self, k):
+        """(start, end) of field k; empty spans for fields past the end."""
+        last = len(self.commas) - 1
+        starts = self.commas[np.clip(self.first + k - 1, 0, last)] + 1
+        ends = np.where(k < self.count - 1,
+                        self.commas[np.clip(self.first + k, 0, last)], self.star)
+        missing = k >= self.count
+        return np.where(missing, self.star, starts), np.where(missing, self.star, ends)
+
+    def number(self, k):
+        return _bulk_numbers(self.buf, *self.span(k))
+
+    def equals(self, k, char):
+        """Field k is exactly the single character `char`."""
+        starts, ends = self.span(k)
+        return (ends - starts == 1) & (self.buf[starts] == ord(char))
+
+    def startswith(self, k, char):
+        starts, ends = self.span(k)
+        return (ends > starts) & (self.buf[np.minimum(starts, len(self.buf) - 1)] == ord(char))
+
+    def nonempty(self, k):
+        starts, ends = self.span(k)
+        return ends > starts
+
+
+# Each bulk decoder mirrors a scalar decoder. It returns (accept, reject,
+# values): `accept` sentences yield `values`, `reject` sentences are ones the
+# scalar decoder returns None for. Anything else is handed to the scalar
+# decoder, so the bulk and scalar paths always agree.
+
+def _bulk_rmc(fb):
+    reject = (fb.count < 9) | ~fb.equals(2, "A")
+    lat_s, lat_e = fb.span(3)
+    lon_s, lon_e = fb.span(5)
+    lat_deg, ok1 = _bulk_numbers(fb.buf, lat_s, np.minimum(lat_s + 2, lat_e))
+    lat_min, ok2 = _bulk_numbers(fb.buf, np.minimum(lat_s + 2, lat_e), lat_e)
+    lon_deg, ok3 = _bulk_numbers(fb.buf, lon_s, np.minimum(lon_s + 3, lon_e))
+    lon_min, ok4 = _bulk_numbers(fb.buf, np.minimum(lon_s + 3, lon_e), lon_e)
+    sog, ok5 = fb.number(7)
+    cog, ok6 = fb.number(8)
+    lat = lat_deg + (lat_min / 60.0)
+    lat = np.where(fb.equals(4, "S"), -lat, lat)
+    lon = lon_deg + (lon_min / 60.0)
+    lon = np.where(fb.equals(6, "W"), -lon, lon)
+    accept = ~reject & ok1 & ok2 & ok3 & ok4 & ok5 & ok6
+    return accept, reject, {"lat": lat, "lon": lon, "sog_knots": sog, "cog_deg": cog}
+
+
+def _bulk_vhw(fb):
+    stw, ok = fb.number(5)
+    reject = fb.count < 6
+    return ~reject & ok, reject, {"stw_knots": stw}
+
+
+def _bulk_mwv(fb):
+    relative = fb.equals(2, "R")
+    true = fb.equals(2, "T")
+    reject = (fb.count < 6) | ~fb.startswith(5, "A") | ~(relative | true)
+    angle, ok1 = fb.number(1)
+    speed, ok2 = fb.number(3)
+    nan = np.full(len(angle), np.nan)
+    values = {"awa_deg": np.where(relative, angle, nan), "aws_knots": np.where(relative, speed, nan),
+              "twa_deg": np.where(true, angle, nan), "tws_knots": np.where(true, speed, nan)}
+    return ~reject & ok1 & ok2, reject, values
+
+
+def _bulk_hdg(fb):
+    heading, ok = fb.number(1)
+    reject = fb.count < 2
+    return ~reject & ok, reject, {"heading_deg": heading}
+
+
+def _bulk_single(field):
+    def decode(fb):
+        value, ok = fb.number(1)
+        reject = (fb.count < 2) | ~fb.nonempty(1)
+        return ~reject & ok, reject, {field: value}
+    return decode
+
+
+BULK_DECODERS = {
+    decode_rmc: _bulk_rmc,
+    decode_vhw: _bulk_vhw,
+    decode_mwv: _bulk_mwv,
+    decode_hdg: _bulk_hdg,
+    decode_dpt: _bulk_single("depth_m"),
+    decode_mtw: _bulk_single("water_temp_c"),
+}
+
+
+def _gather(buf, positions):
+    return buf[np.minimum(positions, len(buf) - 1)]
+
+
+def bulk_decode(data, validate=False):
+    """Vectorized equivalent of parse_line over every line of `data`.
+
+    `data` must end with a newline. Returns (sent_line, ts, values, have,
+    line_starts): for each accepted sentence in file order, its line index,
+    timestamp and a row of NAV_FIELDS values with a presence mask; plus the
+    byte offset of every line within `data`.
+    """
+    sent_line, ts, values, have, line_starts, ends, deferred = _bulk_sentences(data, validate)
+
+    # Anything the bulk decoders could not settle goes through parse_line
+    n_fields = len(NAV_FIELDS)
+    slow_lines, slow_ts, slow_fields = [], [], []
+    for line_idx in deferred.tolist():
+        raw = data[line_starts[line_idx]:ends[line_idx] + 1]
+        result = parse_line(raw.decode("utf-8", errors="ignore"), validate)
+        if result is not None:
+            slow_lines.append(line_idx)
+            slow_ts.append(result[0])
+            slow_fields.append(result[1])
+    slow_vals = np.full((len(slow_lines), n_fields), np.nan)
+    slow_have = np.zeros((len(slow_lines), n_fields), bool)
+    for row, fields in enumerate(slow_fields):
+        for field, value in fields.items():
+            j = NAV_FIELDS.index(field)
+            slow_vals[row, j] = value
+            slow_have[row, j] = True
+
+    sent_line = np.concatenate((sent_line, np.array(slow_lines, np.int64)))
+    order = np.argsort(sent_line, kind="stable")
+    return (sent_line[order], np.concatenate((ts, np.array(slow_ts, np.int64)))[order],
+            np.concatenate((values, slow_vals))[order], np.concatenate((have, slow_have))[order],
+            line_starts)
+
+
+def _bulk_sentences(data, validate=False):
+    """The vectorized part of bulk_decode.
+
+    Returns (sent_line, ts, values, have, line_starts, ends, deferred): the
+    sentences the bulk decoders accepted, in file order, as for
+    bulk_decode; the offsets of every line and its newline; and the sorted
+    indexes of the lines that need parse_line.
+    """
+    buf = np.frombuffer(data, np.uint8)
+    ends = np.flatnonzero(buf == 10)
+    line_starts = np.concatenate(([0], ends[:-1] + 1))
+    n_fields = len(NAV_FIELDS)
+
+    # Lines with non-ASCII bytes change shape when decoded with
+    # errors="ignore", so those always go through parse_line.
+    non_ascii = np.zeros(len(ends), bool)
+    non_ascii[np.searchsorted(ends, np.flatnonzero(buf >= 128))] = True
+
+    # timestamp ; N ; $ADDRS ...
+    semis = np.append(np.flatnonzero(buf == 59), len(buf))
+    semi = semis[np.searchsorted(semis, line_starts)]
+    shaped = ((semi > line_starts) & (semi + 8 < ends) &
+              (_gather(buf, semi + 1) == ord("N")) & (_gather(buf, semi + 2) == 59) &
+              (_gather(buf, semi + 3) == ord("$")))
+    key = np.zeros(len(ends), np.int64)
+    for j in range(4, 9):
+        key = (key << 8) | _gather(buf, semi + j)
+    addresses = sorted(DECODERS)
+    known = np.array([int.from_bytes(a.encode(), "big") for a in addresses], np.int64)
+    code = np.minimum(np.searchsorted(known, key), len(known) - 1)
+    registered = shaped & (known[code] == key)
+
+    # From here on only ASCII lines with a registered address are looked at
+    lines = np.flatnonzero(registered & ~non_ascii)
+    starts, ends_l, code = line_starts[lines], ends[lines], code[lines]
+    dollar = semi[lines] + 3
+    stars = np.append(np.flatnonzero(buf == 42), len(buf))
+    star = stars[np.searchsorted(stars, dollar)]
+    fast = star < ends_l
+
+    # Timestamps: 1-18 plain digits
+    ts_len = dollar - 3 - starts
+    fast &= ts_len <= 18
+    ts = np.zeros(len(lines), np.int64)
+    for j in range(int(ts_len.max()) if len(lines) else 0):
+        inside = j < ts_len
+        digit = _gather(buf, starts + j).astype(np.int64) - 48
+        fast &= ~inside | ((digit >= 0) & (digit <= 9))
+        ts = np.where(inside, ts * 10 + digit, ts)
+
+    bad = np.zeros(len(lines), bool)
+    if validate:
+        hexval = np.full(256, -1, np.int64)
+        for i, ch in enumerate(b"0123456789abcdef"):
+            hexval[ch] = i
+            hexval[bytes([ch]).upper()[0]] = i
+        hi = hexval[_gather(buf, star + 1)]
+        lo = hexval[_gather(buf, star + 2)]
+        fast &= (star + 2 < ends_l) & (hi >= 0) & (lo >= 0)
+        running = np.bitwise_xor.accumulate(buf)
+        checksum = running[np.maximum(star - 1, 0)] ^ running[dollar]
+        bad = fast & (checksum != hi * 16 + lo)
+        fast &= ~bad
+
+    accepted_lines = []
+    accepted_ts = []
+    accepted_values = []
+    accepted_have = []
+    deferred = [np.flatnonzero(non_ascii), lines[~fast & ~bad]]
+    commas = np.append(np.flatnonzero(buf == 44), len(buf))
+
+    for i, address in enumerate(addresses):
+        idx = np.flatnonzero(fast & (code == i))
+        if len(idx) == 0:
+            continue
+        bulk = BULK_DECODERS.get(DECODERS[address])
+        if bulk is None:
+            deferred.append(lines[idx])
+            continue
+        accept, reject, values = bulk(_BulkFields(buf, commas, dollar[idx], star[idx]))
+        deferred.append(lines[idx[~accept & ~reject]])
+        idx = idx[accept]
+        vals = np.full((len(idx), n_fields), np.nan)
+        have = np.zeros((len(idx), n_fields), bool)
+        for field, column in values.items():
+            j = NAV_FIELDS.index(field)
+            column = column[accept]
+            vals[:, j] = column
+            have[:, j] = ~np.isnan(column)
+        accepted_lines.append(lines[idx])
+        accepted_ts.append(ts[idx])
+        accepted_values.append(vals)
+        accepted_have.append(have)
+
+    sent_line = np.concatenate(accepted_lines) if accepted_lines else np.zeros(0, np.int64)
+    order = np.argsort(sent_line, kind="stable")
+    if accepted_lines:
+        ts = np.concatenate(accepted_ts)[order]
+        values = np.concatenate(accepted_values)[order]
+        have = np.concatenate(accepted_have)[order]
+    else:
+        ts = np.zeros(0, np.int64)
+        values = np.zeros((0, n_fields))
+        have = np.zeros((0, n_fields), bool)
+    return (sent_line[order], ts, values, have, line_starts, ends,
+            np.sort(np.concatenate(deferred)))
+
+
+def bulk_windows(ts, window_ms=1500):
+    """Indices of the sentences that open each RowAggregator window.
+
+    A window closes at the first later sentence more than window_ms after
+    the window's first sentence. Window start timestamps are strictly
+    increasing and every earlier sentence lies below the current start, so
+    that sentence can be found with a binary search on the running maximum;
+    the searches are done up front and the chain of starts followed after.
+    """
+    if len(ts) == 0:
+        return np.zeros(0, np.int64)
+    running = np.maximum.accumulate(ts)
+    following = np.searchsorted(running, ts + window_ms, side="right").tolist()
+    starts = []
+    i, n = 0, len(ts)
+    while i < n:
+        starts.append(i)
+        i = following[i]
+    return np.array(starts, np.int64)
+
+
+def bulk_rows(ts, values, have, starts):
+    """Collapse sentences into one row per window, as RowAggregator does.
+
+    Returns (window_index, rows) for windows that have a position fix.
+    """
+    n_windows = len(starts)
+    gid = np.zeros(len(ts), np.int64)
+    gid[starts[1:]] = 1
+    gid = np.cumsum(gid)
+
+    out = np.full((n_windows, len(NAV_FIELDS)), np.nan)
+    out_have = np.zeros((n_windows, len(NAV_FIELDS)), bool)
+    for j in range(len(NAV_FIELDS)):
+        idx = np.flatnonzero(have[:, j])
+        if len(idx) == 0:
+            continue
+        g = gid[idx]
+        last = np.concatenate((g[1:] != g[:-1], [True]))
+        out[g[last], j] = values[idx[last], j]
+        out_have[g[last], j] = True
+
+    emit = np.flatnonzero(out_have[:, NAV_FIELDS.index("lat")])
+    rows = []
+    for start_ts, vals, present in zip(ts[starts[emit]].tolist(), out[emit].tolist(),
+                                       out_have[emit].tolist()):
+        rows.append(NavRow._make((start_ts, *[
+            (int(v) if f == "gps_sats" else v) if p else None
+            for f, v, p in zip(NAV_FIELDS, vals, present)])))
+    return emit, rows
+
+
+def bulk_ais(data, line_starts, n_lines, ais):
+    """AISDecoder.add_line for the AIS lines among the first n_lines of a bulk chunk.
+
+    Returns the indices of the lines the decoder accepted.
+    """
+    if n_lines == 0:
+        return np.zeros(0, np.int64)
+    buf = np.frombuffer(data, np.uint8)
+    starts = line_starts[:n_lines]
+    ends = np.append(line_starts[1:], len(buf))[:n_lines] - 1
+    semis = np.append(np.flatnonzero(buf == 59), len(buf))
+    semi = semis[np.searchsorted(semis, starts)]
+    candidate = ((semi + 3 < ends) & (_gather(buf, semi + 1) == ord("N")) &
+                 (_gather(buf, semi + 2) == 59) & (_gather(buf, semi + 3) == ord("!")))
+    # Non-ASCII bytes are dropped when decoding, so such lines may still be AIS
+    candidate[np.searchsorted(ends, np.flatnonzero(buf[:ends[-1] + 1] >= 128))] = True
+    accepted = []
+    for i in np.flatnonzero(candidate).tolist():
+        raw = data[line_starts[i]:ends[i] + 1]
+        if ais.add_line(raw.decode("utf-8", errors="ignore")):
+            accepted.append(i)
+    return np.array(accepted, np.int64)
+
+
+def bulk_consume(data, line_starts, sent_line, n_lines, stats, ais):
+    """Per-line side work for the first n_lines of a bulk chunk: AIS and sentence stats.
+
+    Called once for each stretch of lines the bulk parser moves past, so
+    re-read lines are not counted or decoded twice.
+    """
+    accepted = bulk_ais(data, line_starts, n_lines, ais) if ais is not None else None
+    if stats is not None:
+        bulk_sentence_stats(data, line_starts, sent_line, n_lines, stats, accepted)
+
+
+def bulk_sentence_stats(data, line_starts, sent_line, n_lines, stats, accepted=None):
+    """ParseStats.record_line over the first n_lines lines of a bulk chunk.
+
+    `accepted` marks further lines (AIS) as parsed, besides those in sent_line.
+    """
+    if n_lines == 0:
+        return
+    buf = np.frombuffer(data, np.uint8)
+    starts = line_starts[:n_lines]
+    ends = np.append(line_starts[1:], len(buf))[:n_lines] - 1
+    semis = np.append(np.flatnonzero(buf == 59), len(buf))
+    semi = semis[np.searchsorted(semis, starts)]
+    alnum = np.zeros(256, bool)
+    alnum[np.frombuffer(b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz",
+                        np.uint8)] = True
+    named = ((semi + 8 <= ends) & (_gather(buf, semi + 1) == ord("N")) &
+             (_gather(buf, semi + 2) == 59) &
+             np.isin(_gather(buf, semi + 3), (ord("$"), ord("!"))))
+    key = np.zeros(n_lines, np.int64)
+    for j in range(4, 9):
+        byte = _gather(buf, semi + j)
+        named &= alnum[byte]
+        key = (key << 8) | byte
+    ok = np.zeros(n_lines, bool)
+    ok[sent_line[sent_line < n_lines]] = True
+    if accepted is not None:
+        ok[accepted] = True
+
+    # As in bulk_decode, lines with non-ASCII bytes take the scalar route
+    non_ascii = np.zeros(n_lines, bool)
+    non_ascii[np.searchsorted(ends, np.flatnonzero(buf[:ends[-1] + 1] >= 128))] = True
+    for i in np.flatnonzero(non_ascii).tolist():
+        raw = data[line_starts[i]:ends[i] + 1]
+        stats.record_line(raw.decode("utf-8", errors="ignore"), bool(ok[i]))
+    named &= ~non_ascii
+    n_lines -= int(non_ascii.sum())
+
+    other = int(n_lines - named.sum())
+    if other:
+        stats.sentences[("other", "ignored")] = (
+            stats.sentences.get(("other", "ignored"), 0) + other)
+    codes, counts = np.unique(key[named] * 2 + ok[named], return_counts=True)
+    for code, n in zip(codes.tolist(), counts.tolist()):
+        address = (code >> 1).to_bytes(5, "big").decode()
+        if code & 1:
+            result = "ok"
+        else:
+            result = "error" if address in DECODERS or address in AIS_ADDRESSES else "ignored"
+        stats.sentences[(address, result)] = stats.sentences.get((address, result), 0) + n
+
+
+def iter_batches_bulk(filepath, start_offset=0, batch_size=BATCH_ROWS, validate=False,
+                      chunk_bytes=BULK_CHUNK_BYTES, stats=None, ais=None):
+    """Vectorized drop-in for iter_batches, for large backfills. Needs numpy.
+
+    Reads the file in newline-aligned chunks, decodes each with bulk_decode
+    and aggregates with bulk_windows/bulk_rows. The window still open at the
+    end of a chunk is re-read with the next chunk, so rows, batch boundaries
+    and resume offsets are the same as iter_batches.
+    """
+    window_ms = RowAggregator().window_ms
+    offset = start_offset
+    lines_done = 0
+    pending = []       # (row, resume_offset, lines_read)
+
+    while True:
+        with open_log(filepath, offset) as f:
+            data = f.read(chunk_bytes)
+        eof = len(data) < chunk_bytes
+        cut = data.rfind(b"\n") + 1
+        if cut == 0:
+            if eof:
+                break
+            chunk_bytes *= 2
+            continue
+        data = data[:cut]
+
+        sent_line, ts, values, have, line_starts = bulk_decode(data, validate)
+        n_lines = len(line_starts)
+        starts = bulk_windows(ts, window_ms)
+
+        if eof:
+            closed = starts
+        elif len(starts) > 1:
+            closed = starts[:-1]
+        elif len(starts) == 0:
+            if stats is not None or ais is not None:
+                bulk_consume(data, line_starts, sent_line, n_lines, stats, ais)
+            offset += cut
+            lines_done += n_lines
+            continue
+        else:
+            # One window spans the whole chunk
+            chunk_bytes *= 2
+            continue
+
+        used = len(ts) if eof else int(starts[-1])
+        emit, rows = bulk_rows(ts[:used], values[:used], have[:used], closed)
+        # Each row resumes at the start of the window after it
+        next_start = np.append(starts, -1)[emit + 1]
+        next_line = np.where(next_start >= 0, sent_line[next_start], n_lines)
+        resume_offsets = np.append(line_starts, cut)[next_line] + offset
+        resume_lines = next_line + lines_done
+        pending.extend(zip(rows, resume_offsets.tolist(), resume_lines.tolist()))
+
+        if eof:
+            if stats is not None or ais is not None:
+                bulk_consume(data, line_starts, sent_line, n_lines, stats, ais)
+            break
+        while len(pending) >= batch_size:
+            batch, pending = pending[:batch_size], pending[batch_size:]
+            yield [r for r, _, _ in batch], batch[-1][1], batch[-1][2]
+        next_window_line = int(sent_line[starts[len(closed)]])
+        if stats is not None or ais is not None:
+            bulk_consume(data, line_starts, sent_line, next_window_line, stats, ais)
+        offset += int(line_starts[next_window_line])
+        lines_done += next_window_line
+
+    end_offset, end_lines = offset + (cut if cut else 0), lines_done + (n_lines if cut else 0)
+
+    # At end of file the last window is emitted by flush(), after the loop
+    flushed = []
+    if pending and pending[-1][1] == end_offset:
+        flushed = [pending.pop()]
+    while len(pending) >= batch_size:
+        batch, pending = pending[:batch_size], pending[batch_size:]
+        yield [r for r, _, _ in batch], batch[-1][1], batch[-1][2]
+    yield [r for r, _, _ in pending + flushed], end_offset, end_lines
+
+
+def offset_after_lines(filepath, line_count):
+    """Byte offset just past the first line_count lines of a file."""
+    offset = 0
+    with open_log(filepath) as f:
+        for i, raw in enumerate(f):
+            if i >= line_count:
+                break
+            offset += len(raw)
+    return offset
+
+
+def head_digest(filepath, length):
+    """SHA-1 of the first `length` bytes of a file, used to spot rotation."""
+    with open_log(filepath) as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Split-file parser
+# ---------------------------------------------------------------------------
+
+# One large file can be cut into newline-aligned byte ranges parsed in a
+# process pool (parse_chunk) and stitched back together in order
+# (iter_batches_split). Which sentence opens a RowAggregator window depends
+# on the window still open from the previous range, so each worker starts
+# aggregating at a sentence where the windows of any likely carry-in have
+# converged, and hands back the sentences before it for the parent to
+# aggregate with the real carry-in.
+
+SPLIT_CHUNK_BYTES = 4 << 20
+
 
-    return rows, start_line + lines_read
+class _Windows:
+    """RowAggregator plus the position of its open window, as iter_batches tracks it.
+
+    Closed rows collect in `rows` as (row, resume_offset, lines_read).
+    """
+
+    def __init__(self):
+        self.aggregator = RowAggregator()
+        self.offset = self.line = None
+        self.rows = []
+
+    def add(self, offset, line, ts_ms, fields):
+        aggregator = self.aggregator
+        if aggregator.current_ts is None or ts_ms - aggregator.current_ts > aggregator.window_ms:
+            self.offset, self.line = offset, line
+        row = aggregator.add(ts_ms, fields)
+        if row is not None:
+            self.rows.append((row, self.offset, self.line))
+
+
+def split_ranges(filepath, start_offset=0, chunk_bytes=SPLIT_CHUNK_BYTES):
+    """Newline-aligned (start, end) byte ranges covering a log from start_offset.
+
+    The last range ends at None (end of file, wherever that is by the time
+    it is read). A log whose uncompressed size is unknown is not split.
+    """
+    size = log_size(filepath)
+    bounds = [start_offset]
+    if size is not None:
+        for guess in range(start_offset + chunk_bytes, size, chunk_bytes):
+            with open_log(filepath, guess) as f:
+                rest = f.readline()
+            if rest.endswith(b"\n") and guess + len(rest) < size:
+                bounds.append(max(guess + len(rest), bounds[-1]))
+    bounds = sorted(set(bounds))
+    return list(zip(bounds, bounds[1:] + [None]))
+
+
+def _range_events(filepath, start, end, validate=False, stats=None, ais=None):
+    """Parsed sentences in [start, end) as (offset, line, ts_ms, fields).
+
+    `line` counts from the start of the range. Lines that are not nav
+    sentences are counted into stats. With an AISDecoder, AIS candidates
+    become `ais_items` in file order: single-sentence messages are decoded
+    here (into their records, if any), while lines that may be fragments are
+    kept as text for the caller to feed to its own decoder, since the rest
+    of the message can be in another range. Returns (events, end_offset,
+    lines_read, ais_items).
+    """
+    events = []
+    ais_items = []
+    offset = start
+    lines_read = 0
+    with open_log(filepath, start) as f:
+        for raw in f:
+            if (end is not None and offset >= end) or not raw.endswith(b"\n"):
+                break
+            line_offset = offset
+            offset += len(raw)
+            lines_read += 1
+            line = raw.decode("utf-8", errors="ignore")
+            result = parse_line(line, validate)
+            if result is None:
+                if ais is not None and "!" in line:
+                    # The fragment count is the first comma field
+                    if line.split(",", 2)[1:2] != ["1"]:
+                        ais_items.append(line)
+                        continue
+                    accepted = ais.add_line(line)
+                    ais_items.extend(ais.take())
+                else:
+                    accepted = False
+                if stats is not None:
+                    stats.record_line(line, accepted)
+                continue
+            if stats is not None:
+                stats.record_line(line, True)
+            events.append((line_offset, lines_read - 1, result[0], result[1]))
+    return events, offset, lines_read, ais_items
+
+
+def _sync_point(ts, window_ms):
+    """Index of the first sentence where RowAggregator windows no longer depend on carry-in.
+
+    The window chain through a range is fixed once its first window start
+    is: each later start is the first sentence past the current one's
+    window. The carried-in window closes at the first sentence above its
+    start + window_ms, which for a log whose clock doesn't step back is one
+    of the sentences up to the first one past ts[0] + window_ms. Returns the
+    point where the chains from all of those have joined the chain from
+    sentence 0 (len(ts) if they don't join within the range).
+    """
+    n = len(ts)
+    if n == 0:
+        return 0
+    running = list(itertools.accumulate(ts, max))
+    following = {}
+
+    def next_start(i):
+        if i not in following:
+            following[i] = bisect.bisect_right(running, ts[i] + window_ms)
+        return following[i]
+
+    chain = set()
+    i = 0
+    while i < n:
+        chain.add(i)
+        i = next_start(i)
+    sync = 0
+    for i in range(min(bisect.bisect_right(running, ts[0] + window_ms), n - 1) + 1):
+        while i < n and i not in chain:
+            i = next_start(i)
+        sync = max(sync, i)
+    return sync
+
+
+def parse_chunk(filepath, start, end, validate=False, collect_stats=False, ais=False):
+    """Parse one range from split_ranges, for iter_batches_split in a process pool.
+
+    Returns (head, sync, rows, tail, end_offset, lines_read, stats,
+    ais_items). head holds the sentences (see _range_events) before the
+    sync point, left for the parent to aggregate. sync is (offset, line,
+    ts_ms) of the sentence at the sync point, rows the rows closed from
+    there on as _Windows collects them, and tail (current_ts,
+    current_fields, offset, line) the window still open at the end; these
+    three are None if the chains never join. ais_items are as from
+    _range_events, with ais.
+    """
+    begin = time.perf_counter()
+    stats = ParseStats() if collect_stats else None
+    decoder = AISDecoder(validate) if ais else None
+    events, end_offset, lines_read, ais_items = _range_events(filepath, start, end, validate,
+                                                              stats, decoder)
+    window_ms = RowAggregator().window_ms
+    i = _sync_point([e[2] for e in events], window_ms)
+    sync = rows = tail = None
+    if i < len(events):
+        windows = _Windows()
+        for event in events[i:]:
+            windows.add(*event)
+        aggregator = windows.aggregator
+        sync = events[i][:3]
+        rows = windows.rows
+        tail = (aggregator.current_ts, aggregator.current_fields, windows.offset, windows.line)
+    if stats is not None:
+        stats.seconds = time.perf_counter() - begin
+    return events[:i], sync, rows, tail, end_offset, lines_read, stats, ais_items
+
+
+def iter_batches_split(filepath, pool, workers, start_offset=0, batch_size=BATCH_ROWS,
+                       validate=False, chunk_bytes=SPLIT_CHUNK_BYTES, stats=None, ais=None):
+    """iter_batches for one large file, with its ranges parsed in `pool`.
+
+    Up to 2 x workers ranges are in flight; results are stitched in file
+    order, so rows, batch boundaries and resume offsets are the same as
+    iter_batches. If a range's sync point turns out not to open a window
+    (the log's clock stepped back across the cut), the rest of that range
+    is re-parsed here.
+    """
+    ranges = iter(split_ranges(filepath, start_offset, chunk_bytes))
+    in_flight = []
+
+    def submit():
+        span = next(ranges, None)
+        if span is not None:
+            start, end = span
+            in_flight.append((pool.submit(parse_chunk, filepath, start, end, validate,
+                                          stats is not None, ais is not None), end))
+
+    for _ in range(workers * 2):
+        submit()
+    windows = _Windows()
+    aggregator = windows.aggregator
+    end_offset, lines_done = start_offset, 0
+
+    while in_flight:
+        future, end = in_flight.pop(0)
+        submit()
+        head, sync, rows, tail, chunk_end, chunk_lines, chunk_stats, ais_items = future.result()
+        if chunk_stats is not None:
+            for key, n in chunk_stats.sentences.items():
+                stats.sentences[key] = stats.sentences.get(key, 0) + n
+            stats.seconds += chunk_stats.seconds
+        for item in ais_items:
+            if isinstance(item, str):
+                accepted = ais.add_line(item)
+                if stats is not None:
+                    stats.record_line(item, accepted)
+            else:
+                ais.records.append(item)
+
+        for offset, line, ts_ms, fields in head:
+            windows.add(offset, lines_done + line, ts_ms, fields)
+        if sync is not None:
+            offset, line, ts_ms = sync
+            if aggregator.current_ts is None or ts_ms - aggregator.current_ts > aggregator.window_ms:
+                row = aggregator.flush()
+                if row is not None:
+                    windows.rows.append((row, offset, lines_done + line))
+                windows.rows.extend((r, o, lines_done + n) for r, o, n in rows)
+                aggregator.current_ts, aggregator.current_fields = tail[0], tail[1]
+                windows.offset, windows.line = tail[2], lines_done + tail[3]
+            else:
+                log.debug("  %s: windows don't line up at offset %d, re-parsing to %s",
+                          os.path.basename(filepath), offset, end)
+                for event in _range_events(filepath, offset, end, validate)[0]:
+                    windows.add(event[0], lines_done + line + event[1], event[2], event[3])
+        end_offset, lines_done = chunk_end, lines_done + chunk_lines
+
+        while len(windows.rows) >= batch_size:
+            batch, windows.rows = windows.rows[:batch_size], windows.rows[batch_size:]
+            yield [r for r, _, _ in batch], batch[-1][1], batch[-1][2]
+
+    rows = [r for r, _, _ in windows.rows]
+    row = aggregator.flush()
+    if row is not None:
+        rows.append(row)
+    yield rows, end_offset, lines_done
 
 
 # ---------------------------------------------------------------------------
@@ -168,71 +1946,328 @@ CREATE TABLE IF NOT EXISTS file_state (
 );
 """
 
+# Columns added after the original schema; created on open if missing.
+STATE_COLUMNS = (
+    ("byte_offset", "INTEGER"),
+    ("inode", "INTEGER"),
+    ("size", "INTEGER"),
+    ("head_hash", "TEXT"),
+)
+
+# One file_state row as held in memory by StateTracker
+FileState = collections.namedtuple("FileState", (
+    "lines_processed", "rows_inserted", "last_modified", "updated_at",
+    "byte_offset", "inode", "size", "head_hash"))
+STATE_FIELDS = FileState._fields
+
+STATE_UPSERT = f"""
+    INSERT INTO file_state (filepath, {", ".join(STATE_FIELDS)})
+    VALUES (?{", ?" * len(STATE_FIELDS)})
+    ON CONFLICT(filepath) DO UPDATE SET
+      {", ".join(f"{f} = excluded.{f}" for f in STATE_FIELDS)}
+"""
+
+# How much of the start of a file is hashed to detect rotation/replacement.
+FINGERPRINT_BYTES = 4096
+
+# Longest a checkpoint is held in memory before it is committed to SQLite.
+STATE_COMMIT_INTERVAL = 1.0
+
 
 class StateTracker:
-    """Tracks which files have been processed and how far."""
+    """Tracks which files have been processed and how far.
+
+    Progress is stored as a byte offset plus a fingerprint of the file (inode,
+    size and a hash of its first few KB), so a growing file can be resumed
+    with a seek and a rotated or truncated file is re-read from the start.
+
+    All state is loaded into memory on open, so checking thousands of
+    unchanged files reads nothing from SQLite. Checkpoints are written
+    through in WAL mode, grouped into one commit at most every
+    commit_interval seconds and at every flush() (end of a watch cycle or
+    import). A checkpoint lost in a crash only means re-inserting rows,
+    which ON CONFLICT skips.
+    """
 
-    def __init__(self, db_path):
+    def __init__(self, db_path, commit_interval=STATE_COMMIT_INTERVAL):
         self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
         self.conn.executescript(STATE_SCHEMA)
+        existing = {r[1] for r in self.conn.execute("PRAGMA table_info(file_state)")}
+        for name, decl in STATE_COLUMNS:
+            if name not in existing:
+                self.conn.execute(f"ALTER TABLE file_state ADD COLUMN {name} {decl}")
+        self.conn.commit()
+        self.commit_interval = commit_interval
+        self.commit_at = None   # monotonic deadline for the pending checkpoints
+        self.dirty = set()
+        self.head_hashes = {}   # filepath -> ((inode, length), digest) this pass
+        self.files = {
+            row[0]: FileState._make(row[1:])
+            for row in self.conn.execute(
+                f"SELECT filepath, {', '.join(STATE_FIELDS)} FROM file_state")
+        }
+
+    def get_progress(self, filepath, st=None):
+        """Returns (byte_offset, lines_processed) to resume from, or (0, 0).
+
+        If `st` (an os.stat_result) is given, the stored fingerprint is checked
+        against the file and progress is discarded when the file has been
+        replaced or truncated.
+        """
+        # A new pass: the head is hashed afresh at its first checkpoint
+        self.head_hashes.pop(filepath, None)
+        entry = self.files.get(filepath)
+        if entry is None:
+            return 0, 0
+        lines_processed, byte_offset = entry.lines_processed, entry.byte_offset
+        inode, head_hash = entry.inode, entry.head_hash
+
+        if byte_offset is None:
+            # State written before byte offsets were tracked
+            if not lines_processed:
+                return 0, 0
+            return offset_after_lines(filepath, lines_processed), lines_processed
+
+        if st is not None:
+            if inode is not None and st.st_ino != inode:
+                log.info("  %s: file replaced, restarting from 0", os.path.basename(filepath))
+                return 0, 0
+            size = log_size(filepath, st)
+            if size is not None and size < byte_offset:
+                log.info("  %s: file truncated, restarting from 0", os.path.basename(filepath))
+                return 0, 0
+            head_len = min(FINGERPRINT_BYTES, byte_offset)
+            if head_hash is not None and head_digest(filepath, head_len) != head_hash:
+                log.info("  %s: file contents changed, restarting from 0",
+                         os.path.basename(filepath))
+                return 0, 0
+
+        return byte_offset, lines_processed
+
+    def update_progress(self, filepath, lines_processed, rows_inserted, mtime,
+                        byte_offset=None, st=None):
+        """Record progress. Pass mtime=None for a mid-file checkpoint, so the
+        file is still picked up by needs_processing on the next pass."""
+        entry = self.files.get(filepath)
+        inode = size = head_hash = None
+        if st is not None:
+            inode, size = st.st_ino, st.st_size
+        if byte_offset is not None:
+            head_len = min(FINGERPRINT_BYTES, byte_offset)
+            key = (inode, head_len)
+            cached = self.head_hashes.get(filepath)
+            if cached is not None and cached[0] == key:
+                head_hash = cached[1]
+            else:
+                head_hash = head_digest(filepath, head_len)
+                self.head_hashes[filepath] = (key, head_hash)
+        if entry is not None:
+            rows_inserted += entry.rows_inserted
+        now = datetime.now(timezone.utc).isoformat()
+        self.files[filepath] = FileState(lines_processed, rows_inserted, mtime, now,
+                                         byte_offset, inode, size, head_hash)
+        self.dirty.add(filepath)
+        if self.commit_at is None:
+            self.commit_at = time.monotonic() + self.commit_interval
+        elif time.monotonic() >= self.commit_at:
+            self.flush()
 
-    def get_progress(self, filepath):
-        """Returns lines_processed for a file, or 0 if new."""
-        cur = self.conn.execute(
-            "SELECT lines_processed FROM file_state WHERE filepath = ?",
-            (filepath,),
-        )
-        row = cur.fetchone()
-        return row[0] if row else 0
-
-    def update_progress(self, filepath, lines_processed, rows_inserted, mtime):
-        self.conn.execute(
-            """INSERT INTO file_state (filepath, lines_processed, rows_inserted, last_modified, updated_at)
-               VALUES (?, ?, ?, ?, ?)
-               ON CONFLICT(filepath) DO UPDATE SET
-                 lines_processed = ?,
-                 rows_inserted = rows_inserted + ?,
-                 last_modified = ?,
-                 updated_at = ?""",
-            (filepath, lines_processed, rows_inserted, mtime,
-             datetime.now(timezone.utc).isoformat(),
-             lines_processed, rows_inserted, mtime,
-             datetime.now(timezone.utc).isoformat()),
-        )
+    def flush(self):
+        """Commit pending checkpoints in one transaction."""
+        if not self.dirty:
+            return
+        self.conn.executemany(STATE_UPSERT, [(filepath, *self.files[filepath])
+                                             for filepath in self.dirty])
         self.conn.commit()
+        self.dirty.clear()
+        self.commit_at = None
 
     def needs_processing(self, filepath, current_mtime):
         """Check if file is new or has been modified since last processing."""
-        cur = self.conn.execute(
-            "SELECT last_modified FROM file_state WHERE filepath = ?",
-            (filepath,),
-        )
-        row = cur.fetchone()
-        if row is None:
+        entry = self.files.get(filepath)
+        if entry is None or entry.last_modified is None:
             return True
-        return current_mtime > row[0]
+        return current_mtime > entry.last_modified
 
     def summary(self):
-        cur = self.conn.execute(
-            "SELECT filepath, lines_processed, rows_inserted, updated_at FROM file_state ORDER BY filepath"
-        )
-        return cur.fetchall()
+        return [(filepath, entry.lines_processed, entry.rows_inserted, entry.updated_at)
+                for filepath, entry in sorted(self.files.items())]
 
     def close(self):
+        self.flush()
         self.conn.close()
 
 
+# ---------------------------------------------------------------------------
+# Rollups
+# ---------------------------------------------------------------------------
+
+# Rollup table -> bucket width. Kept current by the writers: every insert
+# recomputes the buckets its rows fall in, in the same transaction, so a
+# rollup never disagrees with nav_data and re-imports are idempotent.
+ROLLUPS = (
+    ("nav_rollup_10s", "10 seconds"),
+    ("nav_rollup_1m", "1 minute"),
+)
+
+
+def _circular_mean(column):
+    """Mean of a bearing in degrees, via the mean unit vector, in [0, 360).
+    An arithmetic mean of 350 and 10 would give 180.
+
+    atan2 gives (-180, 180]; the wrap is x - 360 * floor(x / 360) because
+    PostgreSQL's mod() and % have no double precision form.
+    """
+    bearing = (f"degrees(atan2(avg(sin(radians({column}))), "
+               f"avg(cos(radians({column})))))")
+    return f"({bearing} + 360) - 360 * floor(({bearing} + 360) / 360)"
+
+
+# Rollup column -> aggregate over the nav_data rows in the bucket
+ROLLUP_COLUMNS = (
+    ("samples", "integer", "count(*)"),
+    ("sog_mean", "double precision", "avg(sog_knots)"),
+    ("sog_max", "double precision", "max(sog_knots)"),
+    ("stw_mean", "double precision", "avg(stw_knots)"),
+    ("stw_max", "double precision", "max(stw_knots)"),
+    ("cog_mean", "double precision", _circular_mean("cog_deg")),
+    ("heading_mean", "double precision", _circular_mean("heading_deg")),
+    ("awa_mean", "double precision", _circular_mean("awa_deg")),
+    ("aws_max", "double precision", "max(aws_knots)"),
+)
+
+ROLLUP_SCHEMA = tuple(
+    statement
+    for table, _ in ROLLUPS
+    for statement in (
+        f"""CREATE TABLE IF NOT EXISTS {table} (
+            bucket timestamptz NOT NULL,
+            device text NOT NULL,
+            {", ".join(f"{name} {decl}" for name, decl, _ in ROLLUP_COLUMNS)},
+            PRIMARY KEY (device, bucket)
+        )""",
+        f"SELECT create_hypertable('{table}', 'bucket', "
+        f"chunk_time_interval => INTERVAL '30d', if_not_exists => TRUE)",
+    )
+)
+
+
+def rollup_sql(table, width, params=("%s", "%s", "%s")):
+    """Recompute one rollup's buckets for a device over a time span.
+
+    params are the placeholders for (device, first row ts_ms, last row ts_ms):
+    pyformat for psycopg2, $n for asyncpg. Every bucket touching the span is
+    rebuilt from nav_data, so rows landing in an already-rolled-up bucket
+    (a late file, an overlapping batch) are folded in correctly.
+    """
+    device, first, last = params
+    names = [name for name, _, _ in ROLLUP_COLUMNS]
+    return f"""
+        INSERT INTO {table} (bucket, device, {", ".join(names)})
+        SELECT time_bucket(INTERVAL '{width}', time), device,
+               {", ".join(agg for _, _, agg in ROLLUP_COLUMNS)}
+        FROM nav_data
+        WHERE device = {device}
+          AND time >= time_bucket(INTERVAL '{width}', {ms_to_timestamptz(first)})
+          AND time < time_bucket(INTERVAL '{width}', {ms_to_timestamptz(last)}) + INTERVAL '{width}'
+        GROUP BY 1, 2
+        ON CONFLICT (device, bucket) DO UPDATE SET
+            {", ".join(f"{n} = EXCLUDED.{n}" for n in names)}
+    """
+
+
+ROLLUP_SQL = tuple(rollup_sql(table, width) for table, width in ROLLUPS)
+ROLLUP_SQL_ASYNC = tuple(rollup_sql(table, width, ("$1", "$2", "$3"))
+                         for table, width in ROLLUPS)
+
+# Held until commit. Two in-flight batches sharing a bucket would otherwise
+# each recompute it without the other's uncommitted rows; with the lock the
+# second recompute starts after the first commits and sees them.
+ROLLUP_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('nav_rollup:' || %s))"
+
+
+def rollup_span(rows):
+    """First and last row ts_ms of a batch (batches are not always sorted)."""
+    times = [row[0] for row in rows]
+    return min(times), max(times)
+
+
 # ---------------------------------------------------------------------------
 # TimescaleDB writer
 # ---------------------------------------------------------------------------
 
+# One-time migration for --init-schema, run as the tables' owner: nav_data
+# columns for channels decoded since the original schema, and the
+# ais_positions and rollup hypertables. The writers run no DDL themselves,
+# so the ingest role needs no more than INSERT/SELECT.
+SCHEMA_SQL = tuple(
+    f"ALTER TABLE nav_data ADD COLUMN IF NOT EXISTS {column} {nav_column_type(column)}"
+    for column in EXTRA_NAV_COLUMNS
+) + AIS_SCHEMA + ROLLUP_SCHEMA
+
+
+class SchemaError(Exception):
+    """The database lacks tables or columns the writers insert into."""
+
+
+def required_schema(ais=False):
+    """Table -> the columns the writers insert into (ais_positions if ais)."""
+    tables = {"nav_data": ("time", "device") + NAV_FIELDS}
+    for table, _ in ROLLUPS:
+        tables[table] = ("bucket", "device") + tuple(name for name, _, _ in ROLLUP_COLUMNS)
+    if ais:
+        tables["ais_positions"] = ("time", "device") + AIS_FIELDS
+    return tables
+
+
+# (table, column) of the given tables, as the writers' unqualified names see them
+SCHEMA_CHECK_SQL = """
+    SELECT table_name, column_name FROM information_schema.columns
+    WHERE table_schema = ANY(current_schemas(false)) AND table_name = ANY(%s)
+"""
+
+
+def schema_error(found, ais=False):
+    """A SchemaError naming what required_schema has and found ((table,
+    column) rows of SCHEMA_CHECK_SQL) lacks, or None."""
+    found = set(found)
+    tables = {table for table, _ in found}
+    missing = []
+    for table, columns in required_schema(ais).items():
+        if table not in tables:
+            missing.append(table)
+        else:
+            missing.extend(f"{table}.{c}" for c in columns if (table, c) not in found)
+    if not missing:
+        return None
+    return SchemaError(f"Database schema is out of date, missing {', '.join(missing)}: "
+                       f"run nmea_relay.py --init-schema as the tables' owner")
+
+
+def connection_error(exc):
+    """True if exc means the database could not be reached, rather than that
+    it refused the statement or the data. Only these are worth spooling."""
+    return psycopg2 is not None and isinstance(
+        exc, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
 class TimescaleDBWriter:
-    def __init__(self, connection_string, device="blacksheep"):
+    """Inserts with execute_values. Every new connection is checked against
+    required_schema (ais: whether AIS is written too), and a database
+    without the --init-schema migration raises SchemaError instead of
+    failing every insert."""
+
+    def __init__(self, connection_string, device="blacksheep", ais=False):
         self.connection_string = connection_string
         self.device = device
+        self.ais = ais
         self.conn = None
+        # Why the last connect or insert failed (see connection_error)
+        self.error = None
 
-    def connect(self):
+    def connect(self, check=True):
         if self.conn is not None:
             try:
                 self.conn.cursor().execute("SELECT 1")
@@ -242,10 +2277,42 @@ class TimescaleDBWriter:
         try:
             self.conn = psycopg2.connect(self.connection_string, connect_timeout=10)
             self.conn.autocommit = False
+            if check:
+                cur = self.conn.cursor()
+                cur.execute(SCHEMA_CHECK_SQL, (list(required_schema(self.ais)),))
+                error = schema_error(cur.fetchall(), self.ais)
+                self.conn.rollback()
+                if error is not None:
+                    self.conn.close()
+                    self.conn = None
+                    raise error
             log.info("Connected to TimescaleDB")
             return True
+        except SchemaError:
+            raise
         except Exception as e:
             log.warning("TimescaleDB connection failed: %s", e)
+            self.error = e
+            self.conn = None
+            return False
+
+    def ensure_schema(self):
+        """Run SCHEMA_SQL (see --init-schema). Returns False if it failed."""
+        if not self.connect(check=False):
+            return False
+        try:
+            cur = self.conn.cursor()
+            for statement in SCHEMA_SQL:
+                cur.execute(statement)
+            self.conn.commit()
+            log.info("Schema is up to date")
+            return True
+        except Exception as e:
+            log.error("Schema setup failed: %s", e)
+            try:
+                self.conn.rollback()
+            except Exception:
+                pass
             self.conn = None
             return False
 
@@ -253,39 +2320,234 @@ class TimescaleDBWriter:
         if not rows or not self.connect():
             return 0
 
-        sql = """
-            INSERT INTO nav_data (time, device, lat, lon, sog_knots, cog_deg,
-                                  stw_knots, awa_deg, aws_knots, heading_deg)
+        sql = f"""
+            INSERT INTO nav_data (time, device, {", ".join(NAV_FIELDS)})
             VALUES %s
             ON CONFLICT DO NOTHING
         """
-        values = [
-            (row["time"], self.device,
-             row.get("lat"), row.get("lon"),
-             row.get("sog_knots"), row.get("cog_deg"),
-             row.get("stw_knots"), row.get("awa_deg"),
-             row.get("aws_knots"), row.get("heading_deg"))
-            for row in rows
-        ]
         try:
             cur = self.conn.cursor()
-            execute_values(cur, sql, values, page_size=1000)
+            # The device goes into the template, so each NavRow is the record
+            device = cur.mogrify("%s", (self.device,)).decode().replace("%", "%%")
+            template = (f"({ms_to_timestamptz('%s')}, {device}, "
+                        f"{', '.join(['%s'] * len(NAV_FIELDS))})")
+            execute_values(cur, sql, rows, template=template, page_size=1000)
+            self.update_rollups(cur, rows)
             self.conn.commit()
             return len(rows)
         except Exception as e:
-            log.warning("Insert failed: %s", e)
-            try:
-                self.conn.rollback()
-            except Exception:
-                pass
-            self.conn = None
+            return self._failed("Insert", e)
+
+    def _failed(self, what, e):
+        """Roll back and drop the connection after a failed insert. Returns 0."""
+        self.error = e
+        if connection_error(e):
+            log.warning("%s failed: %s", what, e)
+        else:
+            log.error("%s rejected by the database: %s", what, e)
+        try:
+            self.conn.rollback()
+        except Exception:
+            pass
+        self.conn = None
+        return 0
+
+    def update_rollups(self, cur, rows):
+        """Recompute the rollup buckets covered by rows, before the commit."""
+        first, last = rollup_span(rows)
+        cur.execute(ROLLUP_LOCK_SQL, (self.device,))
+        for sql in ROLLUP_SQL:
+            cur.execute(sql, (self.device, first, last))
+
+    def insert_ais(self, records):
+        """Insert decoded AIS records (see AISDecoder) into ais_positions."""
+        if not records or not self.connect():
             return 0
 
+        sql = f"""
+            INSERT INTO ais_positions (time, device, {", ".join(AIS_FIELDS)})
+            VALUES %s
+            ON CONFLICT DO NOTHING
+        """
+        template = f"({ms_to_timestamptz('%s')}, {', '.join(['%s'] * (len(AIS_FIELDS) + 1))})"
+        device = self.device
+        values = [(r["ts_ms"], device) + tuple(r[f] for f in AIS_FIELDS) for r in records]
+        try:
+            cur = self.conn.cursor()
+            execute_values(cur, sql, values, template=template, page_size=1000)
+            self.conn.commit()
+            return len(records)
+        except Exception as e:
+            return self._failed("AIS insert", e)
+
     def close(self):
         if self.conn:
             self.conn.close()
 
 
+class TimescaleDBCopyWriter(TimescaleDBWriter):
+    """Bulk writer using the COPY protocol, for backfills.
+
+    Rows are streamed as tab-separated text into a session temp table, then
+    merged into nav_data with a single INSERT ... SELECT so duplicate rows are
+    still skipped via ON CONFLICT DO NOTHING.
+    """
+
+    STAGE_SQL = f"""
+        CREATE TEMP TABLE IF NOT EXISTS nav_data_stage (
+            ts_ms bigint NOT NULL,
+            {", ".join(f + " " + nav_column_type(f) for f in NAV_FIELDS)}
+        ) ON COMMIT DELETE ROWS
+    """
+
+    MERGE_SQL = f"""
+        INSERT INTO nav_data (time, device, {", ".join(NAV_FIELDS)})
+        SELECT {ms_to_timestamptz("ts_ms")}, %s, {", ".join(NAV_FIELDS)}
+        FROM nav_data_stage
+        ON CONFLICT DO NOTHING
+    """
+
+    @staticmethod
+    def _encode(rows):
+        """Encode rows as COPY text format (tab-separated, \\N for NULL)."""
+        buf = io.StringIO()
+        write = buf.write
+        for row in rows:
+            write("\t".join(["\\N" if v is None else repr(v) for v in row]))
+            write("\n")
+        buf.seek(0)
+        return buf
+
+    def insert_rows(self, rows):
+        if not rows or not self.connect():
+            return 0
+
+        columns = ", ".join(NavRow._fields)
+        try:
+            cur = self.conn.cursor()
+            cur.execute(self.STAGE_SQL)
+            cur.copy_expert(f"COPY nav_data_stage ({columns}) FROM STDIN", self._encode(rows))
+            cur.execute(self.MERGE_SQL, (self.device,))
+            self.update_rollups(cur, rows)
+            self.conn.commit()
+            return len(rows)
+        except Exception as e:
+            return self._failed("COPY insert", e)
+
+
+class AsyncTimescaleDBWriter:
+    """asyncpg writer for the async ingest engine.
+
+    Holds a pool of up to `pool_size` connections so several batches can be
+    in flight at once. Each batch is binary-COPYed into a per-connection
+    staging table and merged like TimescaleDBCopyWriter.
+    """
+
+    MERGE_SQL = TimescaleDBCopyWriter.MERGE_SQL.replace("%s", "$1")
+
+    AIS_SQL = f"""
+        INSERT INTO ais_positions (time, device, {", ".join(AIS_FIELDS)})
+        VALUES ({ms_to_timestamptz("$1")},
+                {", ".join(f"${i}" for i in range(2, len(AIS_FIELDS) + 3))})
+        ON CONFLICT DO NOTHING
+    """
+
+    def __init__(self, connection_string, device="blacksheep", pool_size=4, ais=False):
+        self.connection_string = connection_string
+        self.device = device
+        self.pool_size = pool_size
+        self.ais = ais
+        self.pool = None
+
+    async def _init_connection(self, conn):
+        await conn.execute(TimescaleDBCopyWriter.STAGE_SQL)
+
+    async def connect(self):
+        """Open the pool, checked like TimescaleDBWriter.connect (SchemaError)."""
+        if self.pool is not None:
+            return True
+        try:
+            pool = await asyncpg.create_pool(
+                self.connection_string, min_size=1, max_size=self.pool_size,
+                timeout=10, init=self._init_connection)
+            found = await pool.fetch(SCHEMA_CHECK_SQL.replace("%s", "$1"),
+                                     list(required_schema(self.ais)))
+            error = schema_error([tuple(r) for r in found], self.ais)
+            if error is not None:
+                await pool.close()
+                raise error
+            self.pool = pool
+            log.info("Connected to TimescaleDB (async, pool of %d)", self.pool_size)
+            return True
+        except SchemaError:
+            raise
+        except Exception as e:
+            log.warning("TimescaleDB connection failed: %s", e)
+            self.pool = None
+            return False
+
+    async def insert_rows(self, rows):
+        if not rows or not await self.connect():
+            return 0
+
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.copy_records_to_table(
+                        "nav_data_stage", records=rows, columns=NavRow._fields)
+                    await conn.execute(self.MERGE_SQL, self.device)
+                    first, last = rollup_span(rows)
+                    await conn.execute(ROLLUP_LOCK_SQL.replace("%s", "$1"), self.device)
+                    for sql in ROLLUP_SQL_ASYNC:
+                        await conn.execute(sql, self.device, first, last)
+            return len(rows)
+        except Exception as e:
+            log.warning("Async insert failed: %s", e)
+            return 0
+
+    async def insert_ais(self, records):
+        if not records or not await self.connect():
+            return 0
+
+        device = self.device
+        values = [(r["ts_ms"], device) + tuple(r[f] for f in AIS_FIELDS) for r in records]
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.executemany(self.AIS_SQL, values)
+            return len(records)
+        except Exception as e:
+            log.warning("Async AIS insert failed: %s", e)
+            return 0
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+
+class AsyncWriterAdapter:
+    """Runs a synchronous writer's insert_rows in a thread, one call at a time.
+
+    Lets the async engine drive DryRunWriter (or any sync writer) unchanged.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.lock = asyncio.Lock()
+
+    async def insert_rows(self, rows):
+        async with self.lock:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.writer.insert_rows, rows)
+
+    async def insert_ais(self, records):
+        async with self.lock:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.writer.insert_ais, records)
+
+    async def close(self):
+        self.writer.close()
+
+
 # ---------------------------------------------------------------------------
 # Dry-run writer (no DB needed)
 # ---------------------------------------------------------------------------
@@ -295,6 +2557,7 @@ class DryRunWriter:
 
     def __init__(self):
         self.total = 0
+        self.total_ais = 0
 
     def insert_rows(self, rows):
         self.total += len(rows)
@@ -302,86 +2565,1297 @@ class DryRunWriter:
             first = rows[0]
             last = rows[-1]
             log.info("  [dry-run] %d rows: %s .. %s",
-                     len(rows), first["time"].isoformat(), last["time"].isoformat())
+                     len(rows), ms_isoformat(first.ts_ms), ms_isoformat(last.ts_ms))
         return len(rows)
 
+    def insert_ais(self, records):
+        self.total_ais += len(records)
+        log.debug("  [dry-run] %d AIS messages", len(records))
+        return len(records)
+
     def close(self):
-        log.info("[dry-run] Total: %d rows", self.total)
+        log.info("[dry-run] Total: %d rows, %d AIS messages", self.total, self.total_ais)
 
 
 # ---------------------------------------------------------------------------
-# Process a single file
+# Outage spool
 # ---------------------------------------------------------------------------
 
-def process_file(filepath, state, writer, force=False):
-    """Parse and ingest a single file. Returns number of new rows inserted."""
-    mtime = os.path.getmtime(filepath)
+SPOOL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    created_at TEXT
+);
+"""
 
-    if not force and not state.needs_processing(filepath, mtime):
-        return 0
+# Added after the original schema: what a blob holds, "nav" or "ais"; how
+# often the database rejected it; and when and why it was quarantined
+SPOOL_COLUMNS = (
+    ("kind", "TEXT NOT NULL DEFAULT 'nav'"),
+    ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+    ("quarantined_at", "TEXT"),
+    ("error", "TEXT"),
+)
+
+# Rejections of a spooled blob before it is quarantined
+SPOOL_MAX_ATTEMPTS = 3
+
+# One packed row: epoch ms, bitmask of present NAV_FIELDS, then every field
+SPOOL_ROW = struct.Struct("<qI" + "d" * len(NAV_FIELDS))
+
+
+def pack_rows(rows):
+    """Pack rows into a compact zlib-compressed blob for the spool."""
+    out = bytearray()
+    for ts_ms, *fields in rows:
+        mask = 0
+        values = []
+        for i, v in enumerate(fields):
+            if v is None:
+                values.append(0.0)
+            else:
+                mask |= 1 << i
+                values.append(v)
+        out += SPOOL_ROW.pack(ts_ms, mask, *values)
+    return zlib.compress(bytes(out), 1)
+
+
+def pack_ais(records):
+    """Pack AIS records as zlib-compressed JSON (they carry text fields)."""
+    out = [[r["ts_ms"]] + [r[f] for f in AIS_FIELDS] for r in records]
+    return zlib.compress(json.dumps(out).encode(), 1)
+
+
+def unpack_ais(blob):
+    records = []
+    for ts_ms, *values in json.loads(zlib.decompress(blob)):
+        record = dict(zip(AIS_FIELDS, values))
+        record["ts_ms"] = ts_ms
+        records.append(record)
+    return records
+
+
+def unpack_rows(blob):
+    rows = []
+    for ts_ms, mask, *values in SPOOL_ROW.iter_unpack(zlib.decompress(blob)):
+        for i, f in enumerate(NAV_FIELDS):
+            if mask & (1 << i):
+                if f == "gps_sats":
+                    values[i] = int(values[i])
+            else:
+                values[i] = None
+        rows.append(NavRow(ts_ms, *values))
+    return rows
+
+
+# Spooled blob kind -> (pack, unpack, writer method)
+SPOOL_KINDS = {
+    "nav": (pack_rows, unpack_rows, "insert_rows"),
+    "ais": (pack_ais, unpack_ais, "insert_ais"),
+}
+
+
+class SpoolingWriter:
+    """Wraps a DB writer with a durable on-disk spool for outages.
+
+    When the database cannot be reached the rows are committed to a local
+    SQLite spool instead, and reported as written, so file progress still
+    advances and each byte of log is parsed once. Spooled rows are drained
+    oldest first in large batches as soon as the database accepts writes
+    again. After a failure the database is not retried for retry_interval
+    seconds, so a backfill during an outage spools at disk speed. Nav rows
+    and AIS records are spooled alike, tagged with their kind.
+
+    Rows the database rejects (a missing column, a bad value: anything but
+    a connection error) are not an outage. They are quarantined in the same
+    file, with the error, and logged; drain() skips them, and a spooled blob
+    rejected SPOOL_MAX_ATTEMPTS times is quarantined too, so it cannot hold
+    up the rows behind it.
+
+    `spooled` is how many rows the last call kept in the spool (or its
+    quarantine), so callers can count them apart from rows the database
+    accepted; drained nav rows are counted as inserted when the database
+    takes them.
+    """
+
+    def __init__(self, writer, spool_path, drain_rows=50000, retry_interval=30):
+        self.writer = writer
+        self.device = writer.device
+        self.drain_rows = drain_rows
+        self.retry_interval = retry_interval
+        self.retry_at = 0
+        self.spooled = 0
+        self.conn = sqlite3.connect(spool_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SPOOL_SCHEMA)
+        existing = {r[1] for r in self.conn.execute("PRAGMA table_info(spool)")}
+        for name, decl in SPOOL_COLUMNS:
+            if name not in existing:
+                self.conn.execute(f"ALTER TABLE spool ADD COLUMN {name} {decl}")
+        self.conn.commit()
+        pending = self.pending_rows()
+        METRICS.set("spool_rows", pending, device=self.device)
+        if pending:
+            log.info("Spool holds %d rows for %s", pending, self.device)
+        quarantined = self.conn.execute(
+            "SELECT COALESCE(SUM(row_count), 0) FROM spool "
+            "WHERE device = ? AND quarantined_at IS NOT NULL", (self.device,)).fetchone()[0]
+        if quarantined:
+            log.warning("Spool holds %d quarantined rows for %s (see its error column)",
+                        quarantined, self.device)
+
+    def pending_rows(self):
+        cur = self.conn.execute("SELECT COALESCE(SUM(row_count), 0) FROM spool "
+                                "WHERE device = ? AND quarantined_at IS NULL", (self.device,))
+        return cur.fetchone()[0]
+
+    def _outage(self):
+        """Whether the writer's last failure was the database being unreachable."""
+        error = getattr(self.writer, "error", None)
+        return error is None or connection_error(error)
+
+    def _spool(self, rows, kind="nav"):
+        pack = SPOOL_KINDS[kind][0]
+        self.conn.execute(
+            "INSERT INTO spool (device, kind, row_count, data, created_at) VALUES (?, ?, ?, ?, ?)",
+            (self.device, kind, len(rows), pack(rows), datetime.now(timezone.utc).isoformat()))
+        self.conn.commit()
+        pending = self.pending_rows()
+        METRICS.set("spool_rows", pending, device=self.device)
+        log.warning("  Database unavailable: spooled %d %s rows (%d pending)",
+                    len(rows), kind, pending)
+        self.spooled = len(rows)
+        return len(rows)
 
-    start_line = 0 if force else state.get_progress(filepath)
-    rows, total_lines = parse_file(filepath, start_line=start_line)
+    def _quarantine(self, rows, kind):
+        """Keep rows the database rejected, with the error, out of the drain."""
+        pack = SPOOL_KINDS[kind][0]
+        self.conn.execute(
+            "INSERT INTO spool (device, kind, row_count, data, created_at, attempts, "
+            "quarantined_at, error) VALUES (?, ?, ?, ?, ?, 1, ?, ?)",
+            (self.device, kind, len(rows), pack(rows), datetime.now(timezone.utc).isoformat(),
+             datetime.now(timezone.utc).isoformat(), str(self.writer.error)))
+        self.conn.commit()
+        METRICS.inc("rows_quarantined_total", len(rows))
+        log.error("  Database rejected %d %s rows: quarantined in the spool", len(rows), kind)
+        self.spooled = len(rows)
+        return len(rows)
 
-    if not rows:
-        state.update_progress(filepath, total_lines, 0, mtime)
-        return 0
+    def _rejected(self, spool_id, kind, row_count):
+        """Count a rejection of a spooled blob. Returns True once it is quarantined."""
+        error = str(self.writer.error)
+        self.conn.execute("UPDATE spool SET attempts = attempts + 1, error = ? WHERE id = ?",
+                          (error, spool_id))
+        attempts = self.conn.execute("SELECT attempts FROM spool WHERE id = ?",
+                                     (spool_id,)).fetchone()[0]
+        if attempts >= SPOOL_MAX_ATTEMPTS:
+            self.conn.execute("UPDATE spool SET quarantined_at = ? WHERE id = ?",
+                              (datetime.now(timezone.utc).isoformat(), spool_id))
+        self.conn.commit()
+        if attempts < SPOOL_MAX_ATTEMPTS:
+            log.warning("  Database rejected %d spooled %s rows (attempt %d of %d)",
+                        row_count, kind, attempts, SPOOL_MAX_ATTEMPTS)
+            return False
+        METRICS.inc("rows_quarantined_total", row_count)
+        METRICS.set("spool_rows", self.pending_rows(), device=self.device)
+        log.error("  Database rejected %d spooled %s rows %d times: quarantined",
+                  row_count, kind, attempts)
+        return True
+
+    def drain(self):
+        """Insert spooled rows. Returns False if the database refused them.
+
+        When a drain batch is rejected, blobs are retried one at a time
+        until the rejected one is found and quarantined (see _rejected).
+        """
+        for kind, (_, unpack, method) in SPOOL_KINDS.items():
+            insert = getattr(self.writer, method)
+            limit = self.drain_rows
+            while True:
+                ids, rows = [], []
+                cur = self.conn.execute(
+                    "SELECT id, data FROM spool WHERE device = ? AND kind = ? "
+                    "AND quarantined_at IS NULL ORDER BY id", (self.device, kind))
+                for spool_id, blob in cur:
+                    ids.append(spool_id)
+                    rows.extend(unpack(blob))
+                    if len(rows) >= limit:
+                        break
+                cur.close()
+                if not rows:
+                    break
+                if insert(rows) == 0:
+                    if not self._outage():
+                        if len(ids) > 1:
+                            limit = 1
+                            continue
+                        if self._rejected(ids[0], kind, len(rows)):
+                            limit = self.drain_rows
+                            continue
+                    self.retry_at = time.monotonic() + self.retry_interval
+                    return False
+                self.conn.executemany("DELETE FROM spool WHERE id = ?", [(i,) for i in ids])
+                self.conn.commit()
+                METRICS.inc("rows_inserted_total" if kind == "nav" else "ais_inserted_total",
+                            len(rows))
+                pending = self.pending_rows()
+                METRICS.set("spool_rows", pending, device=self.device)
+                log.info("  Drained %d spooled %s rows (%d pending)", len(rows), kind, pending)
+        return True
+
+    def _insert(self, rows, kind):
+        self.spooled = 0
+        if not rows:
+            return 0
+        if time.monotonic() < self.retry_at:
+            return self._spool(rows, kind)
+        if self.pending_rows() and not self.drain():
+            return self._spool(rows, kind)
+        inserted = getattr(self.writer, SPOOL_KINDS[kind][2])(rows)
+        if inserted == 0:
+            if not self._outage():
+                return self._quarantine(rows, kind)
+            self.retry_at = time.monotonic() + self.retry_interval
+            return self._spool(rows, kind)
+        return inserted
+
+    def insert_rows(self, rows):
+        return self._insert(rows, "nav")
+
+    def insert_ais(self, records):
+        return self._insert(records, "ais")
+
+    def close(self):
+        self.writer.close()
+        self.conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Shared connection pool (several devices)
+# ---------------------------------------------------------------------------
+
+class ConnectionPool:
+    """At most `size` TimescaleDB connections, shared by several devices' writers.
+
+    A writer borrows a connection for one transaction. Waiters are served
+    first come, first served, and each device inserts one batch at a time,
+    so when the pool is exhausted the devices take turns: a backfill gets
+    one connection-turn per round like everyone else.
+    """
+
+    def __init__(self, size=4):
+        self.size = max(size, 1)
+        self.idle = []
+        self.busy = 0
+        self.turns = collections.deque()
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        """Wait for a turn. Returns an idle connection, or None to open one."""
+        ticket = object()
+        with self.cond:
+            self.turns.append(ticket)
+            self.cond.wait_for(lambda: self.turns[0] is ticket and self.busy < self.size)
+            self.turns.popleft()
+            self.busy += 1
+            self.cond.notify_all()
+            return self.idle.pop() if self.idle else None
+
+    def release(self, conn):
+        """Return a connection (None if it was dropped after an error)."""
+        with self.cond:
+            self.busy -= 1
+            if conn is not None:
+                self.idle.append(conn)
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            for conn in self.idle:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self.idle = []
+
+
+class PooledWriter:
+    """Runs one device's TimescaleDB writer on a shared ConnectionPool.
+
+    The writer's own connect/retry logic is unchanged: it is handed a pooled
+    connection (or none, and opens one) for each insert, and whatever it
+    ends up with goes back to the pool. Records per-device metrics.
+    """
+
+    def __init__(self, writer, pool):
+        self.writer = writer
+        self.pool = pool
+        self.device = writer.device
+
+    @property
+    def error(self):
+        return self.writer.error
+
+    def _insert(self, method, rows, counter):
+        if not rows:
+            return 0
+        start = time.perf_counter()
+        self.writer.conn = self.pool.acquire()
+        METRICS.observe("device_pool_wait_seconds", time.perf_counter() - start,
+                        device=self.device)
+        start = time.perf_counter()
+        try:
+            n = getattr(self.writer, method)(rows)
+        finally:
+            conn, self.writer.conn = self.writer.conn, None
+            self.pool.release(conn)
+        METRICS.observe("device_insert_seconds", time.perf_counter() - start,
+                        device=self.device)
+        if n:
+            METRICS.inc(counter, n, device=self.device)
+        else:
+            METRICS.inc("device_insert_failures_total", device=self.device)
+        return n
+
+    def insert_rows(self, rows):
+        return self._insert("insert_rows", rows, "device_rows_inserted_total")
+
+    def insert_ais(self, records):
+        return self._insert("insert_ais", records, "device_ais_inserted_total")
+
+    def close(self):
+        # Connections belong to the pool
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Backfill throttle
+# ---------------------------------------------------------------------------
+
+# Parsed batch size when a throttle is in use, and the step insert size grows
+# by. Inserts are made of whole parsed batches, so this is also the smallest.
+THROTTLE_STEP_ROWS = 500
+THROTTLE_MAX_ROWS = 50000
+
+
+class BackfillThrottle:
+    """AIMD control of backfill insert size and concurrency from commit latency.
+
+    Every insert that commits within target_latency seconds grows the next
+    insert by step_rows, and every `concurrency` of them in a row allow one
+    more insert in flight (up to max_concurrency). A slow or failed insert
+    halves both. The database's latency, not a fixed rate, sets the pace, so
+    a backfill slows down when live ingest or queries load the server.
+    max_rows_per_sec, if set, is a hard cap on top (a token bucket).
+    """
+
+    def __init__(self, batch_rows=BATCH_ROWS, max_concurrency=1, target_latency=1.0,
+                 max_rows_per_sec=0, step_rows=THROTTLE_STEP_ROWS,
+                 max_rows=THROTTLE_MAX_ROWS):
+        self.step_rows = step_rows
+        self.max_rows = max(max_rows, step_rows)
+        self.batch_rows = min(max(batch_rows, step_rows), self.max_rows)
+        self.max_concurrency = max(max_concurrency, 1)
+        self.concurrency = 1
+        self.target_latency = target_latency
+        self.max_rows_per_sec = max_rows_per_sec
+        self.fast = 0           # consecutive inserts within target_latency
+        self.free_at = 0.0      # monotonic time the rate cap next allows rows
+        self.lock = threading.Lock()
+        self._publish()
+
+    def _publish(self):
+        METRICS.set("throttle_batch_rows", self.batch_rows)
+        METRICS.set("throttle_concurrency", self.concurrency)
+
+    def observe(self, seconds, ok=True):
+        """Adjust after an insert that took `seconds` (ok=False if it failed)."""
+        with self.lock:
+            if ok and seconds <= self.target_latency:
+                self.batch_rows = min(self.batch_rows + self.step_rows, self.max_rows)
+                self.fast += 1
+                if self.fast >= self.concurrency and self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+                    self.fast = 0
+            else:
+                self.batch_rows = max(self.batch_rows // 2, self.step_rows)
+                self.concurrency = max(self.concurrency // 2, 1)
+                self.fast = 0
+                log.debug("  Backing off after a %.2fs insert: %d rows, %d in flight",
+                          seconds, self.batch_rows, self.concurrency)
+            self._publish()
+
+    def delay(self, n_rows):
+        """Seconds to wait before inserting n_rows under max_rows_per_sec."""
+        if not self.max_rows_per_sec:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            wait = max(self.free_at - now, 0.0)
+            self.free_at = max(self.free_at, now) + n_rows / self.max_rows_per_sec
+        return wait
+
+    def batches(self, batches):
+        """Merge consecutive parsed batches into inserts of about batch_rows rows.
+
+        A merged batch resumes where its last part does, so checkpoints stay
+        exact; parse with batch_size=step_rows to give it room to shrink.
+        """
+        rows, merged = [], None
+        for part, resume_offset, lines_read in batches:
+            rows.extend(part)
+            merged = (rows, resume_offset, lines_read)
+            if len(rows) >= self.batch_rows:
+                yield merged
+                rows, merged = [], None
+        # The parser's last batch may be empty; it still carries the end offset
+        if merged is not None:
+            yield merged
+
+
+# ---------------------------------------------------------------------------
+# Process a single file
+# ---------------------------------------------------------------------------
+
+def resume_point(filepath, state, force=False):
+    """Returns (stat, start_offset, start_line) for a file, or None if it is up to date."""
+    st = os.stat(filepath)
+    if force:
+        return st, 0, 0
+    if not state.needs_processing(filepath, st.st_mtime):
+        return None
+    start_offset, start_line = state.get_progress(filepath, st)
+    return st, start_offset, start_line
+
+
+def ingest_batches(filepath, st, start_line, batches, state, writer, stats=None, ais=None,
+                   throttle=None):
+    """Insert parsed batches, checkpointing progress after each committed one.
+
+    `batches` is an iterable of (rows, resume_offset, lines_read) as produced
+    by iter_batches. Stops at the first failed insert, leaving state at the
+    last committed batch so the next pass resumes mid-file. The parser's
+    ParseStats, if any, is merged into METRICS as batches arrive, and AIS
+    records its AISDecoder has collected so far are inserted before each
+    checkpoint; any re-read on resume are skipped by ON CONFLICT. A
+    BackfillThrottle, if given, sizes and paces the inserts.
+    """
+    inserted = 0
+    parsed = 0
+    total_lines = start_line
+    if throttle is not None:
+        batches = throttle.batches(batches)
+    batches = iter(batches)
+    batch = next(batches, None)
+    while batch is not None:
+        rows, resume_offset, lines_read = batch
+        following = next(batches, None)
+        # Only the last batch marks the file as fully processed at this mtime
+        mtime = st.st_mtime if following is None else None
+
+        if stats is not None:
+            METRICS.add_parse(stats)
+        METRICS.inc("lines_read_total", start_line + lines_read - total_lines)
+        METRICS.inc("rows_aggregated_total", len(rows))
+        parsed += len(rows)
+        if rows:
+            if throttle is not None:
+                wait = throttle.delay(len(rows))
+                if wait:
+                    time.sleep(wait)
+            start = time.perf_counter()
+            n = writer.insert_rows(rows)
+            elapsed = time.perf_counter() - start
+            METRICS.record_insert(len(rows), n, elapsed, getattr(writer, "spooled", 0))
+            if throttle is not None:
+                throttle.observe(elapsed, n > 0)
+            if n == 0:
+                log.warning("  %s: parsed %d rows but insert failed (resume at line %d)",
+                            os.path.basename(filepath), len(rows), total_lines)
+                return inserted
+            inserted += n
+        else:
+            n = 0
+        if ais is not None and not write_ais(writer, ais.take()):
+            log.warning("  %s: AIS insert failed (resume at line %d)",
+                        os.path.basename(filepath), total_lines)
+            return inserted
+        total_lines = start_line + lines_read
+        start = time.perf_counter()
+        state.update_progress(filepath, total_lines, n, mtime, resume_offset, st)
+        METRICS.record_checkpoint(filepath, st, resume_offset, time.perf_counter() - start)
+        batch = following
 
-    inserted = writer.insert_rows(rows)
     if inserted > 0:
-        state.update_progress(filepath, total_lines, inserted, mtime)
         log.info("  %s: +%d rows (lines %d-%d)", os.path.basename(filepath),
                  inserted, start_line, total_lines)
-    else:
-        log.warning("  %s: parsed %d rows but insert failed", os.path.basename(filepath), len(rows))
-
     return inserted
 
 
+def process_file(filepath, state, writer, force=False, batch_size=BATCH_ROWS,
+                 validate=False, bulk=False, ais=False, throttle=None):
+    """Parse and ingest a single file. Returns number of new rows inserted.
+
+    Rows are streamed from the parser to the writer in batches, so memory
+    use does not grow with file size. bulk=True uses the vectorized parser;
+    ais=True also decodes AIS sentences into ais_positions. With a throttle
+    the insert size is the throttle's, not batch_size.
+    """
+    resume = resume_point(filepath, state, force)
+    if resume is None:
+        return 0
+    st, start_offset, start_line = resume
+    if throttle is not None:
+        batch_size = throttle.step_rows
+    parse = iter_batches_bulk if bulk else iter_batches
+    stats = ParseStats() if METRICS.enabled else None
+    decoder = AISDecoder(validate) if ais else None
+    batches = parse(filepath, start_offset, batch_size, validate, stats=stats, ais=decoder)
+    if stats is not None:
+        batches = timed_batches(batches, stats)
+    return ingest_batches(filepath, st, start_line, batches, state, writer, stats, decoder,
+                          throttle)
+
+
+def process_files(filepaths, state, writer, force=False, workers=1,
+                  batch_size=BATCH_ROWS, validate=False, bulk=False, ais=False,
+                  throttle=None):
+    """Ingest several files, parsing up to `workers` of them in parallel.
+
+    Parsing runs in a process pool; inserts and state updates stay in this
+    process, so the SQLite state is only touched from one place and a file's
+    progress is recorded only after its rows have been committed. Up to
+    2 x workers files are parsed at once, each streaming its batches through
+    a bounded queue (stream_batches) and ingested in the order submitted, so
+    memory stays bounded whatever the file sizes. Files with at least two
+    SPLIT_CHUNK_BYTES left to parse are ingested after the rest, each split
+    across the whole pool with iter_batches_split (scalar parser).
+    """
+    if workers <= 1:
+        return sum(process_file(fp, state, writer, force=force, batch_size=batch_size,
+                                validate=validate, bulk=bulk, ais=ais, throttle=throttle)
+                   for fp in filepaths)
+    if throttle is not None:
+        batch_size = throttle.step_rows
+
+    pending = iter(filepaths)
+    in_flight = collections.deque()
+    large = []
+    total = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool, multiprocessing.Manager() as manager:
+        while True:
+            # The pool runs jobs in the order submitted and the oldest is
+            # ingested first, so the queue being read is always being filled
+            while len(in_flight) < workers * 2:
+                filepath = next(pending, None)
+                if filepath is None:
+                    break
+                resume = resume_point(filepath, state, force)
+                if resume is None:
+                    continue
+                st, start_offset, start_line = resume
+                size = log_size(filepath, st)
+                if size is not None and size - start_offset >= 2 * SPLIT_CHUNK_BYTES:
+                    large.append((filepath, st, start_offset, start_line))
+                    continue
+                queue = manager.Queue(STREAM_QUEUE_BATCHES)
+                future = pool.submit(stream_batches, queue, filepath, start_offset, batch_size,
+                                     validate, bulk, METRICS.enabled, ais)
+                in_flight.append((future, queue, filepath, st, start_line))
+            if not in_flight:
+                break
+            future, queue, filepath, st, start_line = in_flight.popleft()
+            stats = ParseStats() if METRICS.enabled else None
+            decoder = AISDecoder(validate) if ais else None
+            batches = queued_batches(queue, future, stats, decoder)
+            try:
+                total += ingest_batches(filepath, st, start_line, batches,
+                                        state, writer, stats, decoder, throttle)
+            finally:
+                batches.close()
+
+        for filepath, st, start_offset, start_line in large:
+            stats = ParseStats() if METRICS.enabled else None
+            decoder = AISDecoder(validate) if ais else None
+            batches = iter_batches_split(filepath, pool, workers, start_offset, batch_size,
+                                         validate, stats=stats, ais=decoder)
+            total += ingest_batches(filepath, st, start_line, batches,
+                                    state, writer, stats, decoder, throttle)
+    return total
+
+
+# ---------------------------------------------------------------------------
+# Async ingest
+# ---------------------------------------------------------------------------
+
+class _FileCheckpoints:
+    """Commits a file's batch checkpoints in order as out-of-order inserts finish."""
+
+    def __init__(self, filepath, st, start_line):
+        self.filepath = filepath
+        self.st = st
+        self.start_line = start_line
+        self.next_seq = 0
+        self.done = {}       # seq -> (inserted, resume_offset, lines_read, last)
+        self.failed = False
+        self.inserted = 0
+        self.committed_lines = start_line
+
+    def complete(self, seq, inserted, resume_offset, lines_read, last, state):
+        self.done[seq] = (inserted, resume_offset, lines_read, last)
+        while not self.failed and self.next_seq in self.done:
+            n, offset, lines, is_last = self.done.pop(self.next_seq)
+            mtime = self.st.st_mtime if is_last else None
+            start = time.perf_counter()
+            state.update_progress(self.filepath, self.start_line + lines, n, mtime,
+                                  offset, self.st)
+            METRICS.record_checkpoint(self.filepath, self.st, offset,
+                                      time.perf_counter() - start)
+            self.inserted += n
+            self.committed_lines = self.start_line + lines
+            self.next_seq += 1
+            if is_last and self.inserted > 0:
+                log.info("  %s: +%d rows (lines %d-%d)", os.path.basename(self.filepath),
+                         self.inserted, self.start_line, self.start_line + lines)
+
+
+async def ingest_async(filepaths, state, writer, force=False, batch_size=BATCH_ROWS,
+                       validate=False, bulk=False, ais=False, in_flight=4, queue_size=8,
+                       report_interval=10, throttle=None):
+    """Ingest files with parsing overlapped with several concurrent inserts.
+
+    A parser task runs iter_batches in a worker thread and feeds a bounded
+    queue; `in_flight` writer tasks drain it through an async writer. Batches
+    of one file may commit out of order, but its checkpoint only advances
+    over a contiguous run of committed batches, and stops at the first
+    failure. Throughput and queue depth are logged every report_interval s.
+    With a BackfillThrottle, it sets the insert size and how many of the
+    writer tasks may insert at once.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_size)
+    stats = {"rows": 0, "batches": 0, "busy": 0}
+    slots = asyncio.Condition()
+
+    def may_insert():
+        limit = throttle.concurrency if throttle is not None else in_flight
+        return stats["busy"] < limit
+
+    async def parse():
+        parse_fn = iter_batches_bulk if bulk else iter_batches
+        for filepath in filepaths:
+            resume = resume_point(filepath, state, force)
+            if resume is None:
+                continue
+            st, start_offset, start_line = resume
+            progress = _FileCheckpoints(filepath, st, start_line)
+            parse_stats = ParseStats() if METRICS.enabled else None
+            decoder = AISDecoder(validate) if ais else None
+            batches = parse_fn(filepath, start_offset,
+                               batch_size if throttle is None else throttle.step_rows,
+                               validate, stats=parse_stats, ais=decoder)
+            if parse_stats is not None:
+                batches = timed_batches(batches, parse_stats)
+            if throttle is not None:
+                batches = throttle.batches(batches)
+            batch = await loop.run_in_executor(None, next, batches, None)
+            seq = 0
+            lines_seen = 0
+            while batch is not None and not progress.failed:
+                following = await loop.run_in_executor(None, next, batches, None)
+                if parse_stats is not None:
+                    METRICS.add_parse(parse_stats)
+                METRICS.inc("lines_read_total", batch[2] - lines_seen)
+                METRICS.inc("rows_aggregated_total", len(batch[0]))
+                lines_seen = batch[2]
+                records = decoder.take() if decoder is not None else []
+                await queue.put((progress, seq, batch, records, following is None))
+                METRICS.set("queue_batches", queue.qsize())
+                batch = following
+                seq += 1
+        for _ in range(in_flight):
+            await queue.put(None)
+
+    async def write():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            progress, seq, (rows, resume_offset, lines_read), records, last = item
+            METRICS.set("queue_batches", queue.qsize())
+            if progress.failed:
+                continue
+            n = 0
+            if rows:
+                async with slots:
+                    await slots.wait_for(may_insert)
+                    stats["busy"] += 1
+                if throttle is not None:
+                    await asyncio.sleep(throttle.delay(len(rows)))
+                start = time.perf_counter()
+                n = await writer.insert_rows(rows)
+                elapsed = time.perf_counter() - start
+                METRICS.record_insert(len(rows), n, elapsed)
+                if throttle is not None:
+                    throttle.observe(elapsed, n > 0)
+                async with slots:
+                    stats["busy"] -= 1
+                    slots.notify_all()
+                if n == 0:
+                    progress.failed = True
+                    log.warning("  %s: insert failed (resume at line %d)",
+                                os.path.basename(progress.filepath),
+                                progress.committed_lines)
+                    continue
+            if records:
+                n_ais = await writer.insert_ais(records)
+                METRICS.inc("ais_inserted_total", n_ais)
+                if n_ais == 0:
+                    progress.failed = True
+                    log.warning("  %s: AIS insert failed (resume at line %d)",
+                                os.path.basename(progress.filepath),
+                                progress.committed_lines)
+                    continue
+            stats["rows"] += n
+            stats["batches"] += 1
+            progress.complete(seq, n, resume_offset, lines_read, last, state)
+
+    async def report():
+        last_rows, last_t = 0, time.monotonic()
+        while True:
+            await asyncio.sleep(report_interval)
+            now = time.monotonic()
+            log.info("async ingest: %.0f rows/s, %d rows in %d batches, queue %d/%d, "
+                     "%d inserts in flight", (stats["rows"] - last_rows) / (now - last_t),
+                     stats["rows"], stats["batches"], queue.qsize(), queue_size, stats["busy"])
+            last_rows, last_t = stats["rows"], now
+
+    reporter = asyncio.create_task(report())
+    try:
+        await asyncio.gather(parse(), *(write() for _ in range(in_flight)))
+    finally:
+        reporter.cancel()
+    return stats["rows"]
+
+
+async def run_async_ingest(filepaths, state, writer, **kwargs):
+    """ingest_async followed by closing the writer on the same event loop."""
+    try:
+        return await ingest_async(filepaths, state, writer, **kwargs)
+    finally:
+        await writer.close()
+
+
 # ---------------------------------------------------------------------------
 # Watch mode
 # ---------------------------------------------------------------------------
 
-def watch_directory(watch_dir, state, writer, poll_interval=30):
-    """Watch a directory for new/modified NMEA files and process them."""
+LOG_EXTENSIONS = (".nmea", ".log")
+LOG_SUFFIXES = LOG_EXTENSIONS + tuple(ext + c for ext in LOG_EXTENSIONS
+                                      for c in COMPRESSED_EXTENSIONS)
+
+
+def is_log_file(name):
+    """True for NMEA log file names, ignoring Syncthing's in-progress temp files."""
+    if name.startswith((".syncthing.", "~syncthing~")) or name.endswith(".tmp"):
+        return False
+    return name.endswith(LOG_SUFFIXES)
+
+
+def find_log_files(root):
+    """Recursively list NMEA log files under root."""
+    found = []
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file() and is_log_file(entry.name):
+                        found.append(entry.path)
+        except OSError:
+            continue
+    return found
+
+
+class ScandirWatcher:
+    """Polling fallback that keeps a cached tree of directories and files.
+
+    A directory is only re-listed when its own mtime changes (a file was added,
+    removed or renamed into it — which is how Syncthing delivers updates), and
+    known files are reported only when their size or mtime has moved.
+    """
+
+    def __init__(self, root, poll_interval=30):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.dirs = {}     # dir path -> (mtime, [subdir paths], [file paths])
+        self.files = {}    # file path -> (mtime, size)
+        self._scan()
+
+    def _list_dir(self, path):
+        subdirs, files = [], []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file() and is_log_file(entry.name):
+                    files.append(entry.path)
+        return subdirs, files
+
+    def _scan(self):
+        """Refresh the cached tree. Returns the set of new or changed files."""
+        changed = set()
+        seen_dirs = {}
+        seen_files = {}
+        stack = [self.root]
+        while stack:
+            path = stack.pop()
+            try:
+                mtime = os.stat(path).st_mtime
+                cached = self.dirs.get(path)
+                if cached is not None and cached[0] == mtime:
+                    subdirs, files = cached[1], cached[2]
+                else:
+                    subdirs, files = self._list_dir(path)
+            except OSError:
+                continue
+            seen_dirs[path] = (mtime, subdirs, files)
+            stack.extend(subdirs)
+            for fp in files:
+                try:
+                    st = os.stat(fp)
+                except OSError:
+                    continue
+                sig = (st.st_mtime, st.st_size)
+                seen_files[fp] = sig
+                if self.files.get(fp) != sig:
+                    changed.add(fp)
+        self.dirs = seen_dirs
+        self.files = seen_files
+        return changed
+
+    def wait(self, timeout=None):
+        """Sleep one poll interval, then return files that changed."""
+        time.sleep(self.poll_interval)
+        return self._scan()
+
+
+class InotifyWatcher:
+    """Event-driven watcher using Linux inotify.
+
+    Bursts of events for a file are coalesced: a file is reported `debounce`
+    seconds after its first event, so Syncthing's temp-file-then-rename and
+    chunked writes produce a single wake-up.
+    """
+
+    def __init__(self, root, debounce=0.5):
+        self.root = root
+        self.debounce = debounce
+        self.inotify = INotify()
+        self.mask = (inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO |
+                     inotify_flags.MODIFY | inotify_flags.CREATE)
+        self.wd_paths = {}  # watch descriptor -> directory path
+        self.pending = {}   # file path -> deadline
+        self._add_tree(root)
+
+    def _add_tree(self, root):
+        """Watch root and all its subdirectories. Returns log files found in them."""
+        found = []
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            try:
+                wd = self.inotify.add_watch(path, self.mask)
+                self.wd_paths[wd] = path
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file() and is_log_file(entry.name):
+                            found.append(entry.path)
+            except OSError as e:
+                log.warning("Cannot watch %s: %s", path, e)
+        return found
+
+    def wait(self, timeout=None):
+        """Block until at least one file has changed and settled; return them.
+
+        With a timeout (seconds), returns an empty set if nothing settled.
+        """
+        pending = self.pending
+        give_up = None if timeout is None else time.monotonic() + timeout
+        while True:
+            deadlines = list(pending.values())
+            if give_up is not None:
+                deadlines.append(give_up)
+            if deadlines:
+                timeout_ms = max(0, int((min(deadlines) - time.monotonic()) * 1000))
+            else:
+                timeout_ms = None
+            for event in self.inotify.read(timeout=timeout_ms):
+                parent = self.wd_paths.get(event.wd)
+                if parent is None or not event.name:
+                    continue
+                path = os.path.join(parent, event.name)
+                if event.mask & inotify_flags.ISDIR:
+                    if event.mask & (inotify_flags.CREATE | inotify_flags.MOVED_TO):
+                        for fp in self._add_tree(path):
+                            pending.setdefault(fp, time.monotonic() + self.debounce)
+                elif is_log_file(event.name):
+                    pending.setdefault(path, time.monotonic() + self.debounce)
+
+            now = time.monotonic()
+            ready = {p for p, deadline in pending.items() if deadline <= now}
+            if ready:
+                for p in ready:
+                    del pending[p]
+                return ready
+            if give_up is not None and now >= give_up:
+                return set()
+
+
+def make_watcher(watch_dir, poll_interval=30, debounce=0.5, force_poll=False):
+    """Returns an inotify watcher where available, else the scandir poller."""
+    if INotify is not None and not force_poll:
+        try:
+            watcher = InotifyWatcher(watch_dir, debounce=debounce)
+            log.info("Watching %s (inotify, debounce %.1fs)", watch_dir, debounce)
+            return watcher
+        except OSError as e:
+            log.warning("inotify unavailable (%s), falling back to polling", e)
     log.info("Watching %s (poll every %ds)", watch_dir, poll_interval)
+    return ScandirWatcher(watch_dir, poll_interval=poll_interval)
 
-    while True:
-        files = []
-        for ext in ("*.nmea", "*.log"):
-            files.extend(glob.glob(os.path.join(watch_dir, ext)))
-            files.extend(glob.glob(os.path.join(watch_dir, "**", ext), recursive=True))
 
+def watch_directory(watch_dir, state, writer, poll_interval=30, debounce=0.5,
+                    force_poll=False, validate=False, ais=False):
+    """Watch a directory for new/modified NMEA files and process them."""
+    watcher = make_watcher(watch_dir, poll_interval, debounce, force_poll)
+
+    # Catch up on anything that changed while the relay was down
+    changed = find_log_files(watch_dir)
+
+    while True:
         total_new = 0
-        for filepath in sorted(files):
-            total_new += process_file(filepath, state, writer)
+        for filepath in sorted(changed):
+            try:
+                total_new += process_file(filepath, state, writer, validate=validate, ais=ais)
+            except FileNotFoundError:
+                continue
 
+        state.flush()
         if total_new > 0:
             log.info("Cycle complete: %d new rows", total_new)
 
-        time.sleep(poll_interval)
+        # While rows are spooled, wake up periodically to retry the database
+        spooled = getattr(writer, "pending_rows", lambda: 0)()
+        if spooled:
+            writer.drain()
+        changed = watcher.wait(timeout=poll_interval if spooled else None)
+
+
+def load_devices(path):
+    """Read a --devices config: a JSON object mapping watch directories to device names."""
+    with open(path) as f:
+        config = json.load(f)
+    if not isinstance(config, dict) or not config or \
+            not all(isinstance(v, str) and v for v in config.values()):
+        raise ValueError(f"{path}: expected an object of directory -> device name")
+    return {os.path.expanduser(watch_dir): device for watch_dir, device in config.items()}
+
+
+def watch_devices(devices, state_path, db_url=None, pool_size=4, copy=False,
+                  spool_path=None, **watch_kwargs):
+    """Watch one directory per device (see load_devices), each in its own thread.
+
+    Every device has its own watcher, state and writer, so a large backfill
+    on one boat only ever holds up the others for a single batch: inserts
+    take turns on a shared ConnectionPool of pool_size connections. Without
+    db_url, rows go to a DryRunWriter per device. Runs until interrupted.
+    """
+    pool = ConnectionPool(pool_size)
+    writer_cls = TimescaleDBCopyWriter if copy else TimescaleDBWriter
+
+    def run(watch_dir, device):
+        # SQLite connections are opened in the thread that uses them; the
+        # state and spool databases are shared, each row tagged by file/device
+        state = StateTracker(state_path)
+        if db_url:
+            writer = PooledWriter(writer_cls(db_url, device=device,
+                                             ais=watch_kwargs.get("ais", False)), pool)
+            if spool_path is not None:
+                writer = SpoolingWriter(writer, spool_path)
+        else:
+            writer = DryRunWriter()
+        try:
+            watch_directory(watch_dir, state, writer, **watch_kwargs)
+        except Exception:
+            log.exception("%s: watcher for %s stopped", device, watch_dir)
+        finally:
+            writer.close()
+            state.close()
+
+    threads = []
+    for watch_dir, device in devices.items():
+        log.info("Device %s: %s", device, watch_dir)
+        thread = threading.Thread(target=run, args=(watch_dir, device), name=device,
+                                  daemon=True)
+        thread.start()
+        threads.append(thread)
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+    finally:
+        pool.close()
+
+
+# ---------------------------------------------------------------------------
+# Live TCP ingest
+# ---------------------------------------------------------------------------
+
+def ingest_tcp(host, port, writer, flush_interval=0.5, flush_rows=500, validate=False,
+               ais=False, report_interval=60, retry_interval=5, max_pending=100000):
+    """Ingest live from an NMEA 0183 TCP stream (SignalK on :10110, or the replay rig).
+
+    Sentences are stamped with their receive time and go through the same
+    parse_sentence/RowAggregator path as log files. The open window is closed
+    on the clock once it is older than the aggregation window, instead of
+    waiting for the next sentence, and rows are flushed to the writer once
+    the oldest has waited flush_interval seconds or flush_rows accumulate.
+    AIS messages (ais=True) are decoded and flushed alongside. Reconnects
+    with backoff, which is reset once the stream yields a row.
+
+    If the writer refuses a flush (only possible without a spool) the rows
+    are kept and retried every retry_interval seconds; past max_pending the
+    oldest are dropped, logged and counted in rows_dropped_total.
+    """
+    aggregator = RowAggregator()
+    decoder = AISDecoder(validate) if ais else None
+    stats = ParseStats() if METRICS.enabled else None
+    rows = []
+    pending_since = None
+    retry_at = 0
+    backoff = 1
+    total, last_report = 0, time.monotonic()
+
+    def flush():
+        nonlocal rows, pending_since, retry_at, total
+        if time.monotonic() < retry_at:
+            return
+        if rows:
+            start = time.perf_counter()
+            n = writer.insert_rows(rows)
+            METRICS.record_insert(len(rows), n, time.perf_counter() - start,
+                                  getattr(writer, "spooled", 0))
+            if n == 0:
+                retry_at = time.monotonic() + retry_interval
+                dropped = max(len(rows) - max_pending, 0)
+                if dropped:
+                    del rows[:dropped]
+                    METRICS.inc("rows_dropped_total", dropped)
+                log.warning("  tcp: insert failed, keeping %d rows for retry in %ds "
+                            "(%d oldest dropped)", len(rows), retry_interval, dropped)
+                return
+            total += n
+            log.debug("  tcp: flushed %d rows", len(rows))
+            # Written: a failed AIS insert below retries only the AIS records
+            rows = []
+        if decoder is not None:
+            records = decoder.take()
+            if not write_ais(writer, records):
+                retry_at = time.monotonic() + retry_interval
+                decoder.records[:0] = records[-max_pending:]
+                log.warning("  tcp: AIS insert failed, keeping %d messages for retry in %ds",
+                            len(decoder.records), retry_interval)
+                return
+        pending_since = None
+
+    def close_window():
+        row = aggregator.flush()
+        if row is not None:
+            rows.append(row)
+        flush()
+
+    try:
+        while True:
+            try:
+                sock = socket.create_connection((host, port), timeout=10)
+            except OSError as e:
+                log.warning("TCP connect to %s:%d failed: %s (retry in %ds)", host, port, e, backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            log.info("Connected to NMEA stream %s:%d", host, port)
+            sock.settimeout(0.1)
+            buf = b""
+            try:
+                while True:
+                    try:
+                        chunk = sock.recv(65536)
+                        if not chunk:
+                            raise ConnectionError("connection closed by peer")
+                        buf += chunk
+                        *lines, buf = buf.split(b"\n")
+                    except socket.timeout:
+                        lines = []
+
+                    now_ms = int(time.time() * 1000)
+                    start, n_rows = time.perf_counter(), len(rows)
+                    for raw in lines:
+                        sentence = raw.decode("ascii", errors="ignore").strip()
+                        if sentence[:1] == "!":
+                            accepted = decoder is not None and decoder.add(now_ms, sentence)
+                            if stats is not None:
+                                stats.record(sentence, accepted)
+                            continue
+                        fields = parse_sentence(sentence, validate)
+                        if stats is not None:
+                            stats.record(sentence, fields is not None)
+                        if fields is None:
+                            continue
+                        row = aggregator.add(now_ms, fields)
+                        if row is not None:
+                            rows.append(row)
+                    if (aggregator.current_ts is not None and
+                            now_ms - aggregator.current_ts > aggregator.window_ms):
+                        row = aggregator.flush()
+                        if row is not None:
+                            rows.append(row)
+                    if len(rows) > n_rows:
+                        backoff = 1
+                    METRICS.inc("lines_read_total", len(lines))
+                    METRICS.inc("rows_aggregated_total", len(rows) - n_rows)
+                    if stats is not None:
+                        stats.seconds += time.perf_counter() - start
+                        METRICS.add_parse(stats)
+
+                    now = time.monotonic()
+                    pending = rows or (decoder is not None and decoder.records)
+                    if pending and pending_since is None:
+                        pending_since = now
+                    if pending and (len(rows) >= flush_rows or now - pending_since >= flush_interval):
+                        flush()
+                    if now - last_report >= report_interval:
+                        log.info("tcp: %d rows in the last %ds", total, report_interval)
+                        total, last_report = 0, now
+            except OSError as e:
+                log.warning("NMEA stream %s:%d lost: %s (reconnect in %ds)",
+                            host, port, e, backoff)
+            finally:
+                sock.close()
+                close_window()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+    finally:
+        retry_at = 0
+        close_window()
+        if rows:
+            METRICS.inc("rows_dropped_total", len(rows))
+            log.warning("tcp: %d rows not inserted at shutdown", len(rows))
 
 
 # ---------------------------------------------------------------------------
 # CLI
 # ---------------------------------------------------------------------------
 
+def require_schema(db_url, ais=False):
+    """Exit with an error if the database is up but lacks the --init-schema migration.
+
+    A database that can't be reached is left to the writers (and the
+    spool): they check every connection they open.
+    """
+    writer = TimescaleDBWriter(db_url, ais=ais)
+    try:
+        writer.connect()
+    except SchemaError as e:
+        log.error("%s", e)
+        sys.exit(1)
+    finally:
+        writer.close()
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="NMEA Relay — ingest NMEA logs to TimescaleDB")
     parser.add_argument("--file", nargs="+", help="Import specific NMEA files")
     parser.add_argument("--import-dir", help="Import all files in a directory")
     parser.add_argument("--watch", help="Watch directory for new/modified files")
+    parser.add_argument("--devices", metavar="CONFIG",
+                        help="Watch several boats' directories: a JSON file mapping "
+                             "each directory to its device name")
+    parser.add_argument("--pool-size", type=int, default=4,
+                        help="TimescaleDB connections shared by the --devices watchers")
+    parser.add_argument("--tcp", metavar="HOST:PORT",
+                        help="Ingest live from an NMEA 0183 TCP stream (e.g. signalk:10110)")
+    parser.add_argument("--flush-interval", type=float, default=0.5,
+                        help="Max seconds a row waits before being written in --tcp mode")
+    parser.add_argument("--compress", nargs="+", metavar="FILE",
+                        help="Write FILE.gz (or .zst) with a block index for seek/resume, then exit")
+    parser.add_argument("--zstd", action="store_true",
+                        help="Compress with zstd instead of gzip (needs zstandard)")
     parser.add_argument("--db-url",
                         default=os.environ.get("TIMESCALE_CONNECTION_STRING", ""),
                         help="TimescaleDB connection string")
+    parser.add_argument("--init-schema", action="store_true",
+                        help="Add the nav_data columns and create the ais_positions "
+                             "and rollup tables (run once, as their owner) before ingesting")
     parser.add_argument("--device",
                         default=os.environ.get("DEVICE_NAME", "blacksheep"),
                         help="Device name tag")
     parser.add_argument("--state-db", default="~/.nmea-relay-state.sqlite",
                         help="Path to state tracking database")
     parser.add_argument("--poll-interval", type=int, default=30,
-                        help="Seconds between directory polls in watch mode")
+                        help="Seconds between directory polls in watch mode (polling fallback)")
+    parser.add_argument("--debounce", type=float, default=0.5,
+                        help="Seconds to coalesce file events before ingesting (inotify)")
+    parser.add_argument("--poll", action="store_true",
+                        help="Poll the watch directory even if inotify is available")
+    parser.add_argument("--copy", action="store_true",
+                        help="Insert via COPY into a staging table (for backfills; not yet "
+                             "measured against the default, see bench_writers.py)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Parse this many files in parallel (--file/--import-dir); "
+                             "large files are split across the workers")
+    parser.add_argument("--batch-size", type=int, default=BATCH_ROWS,
+                        help="Rows per insert/checkpoint (the starting size with --throttle)")
+    parser.add_argument("--throttle", action="store_true",
+                        help="Size --file/--import-dir inserts (and --async concurrency) "
+                             "by commit latency instead of a fixed --batch-size")
+    parser.add_argument("--max-rows-per-sec", type=float, default=0,
+                        help="Cap --file/--import-dir inserts at this many rows/s "
+                             "(implies --throttle)")
+    parser.add_argument("--target-latency", type=float, default=1.0,
+                        help="With --throttle, seconds per insert above which it "
+                             "backs off (smaller inserts, fewer in flight)")
+    parser.add_argument("--validate-checksums", action="store_true",
+                        help="Drop sentences whose NMEA checksum does not match")
+    parser.add_argument("--ais", action="store_true",
+                        help="Also decode AIS (!AIVDM/!AIVDO) into ais_positions "
+                             "(created by --init-schema)")
+    parser.add_argument("--no-bulk", action="store_true",
+                        help="Use the line-by-line parser for --file/--import-dir "
+                             "even if numpy is installed")
+    parser.add_argument("--async", dest="async_ingest", action="store_true",
+                        help="Overlap parsing with concurrent inserts (asyncpg) "
+                             "for --file/--import-dir; not yet measured, see "
+                             "bench_writers.py. Does not spool, so it needs "
+                             "--no-spool (or --dry-run)")
+    parser.add_argument("--in-flight", type=int, default=4,
+                        help="Concurrent insert batches in --async mode")
+    parser.add_argument("--spool", default="~/.nmea-relay-spool.sqlite",
+                        help="Spool database holding parsed rows while TimescaleDB is down")
+    parser.add_argument("--no-spool", action="store_true",
+                        help="Leave files unprocessed on insert failure instead of spooling")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve Prometheus metrics on http://0.0.0.0:PORT/metrics")
+    parser.add_argument("--stats-interval", type=float, default=0,
+                        help="Log per-stage throughput and timing every N seconds")
     parser.add_argument("--dry-run", action="store_true",
                         help="Parse and count rows without inserting to DB")
     parser.add_argument("--force", action="store_true",
@@ -394,14 +3868,80 @@ def main():
         format="%(asctime)s %(levelname)s %(message)s",
     )
 
-    if not args.file and not args.import_dir and not args.watch:
-        parser.error("Specify --file, --import-dir, or --watch")
+    if args.compress:
+        fmt = ".zst" if args.zstd else ".gz"
+        for filepath in args.compress:
+            dst = compress_log(filepath, fmt)
+            log.info("%s: %d -> %d bytes", dst, os.path.getsize(filepath), os.path.getsize(dst))
+        return
+
+    if args.init_schema:
+        if psycopg2 is None or not args.db_url:
+            log.error("--init-schema needs psycopg2 and --db-url / TIMESCALE_CONNECTION_STRING")
+            sys.exit(1)
+        writer = TimescaleDBWriter(args.db_url)
+        ok = writer.ensure_schema()
+        writer.close()
+        if not ok:
+            sys.exit(1)
+
+    if not args.file and not args.import_dir and not args.watch and not args.tcp \
+            and not args.devices:
+        if args.init_schema:
+            return
+        parser.error("Specify --file, --import-dir, --watch, --devices, --tcp, --compress "
+                     "or --init-schema")
 
     state_path = os.path.expanduser(args.state_db)
     state = StateTracker(state_path)
 
+    if args.async_ingest and (args.watch or args.tcp or args.devices):
+        parser.error("--async applies to --file and --import-dir")
+    if args.async_ingest and not args.no_spool and not args.dry_run:
+        parser.error("--async does not spool during a database outage; pass --no-spool "
+                     "to accept that, or leave out --async")
+
+    if args.devices:
+        try:
+            devices = load_devices(args.devices)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if not args.dry_run and (psycopg2 is None or not args.db_url):
+            log.error("--devices needs psycopg2 and --db-url / TIMESCALE_CONNECTION_STRING. "
+                      "Use --dry-run to test without DB.")
+            sys.exit(1)
+        if not args.dry_run:
+            require_schema(args.db_url, args.ais)
+        if args.metrics_port:
+            METRICS.enabled = True
+            serve_metrics(args.metrics_port)
+        if args.stats_interval:
+            METRICS.enabled = True
+            log_stats(args.stats_interval)
+        try:
+            watch_devices(devices, state_path, None if args.dry_run else args.db_url,
+                          pool_size=args.pool_size, copy=args.copy,
+                          spool_path=None if args.no_spool else os.path.expanduser(args.spool),
+                          poll_interval=args.poll_interval, debounce=args.debounce,
+                          force_poll=args.poll, validate=args.validate_checksums,
+                          ais=args.ais)
+        except KeyboardInterrupt:
+            log.info("Interrupted")
+        finally:
+            state.close()
+        return
+
     if args.dry_run:
         writer = DryRunWriter()
+    elif args.async_ingest:
+        if asyncpg is None:
+            log.error("asyncpg not installed. Use --dry-run or: pip install asyncpg")
+            sys.exit(1)
+        if not args.db_url:
+            log.error("No --db-url or TIMESCALE_CONNECTION_STRING set. Use --dry-run to test without DB.")
+            sys.exit(1)
+        writer = AsyncTimescaleDBWriter(args.db_url, device=args.device,
+                                        pool_size=args.in_flight, ais=args.ais)
     else:
         if psycopg2 is None:
             log.error("psycopg2 not installed. Use --dry-run or: pip install psycopg2-binary")
@@ -409,21 +3949,59 @@ def main():
         if not args.db_url:
             log.error("No --db-url or TIMESCALE_CONNECTION_STRING set. Use --dry-run to test without DB.")
             sys.exit(1)
-        writer = TimescaleDBWriter(args.db_url, device=args.device)
+        require_schema(args.db_url, args.ais)
+        writer_cls = TimescaleDBCopyWriter if args.copy else TimescaleDBWriter
+        writer = writer_cls(args.db_url, device=args.device, ais=args.ais)
+        if not args.no_spool:
+            writer = SpoolingWriter(writer, os.path.expanduser(args.spool))
+
+    if args.metrics_port or args.stats_interval:
+        METRICS.enabled = True
+        if args.metrics_port:
+            serve_metrics(args.metrics_port)
+        if args.stats_interval:
+            log_stats(args.stats_interval)
+
+    # One-shot imports use the vectorized parser when numpy is available
+    bulk = np is not None and not args.no_bulk
+    ais = args.ais
 
     try:
-        if args.file:
-            for filepath in args.file:
-                process_file(filepath, state, writer, force=args.force)
-        elif args.import_dir:
-            files = []
-            for ext in ("*.nmea", "*.log"):
-                files.extend(glob.glob(os.path.join(args.import_dir, ext)))
-            for filepath in sorted(files):
-                process_file(filepath, state, writer, force=args.force)
+        if args.file or args.import_dir:
+            if args.file:
+                files = args.file
+            else:
+                files = []
+                for suffix in LOG_SUFFIXES:
+                    files.extend(glob.glob(os.path.join(args.import_dir, "*" + suffix)))
+                files = sorted(files)
+            throttle = None
+            if args.throttle or args.max_rows_per_sec:
+                throttle = BackfillThrottle(
+                    args.batch_size, args.in_flight if args.async_ingest else 1,
+                    args.target_latency, args.max_rows_per_sec)
+            if args.async_ingest:
+                if not isinstance(writer, AsyncTimescaleDBWriter):
+                    writer = AsyncWriterAdapter(writer)
+                asyncio.run(run_async_ingest(
+                    files, state, writer, force=args.force, batch_size=args.batch_size,
+                    validate=args.validate_checksums, bulk=bulk, ais=ais,
+                    in_flight=args.in_flight, throttle=throttle))
+            else:
+                process_files(files, state, writer, force=args.force,
+                              workers=args.workers, batch_size=args.batch_size,
+                              validate=args.validate_checksums, bulk=bulk, ais=ais,
+                              throttle=throttle)
+        elif args.tcp:
+            host, _, port = args.tcp.rpartition(":")
+            ingest_tcp(host or "localhost", int(port), writer,
+                       flush_interval=args.flush_interval,
+                       validate=args.validate_checksums, ais=ais)
         elif args.watch:
             watch_directory(args.watch, state, writer,
-                            poll_interval=args.poll_interval)
+                            poll_interval=args.poll_interval,
+                            debounce=args.debounce, force_poll=args.poll,
+                            validate=args.validate_checksums, ais=ais)
 
         # Print summary
         summary = state.summary()
@@ -434,11 +4012,19 @@ def main():
                 log.info("  %s: %d lines, %d rows", os.path.basename(filepath), lines, rows)
                 total_rows += rows
             log.info("  Total: %d rows across %d files", total_rows, len(summary))
+        if isinstance(writer, SpoolingWriter) and writer.pending_rows():
+            log.warning("  %d rows still spooled; they are sent on the next run",
+                        writer.pending_rows())
 
     except KeyboardInterrupt:
         log.info("Interrupted")
+    except SchemaError as e:
+        # The database came up without the migration after the startup check
+        log.error("%s", e)
+        sys.exit(1)
     finally:
-        writer.close()
+        if not args.async_ingest:
+            writer.close()
         state.close()
 
 
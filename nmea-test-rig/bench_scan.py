@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Benchmark the replay server's byte-level track scan against line-at-a-time reading.
+
+Runs the track loader (scan_track) over the given logs, next to a copy of
+the loop from before the scanner, which decoded and split every line.
+Reports CPU time (best of --repeat runs), the number of garbage
+collections triggered (a proxy for how many objects were kept alive) and
+peak traced memory. The relay's file parser was measured the same way
+and kept its plain loop: a scanner did not make it faster.
+
+Usage:
+    python3 bench_scan.py ../analysis/skserver-raw_*.log
+    python3 bench_scan.py --repeat 10 --only GNRMC,IIMWV ../analysis/*.log
+"""
+
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+
+import replay_server
+
+
+# ---------------------------------------------------------------------------
+# The line-at-a-time loop, for comparison
+# ---------------------------------------------------------------------------
+
+def baseline_track(filepath, mode=None, types=frozenset()):
+    """Track.load as it was: a text-mode read, every line stripped and split."""
+    lines = []
+    with open(filepath, "r", errors="replace") as f:
+        for raw in f:
+            parsed = replay_server.parse_track_line(raw, mode, types)
+            if parsed is not None:
+                lines.append(parsed)
+    return lines
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def track_run(load, files, mode, types):
+    def run():
+        for filepath in files:
+            load(filepath, mode, types)
+    return run
+
+
+def measure(run, repeat):
+    """(best CPU seconds, GC collections, peak traced bytes) for one run()."""
+    cpu = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        run()
+        cpu = min(cpu, time.process_time() - start)
+    before = sum(s["collections"] for s in gc.get_stats())
+    run()
+    collections = sum(s["collections"] for s in gc.get_stats()) - before
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return cpu, collections, peak
+
+
+def report(name, baseline, scanner):
+    (cpu0, gc0, peak0), (cpu1, gc1, peak1) = baseline, scanner
+    print(f"  {name:28s} cpu {cpu0:6.3f}s -> {cpu1:6.3f}s ({cpu1 / cpu0 - 1:+4.0%})  "
+          f"gc {gc0:>5} -> {gc1:>5}  peak {peak0 >> 10:>7,} -> {peak1 >> 10:>7,} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark byte-level log scanning")
+    parser.add_argument("files", nargs="+", help="NMEA log files (uncompressed)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (best is kept)")
+    parser.add_argument("--exclude", default="AIVDM,AIVDO",
+                        help="Sentence types for the exclude load filter case")
+    parser.add_argument("--only", default="GNRMC,IIMWV,IIHDG",
+                        help="Sentence types for the only load filter case")
+    args = parser.parse_args()
+
+    size = sum(os.path.getsize(f) for f in args.files)
+    print(f"{len(args.files)} files, {size / 1e6:.1f} MB; baseline -> current")
+
+    print("replay_server track load")
+    for label, mode, types in (("all", None, ""),
+                               (f"exclude {args.exclude}", "exclude", args.exclude),
+                               (f"only {args.only}", "only", args.only)):
+        types = frozenset(t.strip() for t in types.split(",") if t.strip())
+        report(label,
+               measure(track_run(baseline_track, args.files, mode, types), args.repeat),
+               measure(track_run(replay_server.read_track, args.files, mode, types), args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Benchmark the replay server's send path: pre-encoded wire bytes against
+encoding every line as it is sent.
+
+Plays a track through the engine's emit step and both sinks as fast as it
+will go, in batches of --batch due lines, next to a copy of the path it
+replaced (index the line, split, strip, add CRLF and encode, once per sink).
+The TCP server has one client that never reads, so its backlog keeps
+everything queued; UDP goes to a local socket. Reports CPU time per
+sentence (best of --repeat runs), memory blocks allocated and still held
+per sentence, GC collections and peak traced memory.
+
+Usage:
+    python3 bench_send.py tracks/2025-07-26.nmea
+    python3 bench_send.py --batch 1 --batch 50 --only GNRMC,IIMWV big.log
+"""
+
+import argparse
+import gc
+import socket
+import sys
+import time
+import tracemalloc
+
+import replay_server
+
+
+# ---------------------------------------------------------------------------
+# The per-line send path, for comparison
+# ---------------------------------------------------------------------------
+
+def encode(nmea_line):
+    parts = nmea_line.split(";", 2)
+    sentence = parts[2].strip() if len(parts) >= 3 else nmea_line
+    return (sentence + "\r\n").encode("ascii", errors="replace")
+
+
+class BaselineTCP(replay_server.TCPServer):
+    def send(self, nmea_line):
+        data = encode(nmea_line)
+        with self.lock:
+            if not self.clients:
+                return
+            end = self.total + len(data)
+            self.chunks.append(data)
+            self.ends.append(end)
+            self.counts.append(1)
+            self.times.append(time.monotonic())
+            self.total = end
+
+
+class BaselineUDP(replay_server.UDPBroadcaster):
+    def send(self, nmea_line):
+        try:
+            self.sock.sendto(encode(nmea_line), self.address)
+        except OSError:
+            pass
+
+
+def baseline_emit(engine, tcp, udp):
+    def emit(lines, start, end):
+        for i in range(start, end):
+            _, raw_line, stype = lines[i]
+            if engine._should_send(stype):
+                tcp.send(raw_line)
+                udp.send(raw_line)
+    return emit
+
+
+def wire_emit(engine, tcp, udp):
+    def emit(lines, start, end):
+        runs = engine._runs(lines, start, end)
+        if runs:
+            tcp.send(lines, runs)
+            udp.send(lines, runs)
+    return emit
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def play(make_emit, lines, batch, mode, types, port):
+    """A run() playing every line once; it returns the sentences sent."""
+    def run():
+        engine = replay_server.PlaybackEngine()
+        if mode:
+            engine.set_filter(mode, types)
+        tcp = (BaselineTCP if make_emit is baseline_emit else replay_server.TCPServer)(0)
+        tcp.clients.append(None)    # a client that never reads
+        udp = (BaselineUDP if make_emit is baseline_emit else replay_server.UDPBroadcaster)(
+            port, "127.0.0.1")
+        emit = make_emit(engine, tcp, udp)
+        for start in range(0, len(lines), batch):
+            emit(lines, start, min(start + batch, len(lines)))
+        udp.sock.close()
+        return sum(tcp.counts), tcp
+    return run
+
+
+def measure(run, repeat):
+    """(best CPU seconds, blocks held, GC collections, peak traced bytes, sentences)."""
+    cpu = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        run()
+        cpu = min(cpu, time.process_time() - start)
+    gc.collect()
+    before = sys.getallocatedblocks()
+    collections = sum(s["collections"] for s in gc.get_stats())
+    sent, kept = run()
+    collections = sum(s["collections"] for s in gc.get_stats()) - collections
+    blocks = sys.getallocatedblocks() - before
+    del kept
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return cpu, blocks, collections, peak, sent
+
+
+def report(name, baseline, wire):
+    (cpu0, blocks0, gc0, peak0, n), (cpu1, blocks1, gc1, peak1, n1) = baseline, wire
+    assert n == n1, (n, n1)
+    print(f"  {name:28s} {n:>8,} sent  cpu {cpu0 / n * 1e6:5.2f} -> {cpu1 / n * 1e6:5.2f} us  "
+          f"blocks {blocks0 / n:5.2f} -> {blocks1 / n:5.2f}  gc {gc0:>4} -> {gc1:>4}  "
+          f"peak {peak0 >> 10:>7,} -> {peak1 >> 10:>7,} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the replay send path")
+    parser.add_argument("file", help="NMEA track file")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (best is kept)")
+    parser.add_argument("--batch", type=int, action="append",
+                        help="Lines due per wake-up (repeatable; default 1, 10, 100)")
+    parser.add_argument("--exclude", default="AIVDM,AIVDO",
+                        help="Sentence types for the exclude filter case")
+    parser.add_argument("--only", default="GNRMC,IIMWV,IIHDG",
+                        help="Sentence types for the only filter case")
+    args = parser.parse_args()
+
+    lines = replay_server.read_indexed_track(args.file)
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))     # UDP goes here and is never read
+    port = sink.getsockname()[1]
+    print(f"{args.file}: {len(lines):,} lines; per-line encoding -> wire bytes, per sentence sent")
+
+    for batch in args.batch or (1, 10, 100):
+        print(f"{batch} lines per wake-up")
+        for label, mode, types in (("all", None, ""),
+                                   (f"exclude {args.exclude}", "exclude", args.exclude),
+                                   (f"only {args.only}", "only", args.only)):
+            types = [t.strip() for t in types.split(",") if t.strip()]
+            report(label,
+                   measure(play(baseline_emit, lines, batch, mode, types, port), args.repeat),
+                   measure(play(wire_emit, lines, batch, mode, types, port), args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,9 +15,15 @@ Options:
     --autoplay         Start playback immediately after loading
     --exclude TYPES    Comma-separated sentence types to exclude
     --only TYPES       Comma-separated sentence types to include (exclusive)
+    --load-exclude TYPES  Sentence types to leave out of loaded tracks entirely
+    --load-only TYPES     Sentence types to load, leaving out all others
+    --track-cache N    Loaded tracks kept for instant re-loading (default: 4)
+    --slow-client P    TCP client over --tcp-max-queue behind: drop-oldest (default),
+                       disconnect, or backpressure (playback waits for it)
+    --tcp-max-queue N  Bytes a TCP client may fall behind (default: 262144)
 
 HTTP Control API:
-    GET  /status          Current state (track, position, speed, playing)
+    GET  /status          Current state (track, position, speed, playing, TCP client lag)
     GET  /tracks          List available tracks from manifest
     POST /load?track=DATE Load a track by date
     POST /play            Start / resume playback
@@ -33,31 +39,409 @@ HTTP Control API:
 """
 
 import argparse
+import bisect
+import collections
+import functools
+import gzip
+import itertools
 import json
+import mmap
+import operator
 import os
+import re
+import selectors
 import socket
+import struct
 import sys
 import threading
 import time
+from array import array
 from datetime import datetime
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 # ---------------------------------------------------------------------------
 # Track loader
 # ---------------------------------------------------------------------------
 
+COMPRESSED_EXTENSIONS = (".gz", ".zst")
+
+# Bytes of a track checked for lone CRs at a time in scan_track
+SCAN_BLOCK_BYTES = 1 << 16
+
+
+def find_track_file(filepath):
+    """The track file, or a compressed copy of it (FILE.gz / FILE.zst) if only that exists."""
+    if os.path.exists(filepath):
+        return filepath
+    for ext in COMPRESSED_EXTENSIONS:
+        if os.path.exists(filepath + ext):
+            return filepath + ext
+    return filepath
+
+
+def read_track_bytes(filepath):
+    """A compressed (.gz/.zst) track's contents, decompressed, as bytes."""
+    if filepath.endswith(".gz"):
+        with gzip.open(filepath, "rb") as f:
+            return f.read()
+    if zstandard is None:
+        raise ValueError("zstandard not installed: pip install zstandard")
+    with open(filepath, "rb") as raw:
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        return reader.read()
+
+
+def parse_track_line(line, mode=None, types=frozenset()):
+    """Parse one track line into (ts_ms, raw_line, sentence_type).
+
+    Returns None for blank or malformed lines, and for lines whose sentence
+    type the load filter (mode, types) leaves out.
+    """
+    raw = line.strip()
+    if not raw:
+        return None
+    parts = raw.split(";", 2)
+    if len(parts) < 3:
+        return None
+    try:
+        ts_ms = int(parts[0])
+    except ValueError:
+        return None
+    sentence = parts[2].strip()
+    # Extract sentence type
+    stype = None
+    if sentence and sentence[0] in ("$", "!"):
+        tag = sentence[1:].split(",")[0].split("*")[0]
+        stype = tag
+    if mode == "exclude" and stype in types or mode == "only" and stype not in types:
+        return None
+    return ts_ms, raw, stype
+
+
+_LONE_CR = re.compile(rb"\r(?!\n)")
+
+
+@functools.lru_cache(maxsize=None)
+def _line_pattern(mode, types):
+    """Matches track lines from the newline before each, in one of three ways.
+
+    A plain "ts;X;$TYPE,..." line that the load filter (mode, types) keeps
+    fills the (raw, ts, type) groups, raw without its line ending. One whose
+    TYPE it leaves out doesn't match, so the regex engine passes over it
+    without anything being decoded or returned. Any other line comes back
+    whole in the last group, for parse_track_line.
+    """
+    alternatives = b"|".join(re.escape(t.encode()) for t in sorted(types)) or b"(?!)"
+    listed = b"(?:" + alternatives + b")"
+    unlisted = b"(?!" + listed + b"[,*])[0-9A-Za-z]*"
+    kept, dropped = {None: (b"[0-9A-Za-z]*", None),
+                     "exclude": (unlisted, listed),
+                     "only": (listed, unlisted)}[mode]
+    plain = rb"(([0-9]+);[^;\n]*;[$!](" + kept + rb")[,*][^\r\n]*)\r?(?=\n|\Z)"
+    other = rb"([^\n]*)"
+    if dropped is not None:
+        other = rb"(?![0-9]+;[^;\n]*;[$!]" + dropped + rb"[,*])" + other
+    return re.compile(rb"\n(?:" + plain + b"|" + other + b")")
+
+
+class TrackLines:
+    """A track's kept lines, stored by column.
+
+    Indexing gives (ts_ms, raw_line, sentence_type) as a tuple list would,
+    but only the track's bytes (an mmap of the file, or the decompressed
+    contents of a .gz/.zst) and four arrays are held: per line its
+    timestamp, byte span and an interned sentence type code, 22 bytes in
+    all. raw_line is decoded from the span when a line is indexed. `ts` is
+    sorted for a recorded track, so seeking is a bisect over it.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.ts = array("q")
+        self.starts = array("q")
+        self.lengths = array("I")
+        self.codes = array("H")
+        self.types = []             # code -> sentence type (str or None)
+        self.type_codes = {}        # sentence type, as str or bytes -> code
+        # Sentences as sent (see encode_wire), back to back in a memoryview,
+        # and where each starts plus a final end offset. Built by add_wire or
+        # a track index; the sinks send slices of it.
+        self.wire = None
+        self.wire_offsets = None
+        self.index = None           # the mmap of a sidecar index the columns view
+
+    def append(self, ts_ms, start, end, stype):
+        """Add the line at data[start:end]; stype may be given as bytes."""
+        code = self.type_codes.get(stype)
+        if code is None:
+            name = stype.decode() if isinstance(stype, bytes) else stype
+            code = self.type_codes.get(name)
+            if code is None:
+                code = len(self.types)
+                self.types.append(name)
+                self.type_codes[name] = code
+            self.type_codes[stype] = code
+        self.ts.append(ts_ms)
+        self.starts.append(start)
+        self.lengths.append(end - start)
+        self.codes.append(code)
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, i):
+        start = self.starts[i]
+        raw = self.data[start:start + self.lengths[i]].decode("utf-8", errors="replace")
+        return self.ts[i], raw.strip(), self.types[self.codes[i]]
+
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
+
+    def nbytes(self):
+        """Memory held by the columns (the track bytes not included)."""
+        return sum(a.itemsize * len(a) for a in (self.ts, self.starts, self.lengths, self.codes))
+
+    def add_wire(self):
+        """Encode every line for sending, into wire and wire_offsets."""
+        pieces = [encode_wire(line[1]) for line in self]
+        self.wire_offsets = array("q", [0])
+        total = 0
+        for piece in pieces:
+            total += len(piece)
+            self.wire_offsets.append(total)
+        self.wire = memoryview(b"".join(pieces))
+
+    def wire_span(self, start, end):
+        """Lines start..end-1 as sent, a memoryview into wire."""
+        return self.wire[self.wire_offsets[start]:self.wire_offsets[end]]
+
+    def select(self, mode, types):
+        """The lines the load filter (mode, types) keeps, sharing this track's bytes."""
+        if mode is None:
+            return self
+        keep = [(name in types) == (mode == "only") for name in self.types]
+        mask = list(map(keep.__getitem__, self.codes))
+        lines = TrackLines(self.data)
+        lines.types = self.types
+        lines.type_codes = dict(self.type_codes)
+        lines.ts = array("q", itertools.compress(self.ts, mask))
+        lines.starts = array("q", itertools.compress(self.starts, mask))
+        lines.lengths = array("I", itertools.compress(self.lengths, mask))
+        lines.codes = array("H", itertools.compress(self.codes, mask))
+        if self.wire is not None:
+            wire, offsets = self.wire, self.wire_offsets
+            # Copied a run of kept lines at a time
+            pieces = []
+            start = 0
+            for kept, run in itertools.groupby(mask):
+                end = start + len(list(run))
+                if kept:
+                    pieces.append(wire[offsets[start]:offsets[end]])
+                start = end
+            lines.wire = memoryview(b"".join(pieces))
+            sizes = itertools.compress(map(operator.sub, offsets[1:], offsets), mask)
+            lines.wire_offsets = array("q", [0])
+            lines.wire_offsets.extend(itertools.accumulate(sizes))
+        return lines
+
+
+def encode_wire(raw_line):
+    """A track line as sent over TCP/UDP: the sentence after "ts;source;", with CRLF."""
+    parts = raw_line.split(";", 2)
+    sentence = parts[2].strip() if len(parts) >= 3 else raw_line
+    return (sentence + "\r\n").encode("ascii", errors="replace")
+
+
+_LINE_END = re.compile(rb"\r\n|\r|\n")
+
+
+def _scan_text(data, start, end, mode, types, lines):
+    """parse_track_line over data[start:end], split at line ends as text mode would."""
+    for match in _LINE_END.finditer(data, start, end):
+        _scan_line(data, start, match.start(), mode, types, lines)
+        start = match.end()
+    _scan_line(data, start, end, mode, types, lines)
+
+
+def _scan_line(data, start, end, mode, types, lines):
+    if end > start:
+        parsed = parse_track_line(data[start:end].decode("utf-8", errors="replace"),
+                                  mode, types)
+        if parsed is not None:
+            lines.append(parsed[0], start, end, parsed[2])
+
+
+def scan_track(data, mode=None, types=frozenset()):
+    """Index track contents into TrackLines.
+
+    `data` is bytes or an mmap, and is kept by the result. Lines are found
+    and split on the bytes by _line_pattern, so nothing is decoded while
+    loading, and lines that the load filter (mode "exclude" or "only", as
+    for PlaybackEngine.set_filter) leaves out cost no more than the regex's
+    pass over them. Lines end at \\n, \\r\\n or a lone \\r and are decoded as
+    UTF-8 with errors replaced, as in text mode.
+    """
+    lines = TrackLines(data)
+    newline = data.find(b"\n")
+    if newline < 0:
+        newline = len(data)
+    _scan_text(data, 0, newline, mode, types, lines)
+    finditer = _line_pattern(mode, frozenset(types)).finditer
+    append = lines.append
+    # The common case inline: a plain line of an already-seen type
+    type_codes = lines.type_codes
+    ts_append, starts_append = lines.ts.append, lines.starts.append
+    lengths_append, codes_append = lines.lengths.append, lines.codes.append
+    while newline < len(data):
+        end = data.find(b"\n", newline + SCAN_BLOCK_BYTES)
+        if end < 0:
+            end = len(data)
+        if _LONE_CR.search(data, newline, end + 1):
+            # The pattern only splits at \\n
+            _scan_text(data, newline + 1, end, mode, types, lines)
+            newline = end
+            continue
+        for match in finditer(data, newline, end):
+            raw_start, raw_end = match.span(1)
+            if raw_start >= 0:
+                ts, stype = match.group(2, 3)
+                code = type_codes.get(stype)
+                if code is None:
+                    append(int(ts), raw_start, raw_end, stype)
+                else:
+                    ts_append(int(ts))
+                    starts_append(raw_start)
+                    lengths_append(raw_end - raw_start)
+                    codes_append(code)
+            else:
+                _scan_line(data, match.start(4), match.end(4), mode, types, lines)
+        newline = end
+    return lines
+
+
+def read_track(filepath, mode=None, types=frozenset()):
+    """Index a track file with scan_track, mmapping it unless it's compressed."""
+    if filepath.endswith(COMPRESSED_EXTENSIONS):
+        return scan_track(read_track_bytes(filepath), mode, types)
+    with open(filepath, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return scan_track(b"", mode, types)
+        # The map outlives the file object, and lives as long as the track
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return scan_track(data, mode, types)
+
+
+# Sidecar index: FILE + INDEX_SUFFIX holds a track's TrackLines columns and
+# wire bytes, unfiltered, and is rebuilt when FILE's size or mtime changes.
+# Header, then a JSON list of sentence types, then ts, starts, wire_offsets,
+# lengths and codes as native-order arrays (each 8-byte aligned) and the wire
+# bytes. Loading one is an mmap: the columns are views into it.
+INDEX_SUFFIX = ".replay-idx"
+INDEX_MAGIC = b"NMEAIDX1"
+INDEX_HEADER = struct.Struct("<8s8sqqqq")   # magic, byte order, mtime_ns, size, lines, types bytes
+
+
+def _padded(n):
+    return (n + 7) & ~7
+
+
+def write_track_index(path, st, lines):
+    """Write lines (with wire bytes) as the index of a track file with stat st."""
+    types = json.dumps(lines.types).encode()
+    header = INDEX_HEADER.pack(INDEX_MAGIC, sys.byteorder.encode(), st.st_mtime_ns,
+                               st.st_size, len(lines), len(types))
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        for blob in (header, types, lines.ts, lines.starts, lines.wire_offsets,
+                     lines.lengths, lines.codes):
+            blob = memoryview(blob).cast("B")
+            f.write(blob)
+            f.write(b"\0" * (_padded(len(blob)) - len(blob)))
+        f.write(lines.wire)
+    os.replace(tmp, path)
+
+
+def read_track_index(path, st, data):
+    """The TrackLines in the index at path over track bytes `data`, or None if
+    the index is missing or was built from a different version of the track."""
+    try:
+        with open(path, "rb") as f:
+            index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, order, mtime_ns, size, n, types_len = INDEX_HEADER.unpack_from(index)
+    except struct.error:
+        return None
+    if (magic, order.rstrip(b"\0"), mtime_ns, size) != \
+            (INDEX_MAGIC, sys.byteorder.encode(), st.st_mtime_ns, st.st_size):
+        return None
+    view = memoryview(index)
+    pos = INDEX_HEADER.size
+    lines = TrackLines(data)
+    lines.types = json.loads(bytes(view[pos:pos + types_len]))
+    lines.type_codes = {name: code for code, name in enumerate(lines.types)}
+    pos += _padded(types_len)
+    for name, fmt, count in (("ts", "q", n), ("starts", "q", n), ("wire_offsets", "q", n + 1),
+                             ("lengths", "I", n), ("codes", "H", n)):
+        nbytes = count * array(fmt).itemsize
+        setattr(lines, name, view[pos:pos + nbytes].cast(fmt))
+        pos += _padded(nbytes)
+    lines.wire = view[pos:]
+    lines.index = index     # keeps the map open as long as the views
+    return lines
+
+
+def read_indexed_track(filepath):
+    """All of a track file's lines, with wire bytes, via its sidecar index.
+
+    The index is built on first load (or when the file has changed) and
+    written next to the file; if that directory is read-only the track is
+    simply indexed again on the next load.
+    """
+    st = os.stat(filepath)
+    if filepath.endswith(COMPRESSED_EXTENSIONS):
+        data = read_track_bytes(filepath)
+    elif st.st_size == 0:
+        data = b""
+    else:
+        with open(filepath, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    index_path = filepath + INDEX_SUFFIX
+    lines = read_track_index(index_path, st, data)
+    if lines is None:
+        lines = scan_track(data)
+        lines.add_wire()
+        try:
+            write_track_index(index_path, st, lines)
+        except OSError as e:
+            print(f"  WARNING: could not write track index {index_path}: {e}")
+    return lines
+
+
 class Track:
-    """A loaded NMEA track — parsed into (timestamp_ms, raw_line, sentence_type) tuples."""
+    """A loaded NMEA track — its lines as (timestamp_ms, raw_line, sentence_type).
+
+    The lines are a TrackLines over an mmap of the file, read through the
+    file's sidecar index (see read_indexed_track). The track file may be
+    stored compressed as FILE.gz or FILE.zst. A load filter (mode, types)
+    leaves the sentence types it filters out of the track altogether.
+    """
 
     def __init__(self, meta, lines):
         self.meta = meta
-        self.lines = lines  # list of (ts_ms, raw_line, sentence_type)
-        self.duration_ms = lines[-1][0] - lines[0][0] if lines else 0
+        self.lines = lines  # TrackLines
+        self.duration_ms = lines.ts[-1] - lines.ts[0] if len(lines) else 0
 
     @classmethod
-    def load(cls, tracks_dir, date_str, manifest):
+    def load(cls, tracks_dir, date_str, manifest, mode=None, types=frozenset()):
         track_meta = None
         for t in manifest.get("tracks", []):
             if t["date"] == date_str:
@@ -66,35 +450,49 @@ class Track:
         if not track_meta:
             raise ValueError(f"Track {date_str} not found in manifest")
 
-        filepath = os.path.join(tracks_dir, track_meta["file"])
-        lines = []
-        with open(filepath, "r", errors="replace") as f:
-            for raw in f:
-                raw = raw.strip()
-                if not raw:
-                    continue
-                parts = raw.split(";", 2)
-                if len(parts) < 3:
-                    continue
-                try:
-                    ts_ms = int(parts[0])
-                except ValueError:
-                    continue
-                sentence = parts[2].strip()
-                # Extract sentence type
-                stype = None
-                if sentence and sentence[0] in ("$", "!"):
-                    tag = sentence[1:].split(",")[0].split("*")[0]
-                    stype = tag
-                lines.append((ts_ms, raw, stype))
+        filepath = find_track_file(os.path.join(tracks_dir, track_meta["file"]))
+        return cls(track_meta, read_indexed_track(filepath).select(mode, types))
+
+
+class TrackCache:
+    """The most recently loaded tracks, so switching between them is instant.
+
+    Keyed by file and load filter; an entry is dropped when its file's size
+    or mtime changes.
+    """
+
+    def __init__(self, size=4):
+        self.size = size
+        self.tracks = collections.OrderedDict()  # (date, mode, types) -> (stat key, Track)
 
-        return cls(track_meta, lines)
+    def load(self, tracks_dir, date_str, manifest, mode=None, types=frozenset()):
+        key = (date_str, mode, frozenset(types))
+        stat_key = None
+        for t in manifest.get("tracks", []):
+            if t["date"] == date_str:
+                st = os.stat(find_track_file(os.path.join(tracks_dir, t["file"])))
+                stat_key = (st.st_size, st.st_mtime_ns)
+                break
+        cached = self.tracks.pop(key, None)
+        if cached is not None and cached[0] == stat_key:
+            track = cached[1]
+        else:
+            track = Track.load(tracks_dir, date_str, manifest, mode, types)
+        if self.size > 0:
+            self.tracks[key] = (stat_key, track)
+            while len(self.tracks) > self.size:
+                self.tracks.popitem(last=False)
+        return track
 
 
 # ---------------------------------------------------------------------------
 # Playback engine
 # ---------------------------------------------------------------------------
 
+# Longest wait between two lines, in real seconds, whatever the track gap
+MAX_GAP_S = 2.0
+
+
 class PlaybackEngine:
     """Manages playback state: position, speed, pause, seeking."""
 
@@ -105,19 +503,24 @@ class PlaybackEngine:
         self.playing = False
         self.loop = True
         self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)   # wakes playback early
+        self.run = 0               # bumped by play() so a stale loop exits
 
         # Sentence filter
         self.filter_mode = None    # None, "exclude", "only"
         self.filter_types = set()
 
+        self.keep = None           # (types, keep flag per type code) for the filter
+
         # Callbacks
-        self.on_sentence = None    # called with (raw_line, sentence_type)
+        self.on_lines = None       # called with (track lines, [(start, end), ...])
 
     def load_track(self, track):
         with self.lock:
             self.playing = False
             self.track = track
             self.position = 0
+            self.changed.notify_all()
 
     def play(self):
         with self.lock:
@@ -125,16 +528,20 @@ class PlaybackEngine:
                 return False
             if not self.playing:
                 self.playing = True
-                threading.Thread(target=self._playback_loop, daemon=True).start()
+                self.run += 1
+                threading.Thread(target=self._playback_loop, args=(self.run,),
+                                 daemon=True).start()
             return True
 
     def pause(self):
         with self.lock:
             self.playing = False
+            self.changed.notify_all()
 
     def set_speed(self, x):
         with self.lock:
             self.speed = max(0.1, min(100.0, x))
+            self.changed.notify_all()
 
     def seek_pct(self, pct):
         with self.lock:
@@ -142,6 +549,7 @@ class PlaybackEngine:
                 return
             idx = int((pct / 100.0) * len(self.track.lines))
             self.position = max(0, min(idx, len(self.track.lines) - 1))
+            self.changed.notify_all()
 
     def seek_utc(self, utc_str):
         """Seek to a UTC timestamp like '2025-07-26T13:10:00'."""
@@ -159,25 +567,21 @@ class PlaybackEngine:
             else:
                 return
             target_ms = int(dt.timestamp() * 1000)
-            # Binary search
-            lo, hi = 0, len(self.track.lines) - 1
-            while lo < hi:
-                mid = (lo + hi) // 2
-                if self.track.lines[mid][0] < target_ms:
-                    lo = mid + 1
-                else:
-                    hi = mid
-            self.position = lo
+            ts = self.track.lines.ts
+            self.position = max(min(bisect.bisect_left(ts, target_ms), len(ts) - 1), 0)
+            self.changed.notify_all()
 
     def set_filter(self, mode, types):
         with self.lock:
             self.filter_mode = mode
             self.filter_types = set(types) if types else set()
+            self.keep = None
 
     def clear_filter(self):
         with self.lock:
             self.filter_mode = None
             self.filter_types = set()
+            self.keep = None
 
     def get_status(self):
         with self.lock:
@@ -191,11 +595,14 @@ class PlaybackEngine:
                 }
             lines = self.track.lines
             pos = self.position
-            pct = (pos / len(lines) * 100) if lines else 0
-            current_ts = lines[pos][0] if pos < len(lines) else lines[-1][0]
-            current_utc = datetime.utcfromtimestamp(current_ts / 1000).strftime(
-                "%Y-%m-%dT%H:%M:%S"
-            )
+            pct = (pos / len(lines) * 100) if len(lines) else 0
+            # A load filter can leave a track with no lines: no current time then
+            current_ts = current_utc = None
+            if len(lines):
+                current_ts = lines.ts[pos] if pos < len(lines) else lines.ts[-1]
+                current_utc = datetime.utcfromtimestamp(current_ts / 1000).strftime(
+                    "%Y-%m-%dT%H:%M:%S"
+                )
             return {
                 "loaded": True,
                 "track": self.track.meta.get("date", ""),
@@ -218,121 +625,369 @@ class PlaybackEngine:
             return stype in self.filter_types
         return True
 
-    def _playback_loop(self):
+    def _runs(self, lines, start, end):
+        """Lines start..end-1 that pass the filter, as (start, end) runs."""
+        if self.filter_mode is None:
+            return [(start, end)]
+        if self.keep is None or self.keep[0] is not lines.types:
+            self.keep = (lines.types, [self._should_send(t) for t in lines.types])
+        keep = self.keep[1]
+        codes = lines.codes
+        if end - start == 1:
+            return [(start, end)] if keep[codes[start]] else []
+        runs = []
+        run_start = None
+        for i in range(start, end):
+            if keep[codes[i]]:
+                if run_start is None:
+                    run_start = i
+            elif run_start is not None:
+                runs.append((run_start, i))
+                run_start = None
+        if run_start is not None:
+            runs.append((run_start, end))
+        return runs
+
+    def _playback_loop(self, run):
+        """Send each line when its deadline on the monotonic clock comes round.
+
+        Deadlines are anchor_wall + (ts - anchor_ts) / speed, so sleep overshoot
+        and send time don't add up over the track; every line due at a wake-up
+        goes out together, handed to on_lines as runs of lines that pass the
+        filter so the sinks can send each run's wire bytes in one go. The
+        anchor moves on a seek, speed change, new track or loop, and to close
+        gaps longer than MAX_GAP_S of real time.
+        """
+        anchor = None       # (wall, ts_ms, speed, track, next position)
         while True:
             with self.lock:
-                if not self.playing or not self.track:
-                    return
-                if self.position >= len(self.track.lines):
-                    if self.loop:
-                        self.position = 0
-                        continue
-                    self.playing = False
+                if not self.playing or not self.track or self.run != run:
                     return
+                lines = self.track.lines
+                ts = lines.ts
+                if self.position >= len(lines):
+                    if not self.loop or not len(lines):
+                        self.playing = False
+                        return
+                    self.position = 0
                 pos = self.position
                 speed = self.speed
+                now = time.monotonic()
+                if anchor is None or anchor[3] is not self.track or anchor[4] != pos:
+                    anchor = (now, ts[pos], speed, self.track, pos)
+                elif anchor[2] != speed:
+                    # Carry on from the track time reached at the old speed
+                    wall, ts_ms, old_speed = anchor[:3]
+                    ts_ms = min(ts_ms + (now - wall) * old_speed * 1000, ts[pos])
+                    anchor = (now, ts_ms, speed, self.track, pos)
+                wall, ts_ms = anchor[:2]
+
+                due_ms = ts_ms + (now - wall) * speed * 1000
+                end = bisect.bisect_right(ts, due_ms, pos)
+                if end == pos:
+                    self.changed.wait((ts[pos] - due_ms) / 1000 / speed)
+                    continue
+                self.position = end
+                if end < len(ts) and (ts[end] - ts[end - 1]) / 1000 / speed > MAX_GAP_S:
+                    # Long gap: the next line goes MAX_GAP_S after the last one
+                    last = wall + (ts[end - 1] - ts_ms) / 1000 / speed
+                    anchor = (max(last, now) + MAX_GAP_S, ts[end], speed, self.track, end)
+                else:
+                    anchor = anchor[:4] + (end,)
+                runs = self._runs(lines, pos, end)
 
-            ts_ms, raw_line, stype = self.track.lines[pos]
-
-            # Send if passes filter
-            if self._should_send(stype) and self.on_sentence:
-                self.on_sentence(raw_line, stype)
-
-            # Advance position
-            with self.lock:
-                self.position = pos + 1
-                if self.position >= len(self.track.lines):
-                    if self.loop:
-                        self.position = 0
-                        continue
-                    self.playing = False
-                    return
-                next_ts = self.track.lines[self.position][0]
-
-            # Sleep for inter-sentence delay
-            delta_ms = next_ts - ts_ms
-            if delta_ms > 0 and speed > 0:
-                sleep_s = (delta_ms / 1000.0) / speed
-                # Cap max sleep to 2 seconds (real-time) to avoid huge gaps
-                sleep_s = min(sleep_s, 2.0)
-                if sleep_s > 0.0001:
-                    time.sleep(sleep_s)
+            if runs and self.on_lines:
+                self.on_lines(lines, runs)
 
 
 # ---------------------------------------------------------------------------
 # TCP Server
 # ---------------------------------------------------------------------------
 
-class TCPServer:
-    """Simple TCP server that accepts multiple clients and broadcasts lines."""
+SLOW_CLIENT_POLICIES = ("drop-oldest", "disconnect", "backpressure")
 
-    def __init__(self, port, nodelay=False):
+# Most bytes handed to one sendmsg call
+TCP_SEND_BYTES = 64 << 10
+
+# Runs queued back to back are merged into one backlog chunk up to this size
+TCP_CHUNK_BYTES = 16 << 10
+
+
+class _TCPClient:
+    def __init__(self, sock, addr, pos):
+        self.sock = sock
+        self.addr = addr
+        self.pos = pos              # backlog byte position sent up to
+        self.head = None            # rest of a run drop-oldest skipped past, sent first
+        self.dropped = 0            # sentences skipped by drop-oldest
+        self.writing = False        # registered for EVENT_WRITE
+
+
+class TCPServer:
+    """TCP server that fans NMEA lines out to many clients without blocking playback.
+
+    send() appends each run of lines once to a shared backlog, as a view of
+    the track's wire bytes (a run that carries straight on from the last one
+    widens it instead), and returns; one selector thread writes the backlog
+    to every client from that client's own position, several chunks per
+    non-blocking sendmsg. A client more than max_queue bytes behind is
+    handled by `policy`: "drop-oldest" skips it ahead past its oldest lines,
+    "disconnect" closes it, and "backpressure" makes send() wait (so
+    playback slows) until it has caught up. status() reports each client's lag.
+    """
+
+    def __init__(self, port, nodelay=False, max_queue=256 << 10, policy="drop-oldest"):
         self.port = port
         self.nodelay = nodelay
+        self.max_queue = max_queue
+        self.policy = policy
         self.clients = []
         self.lock = threading.Lock()
+        self.caught_up = threading.Condition(self.lock)
         self.server_socket = None
+        self.selector = selectors.DefaultSelector()
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_pending = False
+        # Backlog of runs not yet sent to every client. Positions are byte
+        # counts since the server started; ends[i] is where chunks[i] ends.
+        self.chunks = []
+        self.ends = []
+        self.counts = []            # lines in each chunk
+        self.times = []             # time.monotonic() each chunk was first queued
+        self.tail = None            # (wire, start, end) the last chunk is a view of
+        self.total = 0              # position after the last line queued
+        self.slowest = 0            # position of the client furthest behind
 
     def start(self):
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.bind(("0.0.0.0", self.port))
-        self.server_socket.listen(5)
-        threading.Thread(target=self._accept_loop, daemon=True).start()
+        self.server_socket.listen(128)
+        self.server_socket.setblocking(False)
+        self.wake_r.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+        self.selector.register(self.wake_r, selectors.EVENT_READ)
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def send(self, lines, runs):
+        """Queue runs of track lines, as (start, end) indexes, for all TCP clients."""
+        with self.lock:
+            if not self.clients:
+                return
+            if self.policy == "backpressure":
+                while self.clients and self.total - self.slowest > self.max_queue:
+                    self.caught_up.wait(0.5)
+            now = time.monotonic()
+            wire, offsets = lines.wire, lines.wire_offsets
+            for start, end in runs:
+                first, last = offsets[start], offsets[end]
+                tail = self.tail
+                if (self.chunks and tail[0] is wire and tail[2] == first
+                        and last - tail[1] <= TCP_CHUNK_BYTES):
+                    self.tail = (wire, tail[1], last)
+                    self.chunks[-1] = wire[tail[1]:last]
+                    self.ends[-1] += last - first
+                    self.counts[-1] += end - start
+                else:
+                    self.tail = (wire, first, last)
+                    self.chunks.append(wire[first:last])
+                    self.ends.append(self.total + last - first)
+                    self.counts.append(end - start)
+                    self.times.append(now)
+                self.total += last - first
+            wake = not self.wake_pending
+            self.wake_pending = True
+        if wake:
+            self.wake_w.send(b"\0")
+
+    def status(self):
+        """Per-client backlog: bytes and lines queued, lag in ms, lines dropped."""
+        now = time.monotonic()
+        with self.lock:
+            out = []
+            for c in self.clients:
+                i = bisect.bisect_right(self.ends, c.pos)
+                out.append({
+                    "addr": f"{c.addr[0]}:{c.addr[1]}",
+                    "queued_bytes": self.total - c.pos + (len(c.head) if c.head else 0),
+                    "queued_lines": sum(self.counts[i:]),
+                    "lag_ms": round((now - self.times[i]) * 1000) if i < len(self.times) else 0,
+                    "dropped": c.dropped,
+                })
+            return out
 
-    def _accept_loop(self):
+    def _loop(self):
+        while True:
+            for key, _ in self.selector.select(timeout=1.0):
+                sock = key.fileobj
+                if sock is self.server_socket:
+                    self._accept()
+                elif sock is self.wake_r:
+                    try:
+                        while sock.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    with self.lock:
+                        self.wake_pending = False
+                elif key.data is not None:
+                    # Readable: a client talking to us, or hanging up
+                    try:
+                        if not sock.recv(4096):
+                            self._drop(key.data, "disconnected")
+                    except BlockingIOError:
+                        pass
+                    except OSError:
+                        self._drop(key.data, "disconnected")
+            self._flush()
+
+    def _accept(self):
         while True:
             try:
                 client, addr = self.server_socket.accept()
-                if self.nodelay:
-                    client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-                with self.lock:
-                    self.clients.append(client)
-                print(f"  TCP client connected: {addr}")
-            except OSError:
-                break
-
-    def send(self, nmea_line):
-        """Send an NMEA line to all connected TCP clients."""
-        # Extract just the NMEA sentence (after timestamp;source;)
-        parts = nmea_line.split(";", 2)
-        sentence = parts[2].strip() if len(parts) >= 3 else nmea_line
-        data = (sentence + "\r\n").encode("ascii", errors="replace")
+            except (BlockingIOError, OSError):
+                return
+            client.setblocking(False)
+            if self.nodelay:
+                client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self.lock:
+                # New clients start from the next line queued
+                c = _TCPClient(client, addr, self.total)
+                self.clients.append(c)
+            self.selector.register(client, selectors.EVENT_READ, c)
+            print(f"  TCP client connected: {addr}")
 
+    def _drop(self, c, reason):
         with self.lock:
-            dead = []
-            for c in self.clients:
-                try:
-                    c.sendall(data)
-                except (BrokenPipeError, ConnectionResetError, OSError):
-                    dead.append(c)
-            for c in dead:
-                self.clients.remove(c)
+            if c not in self.clients:
+                return
+            self.clients.remove(c)
+            self.caught_up.notify_all()
+        self.selector.unregister(c.sock)
+        try:
+            c.sock.close()
+        except OSError:
+            pass
+        print(f"  TCP client {reason}: {c.addr} ({c.dropped} lines dropped)")
+
+    def _flush(self):
+        """Write each client's backlog as far as its socket takes it, then trim."""
+        for c in list(self.clients):
+            while True:
+                with self.lock:
+                    buffers = self._pending(c)
+                if buffers is None:
+                    self._drop(c, f"too slow ({self.total - c.pos} bytes behind)")
+                    break
+                if not buffers:
+                    break
                 try:
-                    c.close()
+                    sent = c.sock.sendmsg(buffers)
+                except BlockingIOError:
+                    break
                 except OSError:
-                    pass
+                    self._drop(c, "disconnected")
+                    break
+                if c.head is not None:
+                    if sent < len(c.head):
+                        c.head = c.head[sent:]
+                        continue
+                    sent -= len(c.head)
+                    c.head = None
+                c.pos += sent
+            if c not in self.clients:
+                continue
+            behind = c.head is not None or c.pos < self.total
+            if behind != c.writing:
+                c.writing = behind
+                events = selectors.EVENT_READ | (selectors.EVENT_WRITE if behind else 0)
+                self.selector.modify(c.sock, events, c)
+
+        with self.lock:
+            self.slowest = min((c.pos for c in self.clients), default=self.total)
+            done = bisect.bisect_right(self.ends, self.slowest)
+            if done:
+                del self.chunks[:done], self.ends[:done], self.counts[:done], self.times[:done]
+            self.caught_up.notify_all()
+
+    def _pending(self, c):
+        """The buffers to write to c next (with the lock held), or None if the
+        disconnect policy says it is too far behind."""
+        if self.total - c.pos > self.max_queue:
+            if self.policy == "disconnect":
+                return None
+            if self.policy == "drop-oldest":
+                self._skip(c)
+        buffers = [c.head] if c.head is not None else []
+        size = len(c.head) if c.head is not None else 0
+        if c.pos < self.total:
+            i = bisect.bisect_right(self.ends, c.pos)
+            offset = c.pos - (self.ends[i] - len(self.chunks[i]))
+            buffers.append(self.chunks[i][offset:])
+            size += len(buffers[-1])
+            for chunk in self.chunks[i + 1:i + 1024]:
+                if size >= TCP_SEND_BYTES:
+                    break
+                buffers.append(chunk)
+                size += len(chunk)
+        return buffers
+
+    def _skip(self, c):
+        """drop-oldest: move c ahead to the first whole chunk within max_queue."""
+        i = bisect.bisect_right(self.ends, c.pos)
+        start = self.ends[i] - len(self.chunks[i])
+        if c.pos > start:
+            # Part way through a chunk: send the rest of it first so no line is cut
+            c.head = self.chunks[i][c.pos - start:]
+            i += 1
+        # Chunks i..j go, so the backlog starts at or after total - max_queue
+        j = bisect.bisect_left(self.ends, self.total - self.max_queue)
+        c.dropped += sum(self.counts[i:j + 1])
+        c.pos = self.ends[j]
 
 
 # ---------------------------------------------------------------------------
 # UDP Broadcaster
 # ---------------------------------------------------------------------------
 
+# Most bytes in one datagram: whole sentences up to an Ethernet frame's worth
+UDP_DATAGRAM_BYTES = 1472
+
+
 class UDPBroadcaster:
-    """Sends NMEA sentences via UDP broadcast."""
+    """Sends NMEA sentences via UDP broadcast, as many whole ones per datagram
+    as fit in UDP_DATAGRAM_BYTES."""
 
     def __init__(self, port, dest="255.255.255.255"):
         self.port = port
         self.dest = dest
+        self.address = (dest, port)
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
 
-    def send(self, nmea_line):
-        parts = nmea_line.split(";", 2)
-        sentence = parts[2].strip() if len(parts) >= 3 else nmea_line
-        data = (sentence + "\r\n").encode("ascii", errors="replace")
+    def send(self, lines, runs):
+        """Send runs of track lines, as (start, end) indexes, gathered into datagrams."""
+        offsets = lines.wire_offsets
+        buffers, size = [], 0
+        for start, end in runs:
+            while start < end:
+                room = UDP_DATAGRAM_BYTES - size
+                split = bisect.bisect_right(offsets, offsets[start] + room, start + 1, end + 1) - 1
+                if split == start:
+                    if buffers:     # next line doesn't fit: send what we have
+                        self._send(buffers)
+                        buffers, size = [], 0
+                        continue
+                    split = start + 1   # a line too long for a datagram goes alone
+                buffers.append(lines.wire_span(start, split))
+                size += offsets[split] - offsets[start]
+                start = split
+        if buffers:
+            self._send(buffers)
+
+    def _send(self, buffers):
         try:
-            self.sock.sendto(data, (self.dest, self.port))
+            self.sock.sendmsg(buffers, (), 0, self.address)
         except OSError:
             pass
 
@@ -347,6 +1002,9 @@ class ControlHandler(BaseHTTPRequestHandler):
     engine = None       # set by main()
     manifest = None
     tracks_dir = None
+    tracks = None       # TrackCache
+    tcp = None          # TCPServer
+    load_filter = (None, frozenset())
 
     def log_message(self, format, *args):
         # Quieter logging
@@ -376,7 +1034,9 @@ class ControlHandler(BaseHTTPRequestHandler):
         path = parsed.path.rstrip("/")
 
         if path == "/status":
-            self._json_response(self.engine.get_status())
+            status = self.engine.get_status()
+            status["tcp_clients"] = self.tcp.status() if self.tcp else []
+            self._json_response(status)
         elif path == "/tracks":
             tracks = []
             for t in self.manifest.get("tracks", []):
@@ -403,7 +1063,8 @@ class ControlHandler(BaseHTTPRequestHandler):
             if not date:
                 return self._error("Missing ?track=DATE parameter")
             try:
-                track = Track.load(self.tracks_dir, date, self.manifest)
+                track = self.tracks.load(self.tracks_dir, date, self.manifest,
+                                         *self.load_filter)
                 self.engine.load_track(track)
                 self._json_response({
                     "ok": True,
@@ -504,8 +1165,19 @@ def main():
                         help="Comma-separated sentence types to exclude")
     parser.add_argument("--only", default=None,
                         help="Comma-separated sentence types to include")
+    parser.add_argument("--load-exclude", default=None,
+                        help="Comma-separated sentence types to leave out when loading "
+                             "tracks (they can't be re-enabled with /filter)")
+    parser.add_argument("--load-only", default=None,
+                        help="Comma-separated sentence types to load, leaving out all others")
+    parser.add_argument("--track-cache", type=int, default=4,
+                        help="Loaded tracks kept in memory for instant re-loading")
     parser.add_argument("--tcp-nodelay", action="store_true",
                         help="Disable Nagle's algorithm (reduces latency for small clients)")
+    parser.add_argument("--slow-client", choices=SLOW_CLIENT_POLICIES, default="drop-oldest",
+                        help="What to do with a TCP client more than --tcp-max-queue behind")
+    parser.add_argument("--tcp-max-queue", type=int, default=256 << 10,
+                        help="Bytes a TCP client may fall behind (default: 262144)")
     args = parser.parse_args()
 
     # Resolve tracks dir
@@ -521,13 +1193,14 @@ def main():
 
     print(f"NMEA Replay Server")
     print(f"  Tracks:  {tracks_dir} ({manifest.get('track_count', '?')} tracks)")
-    print(f"  TCP:     port {args.tcp_port}")
+    print(f"  TCP:     port {args.tcp_port} (slow clients: {args.slow_client})")
     print(f"  UDP:     port {args.udp_port} → {args.udp_dest}")
     print(f"  HTTP:    port {args.http_port}")
     print()
 
     # Set up network
-    tcp = TCPServer(args.tcp_port, nodelay=args.tcp_nodelay)
+    tcp = TCPServer(args.tcp_port, nodelay=args.tcp_nodelay,
+                    max_queue=args.tcp_max_queue, policy=args.slow_client)
     tcp.start()
 
     udp = UDPBroadcaster(args.udp_port, args.udp_dest)
@@ -537,11 +1210,11 @@ def main():
     engine.speed = args.speed
     engine.loop = not args.no_loop
 
-    def on_sentence(raw_line, stype):
-        tcp.send(raw_line)
-        udp.send(raw_line)
+    def on_lines(lines, runs):
+        tcp.send(lines, runs)
+        udp.send(lines, runs)
 
-    engine.on_sentence = on_sentence
+    engine.on_lines = on_lines
 
     # Apply initial filter
     if args.exclude:
@@ -553,10 +1226,20 @@ def main():
         engine.set_filter("only", types)
         print(f"  Filter:  only {types}")
 
+    # Load filter: sentence types left out of tracks as they are loaded
+    load_filter = (None, frozenset())
+    if args.load_exclude:
+        load_filter = ("exclude", frozenset(t.strip() for t in args.load_exclude.split(",")))
+    elif args.load_only:
+        load_filter = ("only", frozenset(t.strip() for t in args.load_only.split(",")))
+    if load_filter[0]:
+        print(f"  Load:    {load_filter[0]} {sorted(load_filter[1])}")
+
     # Auto-load track
+    tracks = TrackCache(args.track_cache)
     if args.track:
         try:
-            track = Track.load(tracks_dir, args.track, manifest)
+            track = tracks.load(tracks_dir, args.track, manifest, *load_filter)
             engine.load_track(track)
             print(f"  Loaded:  {args.track} ({len(track.lines):,} lines, "
                   f"{track.duration_ms/1000/60:.0f} min)")
@@ -570,6 +1253,9 @@ def main():
     ControlHandler.engine = engine
     ControlHandler.manifest = manifest
     ControlHandler.tracks_dir = tracks_dir
+    ControlHandler.tracks = tracks
+    ControlHandler.tcp = tcp
+    ControlHandler.load_filter = load_filter
 
     httpd = HTTPServer(("0.0.0.0", args.http_port), ControlHandler)
     print(f"\nReady. Control via http://localhost:{args.http_port}/")